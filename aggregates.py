@@ -0,0 +1,127 @@
+# جمع‌های جاری دفتر حساب که با هر تغییر در O(1) به‌روز می‌شوند.
+# همان قواعد توابع calculate_* در AccountingBot را دنبال می‌کند تا داشبورد بدون پیمایش داده‌ها ساخته شود.
+
+
+class LedgerAggregates:
+    def __init__(self):
+        self.data = {'initial_capital': 0}
+        self.reset()
+
+    def reset(self):
+        self.cash_delta = 0
+        self.inventory_count = 0
+        self.inventory_value = 0
+        self.profit = 0
+        self.costs = 0
+        self.partner_expenses = 0
+        self.partners = {'reza': 0, 'milad': 0}
+        self.sales_debt = 0
+        self.purchase_debt = 0
+        # اجزای لازم برای محاسبه‌ی بدهی باقی‌مانده‌ی هر فروش/خرید
+        self.sale_remaining = {}
+        self.sale_paid = {}
+        self.sale_part = {}
+        self.purchase_remaining = {}
+        self.purchase_paid = {}
+        self.purchase_part = {}
+
+    def rebuild(self, data):
+        self.data = data
+        self.reset()
+        for c in ('purchases', 'sales', 'costs', 'debt_payments', 'purchase_debt_payments', 'partner_transactions'):
+            for record in data.get(c, []):
+                self.added(c, record)
+
+    # ---------- بدهی‌ها ----------
+
+    def _refresh_sale(self, sale_id):
+        remaining = self.sale_remaining.get(sale_id)
+        paid = self.sale_paid.get(sale_id, 0)
+        part = remaining - paid if remaining is not None and remaining > paid else 0
+        self.sales_debt += part - self.sale_part.get(sale_id, 0)
+        self.sale_part[sale_id] = part
+
+    def _refresh_purchase(self, purchase_id):
+        remaining = self.purchase_remaining.get(purchase_id)
+        paid = self.purchase_paid.get(purchase_id, 0)
+        part = remaining - paid if remaining is not None and remaining > paid else 0
+        self.purchase_debt += part - self.purchase_part.get(purchase_id, 0)
+        self.purchase_part[purchase_id] = part
+
+    # ---------- به‌روزرسانی ----------
+
+    def added(self, collection, record):
+        self._apply(collection, record, 1)
+
+    def removed(self, collection, record):
+        self._apply(collection, record, -1)
+
+    def _apply(self, collection, r, sign):
+        if collection == 'purchases':
+            self.cash_delta -= sign * r.get('cash_paid', r['total_cost'] - r.get('purchase_debt', 0))
+            if not r.get('sold', False):
+                self.inventory_count += sign
+                self.inventory_value += sign * r['total_cost']
+            if r.get('purchase_debt', 0) > 0:
+                if sign > 0:
+                    self.purchase_remaining[r['id']] = r.get('remaining_debt', r['purchase_debt'])
+                else:
+                    self.purchase_remaining.pop(r['id'], None)
+                self._refresh_purchase(r['id'])
+        elif collection == 'sales':
+            self.cash_delta += sign * r.get('cash_received', r['sell_price'] - r.get('debt', 0))
+            self.profit += sign * r.get('profit', 0)
+            if sign > 0:
+                self.sale_remaining[r['id']] = r.get('remaining_debt', r.get('debt', 0))
+            else:
+                self.sale_remaining.pop(r['id'], None)
+            self._refresh_sale(r['id'])
+        elif collection == 'costs':
+            self.cash_delta -= sign * r['amount']
+            self.costs += sign * r['amount']
+        elif collection == 'debt_payments':
+            self.sale_paid[r['sale_id']] = self.sale_paid.get(r['sale_id'], 0) + sign * r['amount']
+            self._refresh_sale(r['sale_id'])
+        elif collection == 'purchase_debt_payments':
+            self.purchase_paid[r['purchase_id']] = self.purchase_paid.get(r['purchase_id'], 0) + sign * r['amount']
+            self._refresh_purchase(r['purchase_id'])
+        elif collection == 'partner_transactions':
+            if r['type'] == 'cash_withdraw':
+                self.cash_delta -= sign * r['amount']
+            elif r['type'] == 'cash_deposit':
+                self.cash_delta += sign * r['amount']
+            elif r['type'] == 'personal_expense':
+                self.partner_expenses += sign * r['amount']
+            multiplier = -1 if r['type'] in ['cash_withdraw', 'company_asset_use'] else 1
+            partner = 'reza' if r['partner'] == 'reza' else 'milad'
+            self.partners[partner] += sign * multiplier * r['amount']
+
+    # ---------- خواندن ----------
+
+    def balance(self):
+        return self.data['initial_capital'] + self.cash_delta
+
+    def inventory(self):
+        return self.inventory_count, self.inventory_value
+
+    def total_profit(self):
+        return self.profit
+
+    def total_costs(self):
+        return self.costs + self.partner_expenses
+
+    def remaining_debts(self):
+        return self.sales_debt, self.purchase_debt
+
+    def partner_balances(self):
+        partner_share = (self.total_profit() - self.total_costs()) / 2
+        return partner_share + self.partners['reza'], partner_share + self.partners['milad']
+
+    def consistency(self):
+        sales_debt, purchase_debt = self.remaining_debts()
+        assets = self.balance() + self.inventory_value + sales_debt
+        liabilities = purchase_debt + self.data['initial_capital']
+        reza_balance, milad_balance = self.partner_balances()
+        total_liabilities = liabilities + reza_balance + milad_balance
+        discrepancy = abs(assets - total_liabilities)
+        return assets, total_liabilities, discrepancy
@@ -0,0 +1,242 @@
+from array import array
+from datetime import datetime
+
+from reports import parse_day, period_key
+
+# تحلیل تاریخچه روی جدول‌های ستونی: purchases، sales و costs یک بار به آرایه‌های عددی
+# (و مدل/مشتری/ماه به کد عددی) تبدیل می‌شوند و گروه‌بندی‌ها روی همین ستون‌ها انجام می‌شود.
+# اگر numpy نصب باشد محاسبات برداری است (np.frombuffer روی همان آرایه‌ها، بدون کپی)،
+# وگرنه همان توابع با حلقه روی array اجرا می‌شوند.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BACKEND = 'numpy' if np is not None else 'array'
+
+# مرز بازه‌های سن انبار (روز)
+AGING_EDGES = (7, 30, 90, 180)
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class Dictionary:
+    """کدگذاری رشته‌ها: هر مقدار یکتا یک کد صحیح از ۰"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class Table:
+    def __init__(self, **columns):
+        self.columns = columns
+        self.rows = len(next(iter(columns.values())))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def vector(self, name):
+        """ستون به صورت آرایه‌ی numpy (بدون کپی)، یا خود array اگر numpy نباشد"""
+        column = self.columns[name]
+        if np is None:
+            return column
+        return np.frombuffer(column, dtype=np.int64 if column.typecode == 'q' else np.float64)
+
+
+class Ledger:
+    """جدول‌های ستونی یک لحظه از دفتر حساب"""
+
+    def __init__(self, data, today=None):
+        self.models = Dictionary()
+        self.customers = Dictionary()
+        self.months = Dictionary()
+        self.today = (today or datetime.now().date()).toordinal()
+        self._days = {}
+        self.purchases = self._purchases(data.get('purchases', []))
+        self.sales = self._sales(data.get('sales', []))
+        self.costs = self._costs(data.get('costs', []))
+
+    def _day(self, text):
+        """(روز به صورت ordinal، کد ماه شمسی)؛ تاریخ‌ها زیاد تکرار می‌شوند و cache می‌شوند"""
+        entry = self._days.get(text)
+        if entry is None:
+            day = parse_day(text)
+            if day is None:
+                entry = (-1, self.months.encode(''))
+            else:
+                entry = (day.toordinal(), self.months.encode(period_key('month', day)))
+            self._days[text] = entry
+        return entry
+
+    def _purchases(self, records):
+        model, day, month, cost, sold = array('q'), array('q'), array('q'), array('d'), array('q')
+        for p in records:
+            model.append(self.models.encode(p.get('model') or ''))
+            ordinal, month_code = self._day(p.get('date'))
+            day.append(ordinal)
+            month.append(month_code)
+            cost.append(p['total_cost'])
+            sold.append(1 if p.get('sold') else 0)
+        return Table(model=model, day=day, month=month, cost=cost, sold=sold)
+
+    def _sales(self, records):
+        model, customer, month = array('q'), array('q'), array('q')
+        price, cost, profit = array('d'), array('d'), array('d')
+        for s in records:
+            model.append(self.models.encode(s.get('model') or ''))
+            customer.append(self.customers.encode(s.get('customer_name') or ''))
+            month.append(self._day(s.get('date'))[1])
+            price.append(s['sell_price'])
+            cost.append(s.get('purchase_price', 0))
+            profit.append(s.get('profit', 0))
+        return Table(model=model, customer=customer, month=month, price=price, cost=cost, profit=profit)
+
+    def _costs(self, records):
+        month, amount = array('q'), array('d')
+        for c in records:
+            month.append(self._day(c.get('date'))[1])
+            amount.append(c['amount'])
+        return Table(month=month, amount=amount)
+
+
+def load(bot):
+    """ساخت Ledger از داده‌ی ربات (قابل اجرا در thread)؛ فقط کپی سطحی لیست‌ها زیر storage.lock گرفته می‌شود
+    تا تغییرهای event loop پشت ساختن ستون‌ها منتظر نمانند"""
+    with bot.storage.lock:
+        data = {c: list(bot.data.get(c, [])) for c in ('purchases', 'sales', 'costs')}
+    return Ledger(data)
+
+
+# ---------- عملیات پایه ----------
+
+def group_sum(table, codes, values, size):
+    if np is not None:
+        return np.bincount(table.vector(codes), weights=table.vector(values), minlength=size).tolist()
+    totals = [0.0] * size
+    for code, value in zip(table[codes], table[values]):
+        totals[code] += value
+    return totals
+
+
+def group_count(table, codes, size):
+    if np is not None:
+        return np.bincount(table.vector(codes), minlength=size).tolist()
+    counts = [0] * size
+    for code in table[codes]:
+        counts[code] += 1
+    return counts
+
+
+def column_sum(table, name):
+    if np is not None:
+        return float(table.vector(name).sum())
+    return float(sum(table[name]))
+
+
+def percentile(ordered, q):
+    """درون‌یابی خطی، مثل پیش‌فرض np.percentile"""
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+# ---------- گزارش‌ها ----------
+
+def totals(ledger):
+    """همان جمع‌های calculate_total_profit، calculate_inventory و هزینه‌های جاری"""
+    p = ledger.purchases
+    if np is not None:
+        unsold = p.vector('sold') == 0
+        inventory = int(unsold.sum()), float(p.vector('cost')[unsold].sum())
+    else:
+        inventory = [0, 0.0]
+        for sold, cost in zip(p['sold'], p['cost']):
+            if not sold:
+                inventory[0] += 1
+                inventory[1] += cost
+    return {'profit': column_sum(ledger.sales, 'profit'), 'inventory': tuple(inventory),
+            'costs': column_sum(ledger.costs, 'amount')}
+
+
+def by_model(ledger):
+    """سود و حاشیه‌ی سود هر مدل: [(مدل، تعداد، فروش، سود، درصد حاشیه)] به ترتیب سود"""
+    s, size = ledger.sales, len(ledger.models)
+    counts = group_count(s, 'model', size)
+    revenue = group_sum(s, 'model', 'price', size)
+    profit = group_sum(s, 'model', 'profit', size)
+    rows = [(ledger.models.values[i], counts[i], revenue[i], profit[i], profit[i] / revenue[i] * 100 if revenue[i] else 0)
+            for i in range(size) if counts[i]]
+    return sorted(rows, key=lambda row: row[3], reverse=True)
+
+
+def by_customer(ledger):
+    """[(مشتری، تعداد خرید، جمع خرید، سود)] به ترتیب جمع خرید؛ فروش‌های بی‌نام حساب نمی‌شوند"""
+    s, size = ledger.sales, len(ledger.customers)
+    counts = group_count(s, 'customer', size)
+    revenue = group_sum(s, 'customer', 'price', size)
+    profit = group_sum(s, 'customer', 'profit', size)
+    rows = [(ledger.customers.values[i], counts[i], revenue[i], profit[i])
+            for i in range(size) if counts[i] and ledger.customers.values[i]]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def by_month(ledger):
+    """[(ماه شمسی، تعداد فروش، فروش، سود، هزینه، سود خالص)] به ترتیب ماه"""
+    size = len(ledger.months)
+    counts = group_count(ledger.sales, 'month', size)
+    revenue = group_sum(ledger.sales, 'month', 'price', size)
+    profit = group_sum(ledger.sales, 'month', 'profit', size)
+    costs = group_sum(ledger.costs, 'month', 'amount', size)
+    rows = [(ledger.months.values[i], counts[i], revenue[i], profit[i], costs[i], profit[i] - costs[i])
+            for i in range(size) if ledger.months.values[i] and (counts[i] or costs[i])]
+    return sorted(rows)
+
+
+def inventory_aging(ledger):
+    """کالاهای فروخته‌نشده بر اساس چند روز در انبار مانده‌اند: [(برچسب، تعداد، ارزش)]"""
+    p = ledger.purchases
+    labels = [f"≤{AGING_EDGES[0]}"] + [f"{a + 1}-{b}" for a, b in zip(AGING_EDGES, AGING_EDGES[1:])]
+    labels.append(f">{AGING_EDGES[-1]}")
+    size = len(labels)
+    if np is not None:
+        unsold = (p.vector('sold') == 0) & (p.vector('day') >= 0)
+        ages = ledger.today - p.vector('day')[unsold]
+        # right=True: سن برابر مرز در همان بازه‌ی پایین‌تر می‌ماند
+        bins = np.digitize(ages, AGING_EDGES, right=True)
+        counts = np.bincount(bins, minlength=size).tolist()
+        values = np.bincount(bins, weights=p.vector('cost')[unsold], minlength=size).tolist()
+    else:
+        counts, values = [0] * size, [0.0] * size
+        for sold, day, cost in zip(p['sold'], p['day'], p['cost']):
+            if sold or day < 0:
+                continue
+            age = ledger.today - day
+            b = next((i for i, edge in enumerate(AGING_EDGES) if age <= edge), len(AGING_EDGES))
+            counts[b] += 1
+            values[b] += cost
+    return list(zip(labels, counts, values))
+
+
+def profit_distribution(ledger):
+    """توزیع سود هر فروش: تعداد، میانگین، صدک‌ها و تعداد فروش‌های زیان‌ده"""
+    s = ledger.sales
+    if not s.rows:
+        return None
+    if np is not None:
+        profit = s.vector('profit')
+        return {'count': s.rows, 'mean': float(profit.mean()), 'losses': int((profit < 0).sum()),
+                'percentiles': dict(zip(PERCENTILES, np.percentile(profit, PERCENTILES).tolist()))}
+    ordered = sorted(s['profit'])
+    return {'count': s.rows, 'mean': sum(ordered) / s.rows, 'losses': sum(1 for v in ordered if v < 0),
+            'percentiles': {q: percentile(ordered, q) for q in PERCENTILES}}
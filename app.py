@@ -1,46 +1,172 @@
-from flask import Flask
+from flask import Flask, request
+import asyncio
+import atexit
+import hmac
 import os
-import subprocess
-import sys
+import secrets
 import threading
 import time
 import requests
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import instrumentation
+import main
+from supervisor import Supervisor, render_metrics
+
+# ربات در همین پروسه‌ی Flask اجرا می‌شود (یک سرویس، یک پروسه):
+#   BOT_MODE=webhook: تلگرام updateها را به /telegram می‌فرستد و مستقیم در صف Application می‌روند.
+#   BOT_MODE=polling: همان Application با getUpdates (حالت پشتیبان، مثل python main.py).
+# Application در یک thread با event loop خودش اجرا می‌شود و Flask فقط updateها را به آن تحویل می‌دهد.
 
 app = Flask(__name__)
-TOKEN = '8678842471:AAGg09zAWG7xC2vdzVE4-0iTDaW73QUwuwc'
+TOKEN = main.TOKEN
+BOT_MODE = os.environ.get('BOT_MODE', 'webhook')
+WEBHOOK_PATH = '/telegram'
+# Render آدرس عمومی سرویس را در RENDER_EXTERNAL_URL می‌گذارد
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL') or os.environ.get('RENDER_EXTERNAL_URL')
+# بدون WEBHOOK_SECRET هر بار یک مقدار تصادفی ساخته و با setWebhook به تلگرام داده می‌شود
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+
+
+class BotRunner:
+    """اجرای Application ربات در یک thread پس‌زمینه با event loop جدا (زیر نظر Supervisor)"""
+
+    def __init__(self, mode, heartbeat):
+        self.mode = mode
+        self.heartbeat = heartbeat
+        self.loop = asyncio.new_event_loop()
+        self.application = None
+        self.ready = threading.Event()
+        self.thread = None
+        self.beating = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='bot', daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.startup())
+        except Exception as e:
+            print(f"❌ خطا در اجرای ربات: {e}")
+            self.loop.run_until_complete(self.cleanup())
+            self.loop.close()
+            return
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def startup(self):
+        print("🚀 شروع ربات...")
+        self.application = main.build_application()
+        # heartbeat: هر update قبل از هندلرها دیده می‌شود و خطاهای هندلرها شمرده می‌شوند
+        self.application.add_handler(TypeHandler(Update, self.heartbeat.seen), group=-1)
+        self.application.add_error_handler(self.heartbeat.error)
+        await self.application.initialize()
+        main.bot_accounting.start_writer()
+        if self.mode == 'webhook':
+            url = WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH
+            await self.application.bot.set_webhook(url, secret_token=WEBHOOK_SECRET,
+                                                   allowed_updates=main.ALLOWED_UPDATES)
+            print(f"✅ Webhook روی {url} ثبت شد")
+        else:
+            # start_polling خودش webhook قبلی را پاک می‌کند
+            await self.application.updater.start_polling(allowed_updates=main.ALLOWED_UPDATES)
+            print("✅ ربات در حالت polling اجرا شد")
+        await self.application.start()
+        self.beating = self.loop.create_task(self.heartbeat.run(self.application))
+
+    async def cleanup(self):
+        """جمع کردن Application نیمه‌کاره بعد از شکست در شروع"""
+        try:
+            if self.application is not None:
+                await self.shutdown()
+        except Exception as e:
+            print(f"⚠️ خطا در جمع کردن ربات: {e}")
+
+    def feed(self, data):
+        """تحویل یک update از webhook به صف Application (از thread درخواست Flask)"""
+        update = Update.de_json(data, self.application.bot)
+        asyncio.run_coroutine_threadsafe(self.application.update_queue.put(update), self.loop)
+
+    async def shutdown(self):
+        if self.beating is not None:
+            self.beating.cancel()
+        if self.application.updater.running:
+            await self.application.updater.stop()
+        if self.application.running:
+            await self.application.stop()
+        await self.application.shutdown()
+
+    def stop(self, timeout=30):
+        """توقف ربات؛ دوباره صدا زدن آن کاری نمی‌کند"""
+        if self.ready.is_set():
+            self.ready.clear()
+            try:
+                asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(timeout)
+            except Exception as e:
+                print(f"⚠️ خطا در توقف ربات: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def stop():
+    """توقف ربات و نوشتن باقی‌مانده‌ی تغییرات روی دیسک (atexit)"""
+    supervisor.stop()
+    main.bot_accounting.close()
+
+
+def status():
+    return supervisor.status(main.bot_accounting.writer)
+
 
 @app.route('/')
 def home():
     return "ربات حسابداری فعال است 🤖"
 
+
 @app.route('/health')
 def health():
+    """503 وقتی ربات بالا نیست، heartbeat کهنه است یا نویسنده‌ی storage از کار افتاده"""
+    current = status()
+    if not current['healthy']:
+        return "UNHEALTHY: " + ", ".join(current['problems']), 503
     return "OK", 200
 
-def start_bot():
-    """اجرای ربات در یک فرآیند جداگانه"""
-    try:
-        print("🚀 شروع فرآیند ربات...")
-        # پاک کردن webhook قبل از شروع
-        webhook_url = f"https://api.telegram.org/bot{TOKEN}/deleteWebhook"
-        response = requests.get(webhook_url)
-        if response.status_code == 200:
-            print("✅ Webhook پاک شد")
-        else:
-            print(f"⚠️ خطا در پاک کردن webhook: {response.status_code}")
 
-        # اجرای main.py به عنوان یک فرآیند جدا
-        process = subprocess.Popen([sys.executable, "main.py"])
-        print(f"✅ ربات در فرآیند جداگانه اجرا شد (PID: {process.pid})")
-    except Exception as e:
-        print(f"❌ خطا در اجرای ربات: {e}")
+@app.route('/metrics')
+def metrics():
+    text = render_metrics(status()) + instrumentation.metrics.render()
+    return text, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@app.route(WEBHOOK_PATH, methods=['POST'])
+def telegram_webhook():
+    token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), WEBHOOK_SECRET.encode('utf-8')):
+        return "forbidden", 403
+    runner = supervisor.runner
+    if runner is None or not runner.ready.is_set():
+        # تلگرام update را دوباره می‌فرستد
+        return "starting", 503
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return "bad request", 400
+    runner.feed(data)
+    return "OK", 200
+
 
 def keep_alive():
-    """هر ۵ دقیقه یه بار به تلگرام پینگ می‌زنیم"""
+    """هر ۵ دقیقه یه بار به تلگرام پینگ می‌زنیم و وضعیت خود ربات را هم لاگ می‌کنیم"""
     while True:
         time.sleep(300)  # ۵ دقیقه
+        current = status()
+        if not current['healthy']:
+            print(f"⚠️ ربات سالم نیست: {', '.join(current['problems'])}")
         try:
-            ping_url = f"https://api.telegram.org/bot{TOKEN}/getMe"
+            ping_url = f"{main.TELEGRAM_API_URL}/bot{TOKEN}/getMe"
             response = requests.get(ping_url)
             if response.status_code == 200:
                 print("💓 پینگ زده شد - ربات فعال است")
@@ -49,8 +175,14 @@ def keep_alive():
         except Exception as e:
             print(f"⚠️ خطا در پینگ: {e}")
 
-# شروع ربات
-start_bot()
+
+if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+    print("⚠️ WEBHOOK_URL (یا RENDER_EXTERNAL_URL) تنظیم نشده؛ ربات در حالت polling اجرا می‌شود")
+    BOT_MODE = 'polling'
+
+# شروع ربات زیر نظر supervisor
+supervisor = Supervisor(lambda heartbeat: BotRunner(BOT_MODE, heartbeat)).start()
+atexit.register(stop)
 
 # راه‌اندازی ترد جداگانه برای پینگ
 ping_thread = threading.Thread(target=keep_alive)
@@ -59,4 +191,4 @@ ping_thread.start()
 
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 10000))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,226 @@
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import zlib
+from datetime import datetime
+
+from records import to_json
+
+logger = logging.getLogger(__name__)
+
+BACKUP_CHUNK_RECORDS = 500  # بعد از این تعداد رکورد کنترل به event loop برمی‌گردد
+SPOOL_MAX_SIZE = 8 * 1024 * 1024  # تا این اندازه پشتیبان فقط در حافظه می‌ماند
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def iter_backup(data):
+    """تولید تکه‌تکه‌ی همان خروجی json.dump(data, indent=2, ensure_ascii=False)؛ هر رکورد یک تکه"""
+    keys = list(data)
+    yield '{'
+    for i, key in enumerate(keys):
+        value = data[key]
+        yield f'\n  {json.dumps(key, ensure_ascii=False)}: '
+        if isinstance(value, list) and value:
+            yield '['
+            for j, record in enumerate(value):
+                text = json.dumps(record, ensure_ascii=False, indent=2, default=to_json).replace('\n', '\n    ')
+                yield ('\n    ' if j == 0 else ',\n    ') + text
+            yield '\n  ]'
+        else:
+            yield json.dumps(value, ensure_ascii=False, indent=2, default=to_json).replace('\n', '\n  ')
+        if i < len(keys) - 1:
+            yield ','
+    yield '\n}' if keys else '}'
+
+
+async def build_backup(data, compress=False):
+    """ساخت پشتیبان در بافر حافظه (SpooledTemporaryFile) بدون فایل موقت روی دیسک"""
+    # کپی سطحی لیست‌ها تا رکوردهایی که وسط کار اضافه/حذف می‌شوند خروجی را به هم نریزند
+    snapshot = {k: list(v) if isinstance(v, list) else v for k, v in data.items()}
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    out = gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6) if compress else buffer
+    for count, chunk in enumerate(iter_backup(snapshot), 1):
+        out.write(chunk.encode('utf-8'))
+        if count % BACKUP_CHUNK_RECORDS == 0:
+            await asyncio.sleep(0)
+    if compress:
+        out.close()
+    buffer.seek(0)
+    return buffer
+
+
+def open_backup(fileobj):
+    """باز کردن فایل پشتیبان (ساده یا gzip) به صورت متنی"""
+    head = fileobj.read(2)
+    fileobj.seek(0)
+    if head == GZIP_MAGIC:
+        fileobj = gzip.GzipFile(fileobj=fileobj, mode='rb')
+    return io.TextIOWrapper(fileobj, encoding='utf-8')
+
+
+# ==================== پشتیبان افزایشی ====================
+
+MANIFEST_FILE = os.environ.get('BACKUP_MANIFEST', 'backup_manifest.json')
+COLLECTIONS = ['purchases', 'sales', 'costs', 'transactions', 'debt_payments',
+               'purchase_debt_payments', 'partner_transactions']
+PREPEND_COLLECTIONS = {'transactions'}  # رکوردهای جدید این لیست‌ها اول لیست می‌آیند
+
+
+def fingerprint(record):
+    return zlib.crc32(json.dumps(record, ensure_ascii=False, sort_keys=True, default=to_json).encode('utf-8'))
+
+
+class ChangeTracker:
+    """ثبت رکوردهای تغییر کرده از آخرین پشتیبان (observer در AccountingBot)"""
+
+    def __init__(self):
+        self.complete = False  # تا اولین پشتیبان بعد از شروع برنامه، تغییرات قبلی معلوم نیست
+        self.dirty = {}
+
+    def rebuild(self, data):
+        self.complete = False
+        self.dirty = {}
+
+    def added(self, collection, record):
+        self.dirty[(collection, record.get('id'))] = record
+
+    def removed(self, collection, record):
+        self.dirty[(collection, record.get('id'))] = None
+
+    def reset(self):
+        self.complete = True
+        self.dirty = {}
+
+
+class BackupManifest:
+    """زنجیره‌ی پشتیبان‌ها (کامل + افزایشی) و اثر انگشت رکوردها در آخرین پشتیبان"""
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.lock = threading.Lock()  # ساختن پشتیبان‌ها در thread جدا پشت سر هم
+        self.tracker = ChangeTracker()
+        self.chain = []
+        self.scalars = {}
+        self.fingerprints = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                self.chain = saved['chain']
+                self.scalars = saved['scalars']
+                self.fingerprints = saved['fingerprints']
+            except (ValueError, KeyError):
+                logger.warning("فایل manifest پشتیبان خراب است؛ زنجیره از نو شروع می‌شود")
+
+    @property
+    def last_id(self):
+        return self.chain[-1]['id'] if self.chain else None
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'chain': self.chain, 'scalars': self.scalars, 'fingerprints': self.fingerprints},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, self.path)
+
+    def invalidate(self):
+        """بعد از بازیابی یا پاک کردن، پشتیبان افزایشی بعدی پایه ندارد"""
+        self.chain = []
+        self.scalars = {}
+        self.fingerprints = {}
+        self.tracker.rebuild(None)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def new_id():
+        return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+    def take(self, data):
+        """کپی سطحی data و رکوردهای تغییر کرده تا همین لحظه (None اگر tracker کامل نباشد)؛ زیر storage.lock.
+
+        tracker از همین لحظه تغییرات پشتیبان بعدی را جمع می‌کند، پس اثر انگشت‌ها را می‌شود بیرون از lock ساخت.
+        """
+        changed = dict(self.tracker.dirty) if self.tracker.complete else None
+        self.tracker.reset()
+        return {k: list(v) if isinstance(v, list) else v for k, v in data.items()}, changed
+
+    def record_full(self, data):
+        """ثبت یک پشتیبان کامل (data از take) به عنوان پایه‌ی زنجیره؛ خروجی متادیتای پشتیبان است"""
+        meta = {'id': self.new_id(), 'type': 'full', 'date': str(datetime.now())}
+        self.chain = [dict(meta, records=sum(len(data.get(c, [])) for c in COLLECTIONS))]
+        self.scalars = {k: v for k, v in data.items() if k not in COLLECTIONS}
+        self.fingerprints = {c: {str(r.get('id')): fingerprint(r) for r in data.get(c, [])} for c in COLLECTIONS}
+        self.save()
+        return meta
+
+    def changed_records(self, data):
+        """رکوردهای تغییر کرده با مقایسه‌ی اثر انگشت همه‌ی رکوردها (وقتی tracker کامل نیست)"""
+        changed = {}
+        for c in COLLECTIONS:
+            old = self.fingerprints.get(c, {})
+            seen = set()
+            for r in data.get(c, []):
+                key = str(r.get('id'))
+                seen.add(key)
+                if old.get(key) != fingerprint(r):
+                    changed[(c, r.get('id'))] = r
+            for key in old:
+                if key not in seen:
+                    changed[(c, json.loads(key) if key.lstrip('-').isdigit() else key)] = None
+        return changed
+
+    def make_delta(self, data, changed=None):
+        """ساخت پشتیبان افزایشی نسبت به آخرین پشتیبان (data و changed از take)؛ اگر پایه‌ای نباشد None"""
+        if not self.chain:
+            return None
+        delta = {'type': 'incremental', 'backup_id': self.new_id(), 'base': self.last_id,
+                 'date': str(datetime.now()), 'scalars': {}, 'changes': {}}
+        for k, v in data.items():
+            if k not in COLLECTIONS and self.scalars.get(k) != v:
+                delta['scalars'][k] = v
+        if changed is None:
+            changed = self.changed_records(data)
+        for (c, record_id), record in changed.items():
+            change = delta['changes'].setdefault(c, {'upsert': [], 'delete': []})
+            fingerprints = self.fingerprints.setdefault(c, {})
+            if record is None:
+                change['delete'].append(record_id)
+                fingerprints.pop(str(record_id), None)
+            else:
+                change['upsert'].append(record)
+                fingerprints[str(record_id)] = fingerprint(record)
+        self.scalars.update(delta['scalars'])
+        records = sum(len(ch['upsert']) + len(ch['delete']) for ch in delta['changes'].values())
+        self.chain.append({'id': delta['backup_id'], 'type': 'incremental', 'base': delta['base'],
+                           'date': delta['date'], 'records': records})
+        self.save()
+        return delta
+
+
+def apply_delta(data, delta):
+    """اعمال یک پشتیبان افزایشی روی داده‌ی پایه (در جا)"""
+    data.update(delta.get('scalars', {}))
+    for c, change in delta.get('changes', {}).items():
+        records = data.setdefault(c, [])
+        deleted = set(change.get('delete', []))
+        if deleted:
+            records[:] = [r for r in records if r.get('id') not in deleted]
+        positions = {r.get('id'): i for i, r in enumerate(records)}
+        new = []
+        for record in change.get('upsert', []):
+            pos = positions.get(record.get('id'))
+            if pos is None:
+                new.append(record)
+            else:
+                records[pos] = record
+        if c in PREPEND_COLLECTIONS:
+            records[:0] = sorted(new, key=lambda r: r.get('id', 0), reverse=True)
+        else:
+            records.extend(new)
+    return data
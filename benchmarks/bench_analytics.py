@@ -0,0 +1,78 @@
+# مقایسه‌ی تحلیل ستونی (analytics) با حلقه روی رکوردهای dict (calculate_* و گروه‌بندی با dict)
+# اجرا: python -m benchmarks.bench_analytics [تعداد خرید ...]   (پیش‌فرض 10000 100000 1000000)
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_analytics_')
+os.environ['STORAGE_BACKEND'] = 'json'
+os.environ['DATA_FILE'] = os.path.join(WORKDIR, 'accounting_data.json')
+
+import analytics  # noqa: E402
+from benchmarks.synthetic import make_ledger  # noqa: E402
+from main import AccountingBot  # noqa: E402
+from reports import parse_day, period_key  # noqa: E402
+
+
+def loop_totals(data):
+    bot = SimpleNamespace(data=data)
+    return (AccountingBot.calculate_total_profit(bot), AccountingBot.calculate_inventory(bot),
+            sum(c['amount'] for c in data['costs']))
+
+
+def loop_groups(data):
+    """همان by_model، by_month و سن انبار با حلقه روی dictها"""
+    models, months = {}, {}
+    for s in data['sales']:
+        row = models.setdefault(s['model'], [0, 0, 0])
+        row[0] += 1
+        row[1] += s['sell_price']
+        row[2] += s.get('profit', 0)
+        month = months.setdefault(period_key('month', parse_day(s['date'])), [0, 0])
+        month[0] += s.get('profit', 0)
+    for c in data['costs']:
+        months.setdefault(period_key('month', parse_day(c['date'])), [0, 0])[1] += c['amount']
+    today = analytics.datetime.now().date().toordinal()
+    aging = {}
+    for p in data['purchases']:
+        if not p.get('sold'):
+            age = today - parse_day(p['date']).toordinal()
+            b = next((i for i, edge in enumerate(analytics.AGING_EDGES) if age <= edge), len(analytics.AGING_EDGES))
+            aging[b] = aging.get(b, 0) + 1
+    return models, months, aging
+
+
+def columnar_groups(ledger):
+    return analytics.by_model(ledger), analytics.by_month(ledger), analytics.inventory_aging(ledger)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000, 1000000]
+    print(f"backend: {analytics.BACKEND}")
+    for n in sizes:
+        data = make_ledger(n)
+        print(f"--- {n} خرید، {len(data['sales'])} فروش، {len(data['costs'])} هزینه ---")
+        build, ledger = timed(analytics.Ledger, data)
+        loop_t, expected = timed(loop_totals, data)
+        col_t, got = timed(analytics.totals, ledger)
+        assert round(got['profit']) == expected[0] and got['inventory'][0] == expected[1][0]
+        assert round(got['inventory'][1]) == expected[1][1] and round(got['costs']) == expected[2]
+        loop_g, (models, _, _) = timed(loop_groups, data)
+        col_g, (by_model, _, _) = timed(columnar_groups, ledger)
+        assert {m: round(p) for m, _, _, p, _ in by_model} == {m: row[2] for m, row in models.items()}
+        print(f"ساخت ستون‌ها          {build * 1000:9.1f} ms")
+        print(f"جمع‌ها   loop {loop_t * 1000:9.1f} ms  ستونی {col_t * 1000:8.1f} ms  ×{loop_t / col_t:6.1f}")
+        print(f"گروه‌ها  loop {loop_g * 1000:9.1f} ms  ستونی {col_g * 1000:8.1f} ms  ×{loop_g / col_g:6.1f}")
+        del data, ledger
+
+
+if __name__ == '__main__':
+    main()
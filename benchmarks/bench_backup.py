@@ -0,0 +1,48 @@
+# مقایسه‌ی پشتیبان‌گیری قدیمی (فایل موقت + json.dump) با پشتیبان جریانی در حافظه
+# اجرا: python -m benchmarks.bench_backup
+import asyncio
+import json
+import os
+import time
+
+from backup import build_backup
+from benchmarks.synthetic import make_ledger
+
+
+def old_backup(data):
+    fn = 'backup_bench.json'
+    with open(fn, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    with open(fn, 'rb') as f:
+        payload = f.read()
+    os.remove(fn)
+    return len(payload)
+
+
+def new_backup(data, compress):
+    buffer = asyncio.run(build_backup(data, compress=compress))
+    with buffer:
+        buffer.seek(0, os.SEEK_END)
+        return buffer.tell()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    size = fn(*args)
+    return time.perf_counter() - start, size
+
+
+def main():
+    for n in (1000, 10000, 50000):
+        data = make_ledger(n)
+        records = sum(len(v) for v in data.values() if isinstance(v, list))
+        print(f"--- {n} خرید ({records} رکورد) ---")
+        for name, fn, args in (('temp file', old_backup, (data,)),
+                               ('stream', new_backup, (data, False)),
+                               ('stream+gzip', new_backup, (data, True))):
+            elapsed, size = timed(fn, *args)
+            print(f"{name:12} {elapsed * 1000:9.1f} ms {size / 1024:10.1f} KB {records / elapsed:10.0f} rec/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# حافظه‌ی ربات با و بدون تقسیم گرم/سرد (cold.py): RSS بعد از شروع، زمان شروع و هزینه‌ی خواندن رکوردهای سرد.
+# هر حالت در یک پروسه‌ی جدا اجرا می‌شود تا RSS یکی روی دیگری اثر نگذارد.
+# اجرا: python -m benchmarks.bench_cold [تعداد خرید] [HOT_WINDOW]   (پیش‌فرض 100000 و 1000)
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def rss():
+    """RSS فعلی پروسه (MB) از /proc؛ روی سیستم‌های دیگر بیشترین RSS"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(workdir, window):
+    os.environ['STORAGE_BACKEND'] = 'json'
+    os.environ['DATA_FILE'] = os.path.join(workdir, 'accounting_data.json')
+    os.environ['COLD_FILE'] = os.path.join(workdir, 'accounting_data.cold')
+    os.environ['HOT_WINDOW'] = str(window)
+    from backup import iter_backup
+    from cold import ColdRecord
+    from main import AccountingBot
+    before = rss()
+    start = time.perf_counter()
+    bot = AccountingBot()
+    startup = time.perf_counter() - start
+    gc.collect()
+    resident = rss() - before
+    records = [r for v in bot.data.values() if isinstance(v, list) for r in v]
+    cold = sum(isinstance(r, ColdRecord) for r in records)
+    start = time.perf_counter()
+    oldest = bot.pages.page('sales', cursor=bot.pages.ids['sales'][10])
+    text = ''.join(f"{r['model']} {r['sell_price']}" for r in oldest.records)
+    total, found = bot.search_index.search(['آیفون'], limit=20)
+    text += ''.join(r['date'] for _, r in found)
+    browse = time.perf_counter() - start
+    start = time.perf_counter()
+    size = sum(len(part) for part in iter_backup(bot.data))
+    full = time.perf_counter() - start
+    print(json.dumps({'startup': startup, 'rss': resident, 'browse': browse, 'backup': full, 'cold': cold,
+                      'records': len(records)}))
+
+
+def main():
+    purchases = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    window = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    from benchmarks.synthetic import make_ledger
+    from storage import encode_snapshot
+    workdir = tempfile.mkdtemp(prefix='bench_cold_')
+    with open(os.path.join(workdir, 'accounting_data.json'), 'wb') as f:
+        f.write(encode_snapshot(make_ledger(purchases)))
+    print(f"--- {purchases} خرید، HOT_WINDOW={window} ---")
+    for label, w in (('همه در حافظه', 0), ('گرم/سرد', window)):
+        out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_cold', '--child', workdir, str(w)],
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{label:12}  سرد {r['cold']:7}/{r['records']}  RSS داده {r['rss']:7.1f} MB  "
+              f"شروع {r['startup'] * 1000:7.0f} ms  صفحه‌ی قدیمی + جستجو {r['browse'] * 1000:6.1f} ms  "
+              f"پشتیبان کامل {r['backup'] * 1000:7.0f} ms")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
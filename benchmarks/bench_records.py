@@ -0,0 +1,46 @@
+# مقایسه‌ی حافظه‌ی دفتر حساب با رکوردهای dict و رکوردهای __slots__ (records.py)
+# هر دو حالت از همان متن JSON ساخته می‌شوند، مثل بارگذاری accounting_data.json در شروع ربات.
+# اجرا: python -m benchmarks.bench_records [تعداد رکورد]   (پیش‌فرض 100000)
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_ledger
+from records import convert
+
+
+def count_records(data):
+    return sum(len(v) for v in data.values() if isinstance(v, list))
+
+
+def measure(build, text):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = build(text)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return data, size, elapsed
+
+
+def main():
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    # make_ledger حدود ۴ رکورد به ازای هر خرید می‌سازد
+    purchases = max(target * 10 // 39, 1)
+    text = json.dumps(make_ledger(purchases), ensure_ascii=False)
+    dicts, dict_size, dict_time = measure(json.loads, text)
+    records = count_records(dicts)
+    del dicts
+    slotted, slot_size, slot_time = measure(lambda t: convert(json.loads(t)), text)
+    print(f"{records} رکورد ({purchases} خرید)")
+    print(f"dict     {dict_size / 2 ** 20:8.1f} MB  {dict_size / records:6.0f} B/رکورد  بارگذاری {dict_time * 1000:7.0f} ms")
+    print(f"__slots__{slot_size / 2 ** 20:8.1f} MB  {slot_size / records:6.0f} B/رکورد  بارگذاری {slot_time * 1000:7.0f} ms")
+    print(f"صرفه‌جویی: {(1 - slot_size / dict_size) * 100:.0f}٪")
+
+
+if __name__ == '__main__':
+    main()
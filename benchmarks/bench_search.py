@@ -0,0 +1,57 @@
+# مقایسه‌ی جستجو با ایندکس معکوس و پیمایش خطی همه‌ی خریدها و فروش‌ها
+# اجرا: python -m benchmarks.bench_search
+import time
+
+from benchmarks.synthetic import make_ledger
+from search import FIELDS, SearchIndex, normalize, parse_query
+
+QUERIES = ['آیفون پرو', 'گلکسی از:2023/06/01 تا:2023/12/31', 'سارا', '0914', 'كاركرده فروخته:نه',
+           'ایرپاد در:فروش', 'از:2024/01/01 تا:2024/01/31']
+
+
+def linear_search(data, terms, start=None, end=None, sold=None, collections=None, limit=20):
+    """همان جستجو بدون ایندکس: بررسی همه‌ی رکوردها"""
+    matches = []
+    for c, fields in FIELDS.items():
+        if collections and c not in collections:
+            continue
+        for r in data[c]:
+            words = ' '.join(normalize(r.get(f) or '') for f in fields).split()
+            if not all(any(w.startswith(t) for w in words) for t in terms):
+                continue
+            if start and r['date'] < start or end and r['date'] > end:
+                continue
+            if sold is not None and (c == 'sales' or bool(r.get('sold'))) != sold:
+                continue
+            matches.append((c, r))
+    matches.sort(key=lambda m: m[1]['id'], reverse=True)
+    return len(matches), matches[:limit]
+
+
+def timed(fn, *args, repeat=1, **kwargs):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args, **kwargs)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    for n in (10000, 100000):
+        data = make_ledger(n)
+        index = SearchIndex()
+        build, _ = timed(index.rebuild, data)
+        print(f"--- {n} خرید، {len(index.docs)} رکورد قابل جستجو، ساخت ایندکس {build * 1000:.0f} ms ---")
+        for text in QUERIES:
+            options = parse_query(text)
+            fast, (total, _) = timed(index.search, repeat=20, **options)
+            slow, (expected, _) = timed(linear_search, data, **options)
+            assert total == expected, (text, total, expected)
+            print(f"{text:40} {total:7} نتیجه  index {fast * 1000:7.2f} ms  linear {slow * 1000:8.1f} ms")
+        # هزینه‌ی به‌روزرسانی افزایشی (ویرایش = removed + added)
+        record = data['sales'][len(data['sales']) // 2]
+        update, _ = timed(lambda: (index.removed('sales', record), index.added('sales', record)), repeat=1000)
+        print(f"به‌روزرسانی یک رکورد: {update * 1e6:.0f} µs")
+
+
+if __name__ == '__main__':
+    main()
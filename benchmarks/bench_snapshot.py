@@ -0,0 +1,68 @@
+# مقایسه‌ی snapshot متنی JSON با قالب دودویی (snapshot.py): زمان ذخیره، زمان خواندن، حجم فایل
+# و زمان کامل شروع ربات (AccountingBot با ساخت ایندکس‌ها) روی همان داده.
+# اجرا: python -m benchmarks.bench_snapshot [تعداد خرید ...]   (پیش‌فرض 10000 100000)
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_snapshot_')
+os.environ['STORAGE_BACKEND'] = 'json'
+os.environ['DATA_FILE'] = os.path.join(WORKDIR, 'accounting_data.json')
+
+from benchmarks.synthetic import make_ledger  # noqa: E402
+from main import AccountingBot  # noqa: E402
+from records import convert, to_json  # noqa: E402
+from storage import JsonStorage, encode_snapshot, read_snapshot  # noqa: E402
+
+FORMATS = ('json', 'binary')
+
+
+def timed(fn, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def save(data, fmt, path):
+    with open(path, 'wb') as f:
+        f.write(encode_snapshot(data, fmt))
+
+
+def load(path):
+    return convert(read_snapshot(path))
+
+
+def startup(path, fmt):
+    return AccountingBot(JsonStorage(path, fmt))
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000]
+    for n in sizes:
+        data = convert(make_ledger(n))
+        records = sum(len(v) for v in data.values() if isinstance(v, list))
+        expected = json.dumps(data, default=to_json, sort_keys=True)
+        print(f"--- {n} خرید ({records} رکورد) ---")
+        results = {}
+        for fmt in FORMATS:
+            path = os.path.join(WORKDIR, f'{fmt}_{n}.json')
+            save_t, _ = timed(save, data, fmt, path)
+            load_t, loaded = timed(load, path)
+            assert json.dumps(loaded, default=to_json, sort_keys=True) == expected
+            del loaded
+            start_t, bot = timed(startup, path, fmt)
+            del bot
+            results[fmt] = (save_t, load_t, start_t)
+            print(f"{fmt:7} ذخیره {save_t * 1000:8.0f} ms  خواندن {load_t * 1000:8.0f} ms  "
+                  f"شروع ربات {start_t * 1000:8.0f} ms  حجم {os.path.getsize(path) / 2 ** 20:7.1f} MB")
+        (js, jl, jb), (bs, bl, bb) = results['json'], results['binary']
+        print(f"binary نسبت به json: ذخیره ×{js / bs:.1f}  خواندن ×{jl / bl:.1f}  شروع ربات ×{jb / bb:.1f}")
+        del data
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Update/Context ساختگی برای اجرای هندلرهای main.py بدون شبکه (و بدون تأخیر، مگر latency داده شود).
+# هر چیزی که ربات می‌فرستد (متن، ویرایش پیام، فایل) در Harness.sent ثبت می‌شود تا بشود نتیجه را بررسی کرد
+# و فایل‌های پشتیبان فرستاده‌شده را دوباره به عنوان document به ربات داد (بازیابی).
+
+
+class FakeFile:
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def download_to_memory(self, out):
+        out.write(self.payload)
+
+    async def download_to_drive(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.payload)
+
+
+class FakeDocument:
+    def __init__(self, payload, file_name='backup.json'):
+        self.file = FakeFile(payload)
+        self.file_name = file_name
+        self.file_size = len(payload)
+
+    async def get_file(self):
+        return self.file
+
+
+class FakeMessage:
+    def __init__(self, harness, text=None, document=None):
+        self.harness = harness
+        self.text = text
+        self.document = document
+
+    async def reply_text(self, text, **kwargs):
+        self.harness.sent.append(('text', text))
+        await self.harness.pause()
+
+
+class FakeQuery:
+    def __init__(self, harness, data):
+        self.harness = harness
+        self.data = data
+
+    async def answer(self, *args, **kwargs):
+        await self.harness.pause()
+
+    async def edit_message_text(self, text, **kwargs):
+        self.harness.sent.append(('edit', text))
+        await self.harness.pause()
+
+
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeUpdate:
+    def __init__(self, harness, text=None, data=None, document=None):
+        self.effective_chat = FakeChat(harness.chat_id)
+        self.effective_user = FakeUser(harness.chat_id)
+        self.message = FakeMessage(harness, text, document) if data is None else None
+        self.callback_query = FakeQuery(harness, data) if data is not None else None
+
+
+class FakeBot:
+    def __init__(self, harness):
+        self.harness = harness
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.harness.sent.append(('text', text))
+        await self.harness.pause()
+
+    async def send_document(self, chat_id, document, filename=None, **kwargs):
+        payload = document.read() if hasattr(document, 'read') else bytes(document)
+        self.harness.sent.append(('document', filename, payload))
+        await self.harness.pause()
+
+
+class FakeContext:
+    def __init__(self, harness):
+        self.user_data = {}
+        self.bot = FakeBot(harness)
+        self.args = []
+        self.application = None
+
+
+class Harness:
+    """یک کاربر ساختگی: click دکمه می‌زند، send پیام (یا فایل) می‌فرستد.
+
+    latency (اختیاری) تابع async است که بعد از هر پاسخ ربات صبر می‌کند، مثل تأخیر شبکه‌ی تلگرام.
+    """
+
+    def __init__(self, main, chat_id=1, latency=None):
+        self.main = main
+        self.chat_id = chat_id
+        self.latency = latency
+        self.sent = []
+        self.context = FakeContext(self)
+
+    async def pause(self):
+        if self.latency is not None:
+            await self.latency()
+
+    async def click(self, data):
+        await self.main.button_handler(FakeUpdate(self, data=data), self.context)
+
+    async def send(self, text=None, document=None, file_name='backup.json'):
+        document = FakeDocument(document, file_name) if document is not None else None
+        await self.main.handle_message(FakeUpdate(self, text=text, document=document), self.context)
+
+    async def command(self, handler, *args):
+        self.context.args = list(args)
+        await handler(FakeUpdate(self, text=' '.join(args)), self.context)
+
+    def last(self, kind=None):
+        for item in reversed(self.sent):
+            if kind is None or item[0] == kind:
+                return item
+        return None
@@ -0,0 +1,141 @@
+# آزمون فشار همزمانی: صدها کاربر شبیه‌سازی‌شده که همزمان همان کالاها را می‌فروشند،
+# بدهی همان فروش‌ها را می‌پردازند و رکوردهای مشترک را ویرایش یا حذف می‌کنند.
+# هر پاسخ تلگرام با یک تأخیر تصادفی شبیه‌سازی می‌شود تا هندلرها وسط کار در هم اجرا شوند.
+# اجرا: python -m benchmarks.stress_concurrency [تعداد کاربر] [seed]
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix='stress_')
+os.environ['STORAGE_BACKEND'] = 'json'
+os.environ['DATA_FILE'] = os.path.join(WORKDIR, 'accounting_data.json')
+os.environ['BACKUP_MANIFEST'] = os.path.join(WORKDIR, 'backup_manifest.json')
+
+import main  # noqa: E402
+from benchmarks.harness import Harness  # noqa: E402
+from benchmarks.synthetic import make_ledger  # noqa: E402
+from records import to_json  # noqa: E402
+
+rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 7)
+conflicts = []
+
+
+async def latency():
+    await asyncio.sleep(rng.random() * 0.003)
+
+
+async def click(user, data):
+    await user.click(data)
+    await latency()
+
+
+async def send(user, *texts):
+    for text in texts:
+        await user.send(text)
+        await latency()
+
+
+async def sell(user, pid):
+    await click(user, f'sell_select_{pid}')
+    await send(user, str(rng.randrange(10, 90) * 1000000), '0', '-', '-', '-')
+
+
+async def pay_sale(user, sid, debt):
+    await click(user, f'pay_sale_{sid}')
+    await send(user, str(max(debt // 4, 1)), '-')
+
+
+async def edit_cost(user, cid):
+    await click(user, f'edit_cost_{cid}')
+    await send(user, '-', str(rng.randrange(1, 50) * 100000), '-')
+
+
+async def delete_sale(user, sid):
+    await click(user, f'delete_sale_{sid}')
+    await click(user, 'confirm_delete_sale')
+
+
+def check(bot):
+    """بررسی ناوردایی‌های دفتر بعد از آزمون؛ خروجی: لیست خطاها"""
+    data = bot.data
+    errors = []
+    sold = {}
+    for s in data['sales']:
+        sold[s['purchase_id']] = sold.get(s['purchase_id'], 0) + 1
+    errors += [f"کالای {pid} {n} بار فروخته شده" for pid, n in sold.items() if n > 1]
+    errors += [f"فروش {s['id']}: کالا فروخته‌نشده علامت خورده" for s in data['sales']
+               if not (bot.get_purchase(s['purchase_id']) or {}).get('sold', True)]
+    for s in data['sales']:
+        paid = bot.get_total_sale_payments(s['id'])
+        if paid > s['debt']:
+            errors.append(f"فروش {s['id']}: پرداخت {paid} بیشتر از بدهی {s['debt']}")
+    for c in main.bot_accounting.get_default_data():
+        if isinstance(data.get(c), list):
+            ids = [r['id'] for r in data[c]]
+            if len(ids) != len(set(ids)):
+                errors.append(f"{c}: شناسه‌ی تکراری")
+    errors += [f"aggregate {k}: {v}" for k, v in bot.verify_aggregates().items()]
+    errors += [f"payments: {m}" for m in bot.verify_payment_totals()]
+    return errors
+
+
+async def run(users):
+    async def record_conflict(update, context, error):
+        conflicts.append(str(error))
+        context.user_data.clear()
+
+    main.report_conflict = record_conflict
+    bot = main.bot_accounting
+    bot.reset(make_ledger(200, sold_ratio=0.3, debt_ratio=0.6, seed=3))
+    bot.start_writer()
+
+    unsold = [p['id'] for p in bot.data['purchases'] if not p.get('sold')][:40]
+    debts = [(s['id'], s['debt']) for s in bot.data['sales'] if s['debt'] > 0][:20]
+    costs = [c['id'] for c in bot.data['costs']][:5]
+    sales = [s['id'] for s in bot.data['sales']][-10:]
+
+    tasks = []
+    for _ in range(users):
+        user = Harness(main, latency=latency)
+        roll = rng.random()
+        if roll < 0.4:
+            tasks.append(sell(user, rng.choice(unsold)))
+        elif roll < 0.75:
+            tasks.append(pay_sale(user, *rng.choice(debts)))
+        elif roll < 0.9:
+            tasks.append(edit_cost(user, rng.choice(costs)))
+        else:
+            tasks.append(delete_sale(user, rng.choice(sales)))
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    await bot.flush()
+    elapsed = time.perf_counter() - start
+
+    errors = check(bot)
+    expected = json.loads(json.dumps(bot.data, default=to_json))
+    writer_stats = dict(bot.writer.stats)
+    bot.close()
+    reloaded = main.AccountingBot().data
+    if reloaded != expected:
+        errors.append("داده‌ی بارگذاری‌شده از دیسک با حافظه یکی نیست")
+
+    print(f"👥 {users} کاربر همزمان در {elapsed:.2f} ثانیه ({users / elapsed:.0f} عملیات/ثانیه)")
+    print(f"⚠️ تداخل‌های تشخیص داده‌شده: {len(conflicts)}")
+    for reason in sorted(set(conflicts)):
+        print(f"   {conflicts.count(reason)} × {reason}")
+    print(f"💾 writer: {writer_stats['batches']} دسته در {writer_stats['writes']} نوشتن")
+    if errors:
+        print("❌ ناوردایی‌ها نقض شد:")
+        for e in errors:
+            print("  ", e)
+        return 1
+    print("✅ هیچ فروش تکراری، پرداخت اضافه یا ناسازگاری‌ای پیدا نشد")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 500)))
@@ -0,0 +1,185 @@
+# مجموعه‌ی بنچمارک عملیات دفتر حساب در اندازه‌های مختلف (پیش‌فرض 1000، 10000 و 100000 خرید با فروش،
+# پرداخت و تراکنش شرکای متناسب از synthetic.make_ledger). هندلرها با Update/Context ساختگی (harness.py)
+# و بدون شبکه اجرا می‌شوند. نتیجه در یک فایل JSON نوشته می‌شود تا بشود نسخه‌ها را با --compare مقایسه کرد.
+# backend و قالب ذخیره از همان متغیرهای محیطی ربات می‌آیند (STORAGE_BACKEND، SNAPSHOT_FORMAT، HOT_WINDOW).
+#
+# اجرا:   python -m benchmarks.suite [--sizes 1000 10000 100000] [--repeat 3] [--out bench_results.json]
+# مقایسه: python -m benchmarks.suite --compare قدیمی.json جدید.json [--threshold 0.1]
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_suite_')
+os.environ['DATA_FILE'] = os.path.join(WORKDIR, 'accounting_data.json')
+os.environ['DATABASE_FILE'] = os.path.join(WORKDIR, 'accounting_data.db')
+os.environ['BACKUP_MANIFEST'] = os.path.join(WORKDIR, 'backup_manifest.json')
+os.environ.setdefault('COLD_FILE', os.path.join(WORKDIR, 'accounting_data.cold'))
+
+import main  # noqa: E402
+from benchmarks.harness import Harness  # noqa: E402
+from benchmarks.synthetic import make_ledger  # noqa: E402
+from storage import open_storage  # noqa: E402
+
+SIZES = [1000, 10000, 100000]
+MIN_RUN = 0.05  # عملیات کوتاه‌تر از این در هر اجرا چند بار پشت سر هم صدا زده می‌شوند (مثل timeit)
+
+
+def measure(fn, repeat, setup=None):
+    """زمان هر بار اجرای fn (ثانیه) در repeat اجرا؛ setup قبل از هر بار و بیرون از زمان‌گیری"""
+    number = 1
+    if setup is None:
+        start = time.perf_counter()
+        fn()
+        first = time.perf_counter() - start
+        if first < MIN_RUN:
+            number = min(1000, int(MIN_RUN / max(first, 1e-6)) + 1)
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    return {'min': min(runs), 'median': statistics.median(runs), 'number': number, 'runs': runs}
+
+
+def prepare(n):
+    """نوشتن دفتر مصنوعی با n خرید در storage پیکربندی‌شده؛ خروجی تعداد رکوردها"""
+    os.environ['DATA_FILE'] = os.path.join(WORKDIR, f'ledger_{n}.json')
+    os.environ['DATABASE_FILE'] = os.path.join(WORKDIR, f'ledger_{n}.db')
+    data = make_ledger(n)
+    storage = open_storage()
+    storage.load(main.bot_accounting.get_default_data())
+    storage.replace(data)
+    storage.close()
+    return sum(len(v) for v in data.values() if isinstance(v, list))
+
+
+def run_size(n, repeat, loop):
+    records = prepare(n)
+    main.bot_accounting.close()
+    bot = main.bot_accounting = main.AccountingBot(open_storage())
+    user = Harness(main)
+    run = loop.run_until_complete
+    ops = {}
+
+    ops['load_data'] = measure(bot.load_data, repeat)
+
+    cost_id = bot.data['costs'][0]['id']
+    amounts = iter(range(1000, 10 ** 9))
+    ops['save_data'] = measure(bot.save_data, repeat,
+                               setup=lambda: bot.update('costs', cost_id, {'amount': next(amounts)}))
+    if hasattr(bot.storage, 'compact'):
+        ops['snapshot'] = measure(bot.storage.compact, repeat)
+
+    ops['get_statistics'] = measure(bot.get_statistics, repeat)
+    ops['calculate_remaining_debts'] = measure(bot.calculate_remaining_debts, repeat)
+    ops['calculate_partner_balances'] = measure(bot.calculate_partner_balances, repeat)
+
+    # از مسیر هندلرها
+    ops['dashboard'] = measure(lambda: run(user.click('dashboard')), repeat)
+    ops['list_sales'] = measure(lambda: run(user.command(main.list_sales_command)), repeat)
+    assert user.last('text')[1].startswith('📋'), user.last('text')
+    ops['full_backup'] = measure(lambda: run(user.click('full_backup')), repeat)
+    _, filename, payload = user.last('document')
+
+    def restore():
+        run(user.click('full_restore'))
+        run(user.send(document=payload, file_name=filename))
+    ops['full_restore'] = measure(restore, repeat)
+    assert user.last('text')[1].startswith('✅'), user.last('text')
+    return {'records': records, 'backup_bytes': len(payload), 'ops': ops}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    for size, result in results.items():
+        print(f"--- {size} خرید ({result['records']} رکورد، پشتیبان {result['backup_bytes'] / 2 ** 20:.1f} MB) ---")
+        for op, t in result['ops'].items():
+            print(f"{op:28} میانه {t['median'] * 1000:10.2f} ms   کمینه {t['min'] * 1000:10.2f} ms")
+
+
+def compare(old_file, new_file, threshold):
+    """مقایسه‌ی کمینه‌ها (کم‌نویزترین عدد)؛ خروجی تعداد کندشدن‌های بیشتر از threshold"""
+    with open(old_file, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_file, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{old['meta'].get('commit')} ← {new['meta'].get('commit')}")
+    regressions = 0
+    for size, result in new['results'].items():
+        before = old['results'].get(size)
+        if before is None:
+            continue
+        print(f"--- {size} خرید ---")
+        for op, t in result['ops'].items():
+            if op not in before['ops']:
+                continue
+            a, b = before['ops'][op]['min'], t['min']
+            change = (b - a) / a if a else 0.0
+            flag = ''
+            if change > threshold:
+                flag = '  ⚠️ کندتر'
+                regressions += 1
+            elif change < -threshold:
+                flag = '  ✅ سریع‌تر'
+            print(f"{op:28} {a * 1000:10.2f} → {b * 1000:10.2f} ms  {change * 100:+7.1f}%{flag}")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description='بنچمارک عملیات دفتر حساب')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=0.1, help='کندشدن مجاز در --compare (0.1 یعنی ۱۰٪)')
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    loop = asyncio.new_event_loop()
+    results = {}
+    for n in args.sizes:
+        results[str(n)] = run_size(n, args.repeat, loop)
+        print_table({str(n): results[str(n)]})
+    main.bot_accounting.close()
+    loop.close()
+    output = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': os.environ.get('STORAGE_BACKEND', 'json'),
+            'snapshot_format': os.environ.get('SNAPSHOT_FORMAT', 'json'),
+            'hot_window': int(os.environ.get('HOT_WINDOW', '0')),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"📄 نتیجه در {args.out}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,72 @@
+# تولید دفتر حساب مصنوعی با همان ساختار رکوردهای ربات، برای بنچمارک‌ها
+import random
+from datetime import datetime, timedelta
+
+MODELS = ['آیفون ۱۱', 'آیفون ۱۲ پرو مکس', 'آیفون ۱۳ نرمال', 'آیفون ۱۴ پرو مکس', 'گلکسی S23', 'گلکسی A54',
+          'شیائومی نوت ۱۲', 'گیمبال اوزمو ۶', 'ایرپاد پرو', 'اپل واچ سری ۸']
+CUSTOMERS = ['علی', 'محمد', 'سارا', 'رضا', 'مریم', 'حسین', 'زهرا', '']
+
+
+def make_ledger(purchases=1000, sold_ratio=0.8, debt_ratio=0.2, seed=1):
+    """ساخت داده‌ای مثل accounting_data.json با تعداد خرید داده‌شده و فروش/پرداخت/تراکنش متناسب"""
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    data = {'initial_capital': 400000000, 'purchases': [], 'sales': [], 'costs': [], 'transactions': [],
+            'debt_payments': [], 'purchase_debt_payments': [], 'partner_transactions': []}
+    next_id = 1700000000000
+    for i in range(purchases):
+        day = start + timedelta(minutes=i * 37)
+        date = day.strftime('%Y/%m/%d')
+        model = rng.choice(MODELS)
+        buy_price = rng.randrange(5000000, 100000000, 100000)
+        delivery = rng.choice([0, 0, 150000, 350000])
+        total = buy_price + delivery
+        debt = rng.randrange(0, total // 2, 100000) if rng.random() < debt_ratio else 0
+        next_id += 10
+        pid = next_id
+        data['purchases'].append({
+            'id': pid, 'date': date, 'model': model, 'buy_price': buy_price, 'delivery_cost': delivery,
+            'extra_cost': 0, 'total_cost': total, 'purchase_debt': debt, 'remaining_debt': debt,
+            'cash_paid': total - debt, 'notes': rng.choice(['', 'از سلماس', 'از مهاباد', 'کارکرده']), 'sold': False
+        })
+        data['transactions'].append({
+            'id': pid + 1, 'date': date, 'type': 'خرید', 'model': model, 'amount': -(total - debt),
+            'debt': debt, 'profit': 0, 'description': f"خرید {model}"
+        })
+        if debt and rng.random() < 0.5:
+            data['purchase_debt_payments'].append({
+                'id': pid + 2, 'purchase_id': pid, 'date': date, 'amount': debt // 2, 'notes': '', 'model': model
+            })
+        if rng.random() < sold_ratio:
+            data['purchases'][-1]['sold'] = True
+            sell_price = total + rng.randrange(-2000000, 15000000, 100000)
+            sale_debt = rng.randrange(0, sell_price // 3, 100000) if rng.random() < debt_ratio else 0
+            customer = rng.choice(CUSTOMERS)
+            sid = pid + 3
+            data['sales'].append({
+                'id': sid, 'date': date, 'purchase_id': pid, 'model': model, 'purchase_price': total,
+                'sell_price': sell_price, 'debt': sale_debt, 'remaining_debt': sale_debt,
+                'profit': sell_price - total, 'cash_received': sell_price - sale_debt, 'customer_name': customer,
+                'customer_phone': f"0914{rng.randrange(1000000, 9999999)}" if customer else '', 'notes': ''
+            })
+            data['transactions'].append({
+                'id': sid + 1, 'date': date, 'type': 'فروش', 'model': model, 'amount': sell_price - sale_debt,
+                'debt': sale_debt, 'profit': sell_price - total, 'description': f"فروش به {customer or 'مشتری'}"
+            })
+            if sale_debt and rng.random() < 0.6:
+                data['debt_payments'].append({
+                    'id': sid + 2, 'sale_id': sid, 'date': date, 'amount': sale_debt // 2, 'notes': '',
+                    'model': model, 'customer_name': customer
+                })
+        if i % 10 == 0:
+            data['costs'].append({'id': pid + 5, 'date': date, 'title': rng.choice(['اجاره', 'پیک', 'شارژ']),
+                                  'amount': rng.randrange(100000, 5000000, 50000), 'description': ''})
+        if i % 25 == 0:
+            data['partner_transactions'].append({
+                'id': pid + 6, 'partner': rng.choice(['reza', 'milad']),
+                'type': rng.choice(['cash_withdraw', 'cash_deposit', 'personal_expense', 'company_asset_use']),
+                'amount': rng.randrange(500000, 20000000, 100000), 'date': date, 'description': 'برداشت'
+            })
+    # تراکنش‌ها در ربات از جدید به قدیم ذخیره می‌شوند
+    data['transactions'].reverse()
+    return data
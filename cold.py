@@ -0,0 +1,194 @@
+import json
+import marshal
+import mmap
+import os
+import struct
+from array import array
+from itertools import accumulate
+
+from records import TYPES, Record, make
+
+# تقسیم گرم/سرد دفتر حساب: رکوردهای قدیمی و بسته (فروش تسویه‌شده، خرید فروخته‌شده، تراکنش‌های قدیمی)
+# در یک فایل segment با mmap نوشته می‌شوند و در لیست‌ها یک ColdRecord کوچک جای هر کدام می‌نشیند.
+# ColdRecord همان رابط dict رکوردها را دارد و با هر خواندن متن رکورد را از segment decode می‌کند،
+# پس ایندکس‌ها و هندلرها بدون تغییر کار می‌کنند ولی محتوای رکوردها در حافظه‌ی پروسه نمی‌ماند.
+# segment فقط یک cache از داده‌های storage است: در هر شروع از نو ساخته می‌شود و snapshotها همیشه
+# رکوردهای کامل را دارند، پس قالب آن (marshal و ترتیب بایت‌های همین ماشین و همین نسخه‌ی پایتون) پایدار نیست.
+
+HOT_WINDOW = int(os.environ.get('HOT_WINDOW', '0'))  # تعداد رکوردهای آخر هر لیست که در حافظه می‌مانند؛ 0 یعنی خاموش
+COLD_FILE = os.environ.get('COLD_FILE', 'accounting_data.cold')
+MAGIC = b'HCOLD\x00\x01\n'
+
+
+class Table:
+    """رکوردهای سرد یک لیست: جدول offsetها (int64) و رکوردها (marshal) پشت سر هم"""
+
+    def __init__(self, segment, collection, offsets, count):
+        self.map = segment.map
+        self.collection = collection
+        self.offsets = memoryview(segment.map)[offsets:offsets + 8 * (count + 1)].cast('q')
+        # آخرین رکورد decode شده؛ خواندن چند فیلد پشت سر هم از یک رکورد فقط یک بار decode می‌کند
+        self.last = (None, None)
+
+    def decode(self, position):
+        last = self.last
+        if last[0] == position:
+            return last[1]
+        values = marshal.loads(self.map[self.offsets[position]:self.offsets[position + 1]])
+        self.last = (position, values)
+        return values
+
+
+class Segment:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} فایل segment نیست")
+        (size,) = struct.unpack_from('<I', self.map, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(self.map[start:start + size])
+        self.tables = {c: Table(self, c, offsets, count) for c, (offsets, count) in header.items()}
+
+
+def write_segment(path, groups):
+    """نوشتن {collection: [رکورد]} در فایل segment (فایل موقت + rename)"""
+    texts = {}
+    for c, records in groups.items():
+        texts[c] = [marshal.dumps(r.to_json() if isinstance(r, Record) else r) for r in records]
+    # اندازه‌ی هدر به offsetها بستگی دارد؛ با یک حد بالای طول برای هر عدد یک بار حساب می‌شود
+    header_size = len(json.dumps({c: [10 ** 15, 10 ** 15] for c in texts})) + 8
+    position = len(MAGIC) + 4 + header_size
+    header, layout = {}, []
+    for c, items in texts.items():
+        position += -position % 8
+        header[c] = [position, len(items)]
+        offsets = array('q', accumulate(map(len, items), initial=position + 8 * (len(items) + 1)))
+        layout.append((position, offsets.tobytes(), items))
+        position = offsets[-1]
+    head = json.dumps(header).encode('ascii').ljust(header_size)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(head)) + head)
+        for start, offsets, items in layout:
+            f.write(b'\x00' * (start - f.tell()))
+            f.write(offsets)
+            f.write(b''.join(items))
+    os.replace(tmp, path)
+    return Segment(path)
+
+
+class ColdRecord(Record):
+    """جای یک رکورد سرد در لیست‌ها؛ id بدون decode در دسترس است.
+
+    با اولین تغییر رکورد کامل ساخته و در loaded نگه داشته می‌شود (دیگر سرد نیست).
+    """
+    __slots__ = ('table', 'position', 'id', 'loaded')
+
+    def __init__(self, table, position, record_id, loaded=None):
+        self.table = table
+        self.position = position
+        self.id = record_id
+        self.loaded = loaded
+
+    def current(self):
+        return self.loaded if self.loaded is not None else self.table.decode(self.position)
+
+    def load(self):
+        if self.loaded is None:
+            self.loaded = make(self.table.collection, dict(self.table.decode(self.position)))
+        return self.loaded
+
+    def __getitem__(self, key):
+        if key == 'id' and self.loaded is None:
+            return self.id
+        return self.current()[key]
+
+    def get(self, key, default=None):
+        if key == 'id' and self.loaded is None:
+            return self.id
+        return self.current().get(key, default)
+
+    def __contains__(self, key):
+        return key in self.current()
+
+    def __setitem__(self, key, value):
+        self.load()[key] = value
+
+    def __delitem__(self, key):
+        del self.load()[key]
+
+    def __iter__(self):
+        return iter(list(self.current()))
+
+    def __len__(self):
+        return len(self.current())
+
+    def to_json(self):
+        current = self.current()
+        return current.to_json() if isinstance(current, Record) else dict(current)
+
+    def copy(self):
+        return make(self.table.collection, self.to_json())
+
+    def __repr__(self):
+        return f"ColdRecord({self.table.collection}, {self.id!r})"
+
+
+def debt_paid(data):
+    """جمع پرداخت‌های هر فروش و هر خرید"""
+    paid = {'sales': {}, 'purchases': {}}
+    for c, name, key in (('debt_payments', 'sales', 'sale_id'), ('purchase_debt_payments', 'purchases', 'purchase_id')):
+        totals = paid[name]
+        for payment in data.get(c, []):
+            totals[payment.get(key)] = totals.get(payment.get(key), 0) + payment.get('amount', 0)
+    return paid
+
+
+def is_open(collection, record, paid):
+    """خرید فروخته‌نشده و فروش / خرید با بدهی باقی‌مانده همیشه در حافظه می‌مانند (مثل LedgerAggregates)"""
+    if collection == 'purchases':
+        if not record.get('sold', False):
+            return True
+        debt = record.get('purchase_debt', 0)
+        return debt > 0 and record.get('remaining_debt', debt) > paid['purchases'].get(record.get('id'), 0)
+    if collection == 'sales':
+        return record.get('remaining_debt', record.get('debt', 0)) > paid['sales'].get(record.get('id'), 0)
+    return False
+
+
+def split(data, path=COLD_FILE, window=HOT_WINDOW):
+    """بردن رکوردهای قدیمی (جز window رکورد آخر هر لیست) و بسته به segment؛ در جای همان لیست‌ها.
+
+    ColdRecordها با رکورد کامل (loaded) برگردانده می‌شوند تا ایندکس‌ها بدون decode ساخته شوند؛
+    بعد از آن release حافظه‌ی رکوردها را آزاد می‌کند.
+    """
+    paid = debt_paid(data)
+    positions, groups = {}, {}
+    for c in TYPES:
+        records = data.get(c)
+        if not isinstance(records, list):
+            continue
+        cold = [i for i in range(len(records) - window)
+                if records[i].get('id') is not None and not is_open(c, records[i], paid)]
+        if cold:
+            positions[c] = cold
+            groups[c] = [records[i] for i in cold]
+    if not groups:
+        return []
+    segment = write_segment(path, groups)
+    stubs = []
+    for c, cold in positions.items():
+        table, records = segment.tables[c], data[c]
+        for k, i in enumerate(cold):
+            record = records[i]
+            if isinstance(record, ColdRecord):
+                record = record.load()
+            records[i] = ColdRecord(table, k, record['id'], record)
+            stubs.append(records[i])
+    return stubs
+
+
+def release(stubs):
+    for stub in stubs:
+        stub.loaded = None
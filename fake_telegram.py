@@ -0,0 +1,188 @@
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+# سرور جعلی و محلی Bot API تلگرام برای آزمایش ربات بدون اینترنت (فقط کتابخانه‌ی استاندارد).
+# ربات با TELEGRAM_API_URL=http://127.0.0.1:<port> به آن وصل می‌شود؛ همه‌ی درخواست‌ها در calls ثبت می‌شوند،
+# getUpdates صف updateهای ساختگی را برمی‌گرداند (حالت polling) و post_update آن‌ها را به webhook ربات می‌فرستد.
+#
+#   python fake_telegram.py [port]   اجرای سرور و چاپ درخواست‌ها
+
+BOT_USER = {'id': 1000, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+USER = {'id': 42, 'is_bot': False, 'first_name': 'Tester'}
+
+
+class FakeTelegram:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.calls = []
+        self.updates = []
+        self.webhook = None
+        self.next_update = 1
+        self.next_message = 1
+        self.changed = threading.Condition()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='fake-telegram', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.respond(fake.call(self.path, self.params()))
+
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                self.respond(fake.call(path, dict(parse_qsl(query))))
+
+            def params(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                kind = self.headers.get('Content-Type', '')
+                if kind.startswith('application/json'):
+                    return json.loads(body or b'{}')
+                if kind.startswith('multipart/form-data'):
+                    message = BytesParser(policy=HTTP).parsebytes(
+                        f"Content-Type: {kind}\r\n\r\n".encode('latin-1') + body)
+                    return {part.get_param('name', header='content-disposition'):
+                            part.get_payload(decode=True).decode('utf-8') if part.get_filename() is None
+                            else part.get_filename()
+                            for part in message.iter_parts()}
+                return dict(parse_qsl(body.decode('utf-8')))
+
+            def respond(self, result):
+                payload = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    # ---------- Bot API ----------
+
+    def call(self, path, params):
+        method = path.rstrip('/').rsplit('/', 1)[-1]
+        params = {k: self.value(v) for k, v in params.items()}
+        with self.changed:
+            self.calls.append((method, params))
+            self.changed.notify_all()
+        if method == 'getUpdates':
+            return self.get_updates(params)
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'setWebhook':
+            self.webhook = params
+        elif method == 'deleteWebhook':
+            self.webhook = None
+        elif method in ('sendMessage', 'sendDocument', 'editMessageText'):
+            return self.message(params)
+        return True
+
+    @staticmethod
+    def value(v):
+        """پارامترهای form به صورت متن JSON فرستاده می‌شوند (reply_markup، allowed_updates، ...)"""
+        if isinstance(v, str) and v[:1] in '[{':
+            try:
+                return json.loads(v)
+            except ValueError:
+                pass
+        return v
+
+    def message(self, params):
+        self.next_message += 1
+        chat_id = int(params.get('chat_id') or USER['id'])
+        return {'message_id': int(params.get('message_id') or self.next_message), 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'from': BOT_USER, 'text': params.get('text', '')}
+
+    def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        deadline = time.monotonic() + min(float(params.get('timeout') or 0), 1.0)
+        with self.changed:
+            while True:
+                self.updates = [u for u in self.updates if u['update_id'] >= offset]
+                if self.updates or time.monotonic() >= deadline:
+                    return list(self.updates)
+                self.changed.wait(deadline - time.monotonic())
+
+    # ---------- updateهای ساختگی ----------
+
+    def update(self, **content):
+        update = {'update_id': self.next_update, **content}
+        self.next_update += 1
+        return update
+
+    def text_update(self, text, user=USER):
+        self.next_message += 1
+        message = {'message_id': self.next_message, 'date': int(time.time()), 'from': user,
+                   'chat': {'id': user['id'], 'type': 'private'}, 'text': text}
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return self.update(message=message)
+
+    def callback_update(self, data, user=USER):
+        message = {'message_id': self.next_message, 'date': int(time.time()), 'from': BOT_USER,
+                   'chat': {'id': user['id'], 'type': 'private'}, 'text': '...'}
+        return self.update(callback_query={'id': str(self.next_update), 'from': user, 'chat_instance': '1',
+                                           'message': message, 'data': data})
+
+    def queue(self, update):
+        """برای حالت polling: update در جواب getUpdates بعدی"""
+        with self.changed:
+            self.updates.append(update)
+            self.changed.notify_all()
+
+    def post_update(self, update, url=None, secret=None):
+        """فرستادن update به webhook ثبت‌شده (مثل تلگرام)؛ خروجی کد وضعیت HTTP"""
+        url = url or self.webhook['url']
+        secret = secret if secret is not None else (self.webhook or {}).get('secret_token')
+        request = urllib.request.Request(url, data=json.dumps(update).encode('utf-8'), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        if secret:
+            request.add_header('X-Telegram-Bot-Api-Secret-Token', secret)
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def wait_for(self, method, count=1, timeout=10):
+        """صبر تا ربات count بار متد method را صدا بزند؛ خروجی پارامترهای آن درخواست‌ها"""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while True:
+                found = [p for m, p in self.calls if m == method]
+                if len(found) >= count or time.monotonic() >= deadline:
+                    return found
+                self.changed.wait(deadline - time.monotonic())
+
+
+if __name__ == '__main__':
+    fake = FakeTelegram(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8081).start()
+    print(f"🧪 سرور جعلی تلگرام: {fake.url}")
+    seen = 0
+    try:
+        while True:
+            time.sleep(0.5)
+            for method, params in fake.calls[seen:]:
+                print(method, json.dumps(params, ensure_ascii=False)[:200])
+                seen += 1
+    except KeyboardInterrupt:
+        fake.stop()
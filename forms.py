@@ -0,0 +1,92 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# کلمات لغو در هر مرحله از فرم
+CANCEL_WORDS = {'لغو', 'انصراف', 'cancel'}
+
+DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+
+
+def parse_amount(text):
+    """تبدیل مبلغ وارد شده (با ارقام فارسی/عربی و جداکننده) به عدد صحیح"""
+    cleaned = text.translate(DIGITS).replace(',', '').replace('٬', '').replace('،', '').replace(' ', '')
+    return int(cleaned)
+
+
+def optional_text(text):
+    return text if text != '-' else ''
+
+
+class Step:
+    def __init__(self, name, field, prompt, parse=None, validate=None, keep=False, error="❌ عدد معتبر وارد کن."):
+        self.name = name
+        self.field = field
+        self.prompt = prompt
+        self.parse = parse
+        self.validate = validate
+        self.keep = keep  # در ویرایش «-» یعنی مقدار قبلی بماند
+        self.error = error
+
+
+class Form:
+    def __init__(self, name, steps, on_complete, cancel_on_dash=False):
+        self.name = name
+        self.steps = {step.name: step for step in steps}
+        self.first = steps[0].name
+        self.next = {a.name: b for a, b in zip(steps, steps[1:])}
+        self.on_complete = on_complete
+        self.cancel_on_dash = cancel_on_dash  # «-» در مرحله‌ی اول یعنی انصراف
+
+
+class FormEngine:
+    """اجرای فرم‌های چندمرحله‌ای بر اساس action و step ذخیره شده در user_data"""
+
+    def __init__(self):
+        self.forms = {}
+
+    def register(self, form):
+        self.forms[form.name] = form
+        return form
+
+    def begin(self, user_data, name, **values):
+        user_data['action'] = name
+        user_data['step'] = self.forms[name].first
+        user_data.update(values)
+
+    async def handle(self, update, context):
+        user_data = context.user_data
+        form = self.forms.get(user_data.get('action'))
+        text = update.message.text
+        if form is None or text is None:
+            return False
+        step = form.steps.get(user_data.get('step') or form.first)
+        if step is None:
+            return False
+        # زمان هر مرحله را wrapper هندلر در instrumentation با برچسب message:<فرم>.<مرحله> ثبت می‌کند
+        await self.run_step(update, context, form, step, text)
+        return True
+
+    async def run_step(self, update, context, form, step, text):
+        user_data = context.user_data
+        if text.strip().lower() in CANCEL_WORDS or (form.cancel_on_dash and step.name == form.first and text == '-'):
+            user_data.clear()
+            await update.message.reply_text("❌ لغو شد.", reply_markup=InlineKeyboardMarkup([[
+                InlineKeyboardButton("🏠 منو", callback_data='main_menu')]]))
+            return
+        if not (step.keep and text == '-'):
+            try:
+                value = step.parse(text) if step.parse else text
+            except ValueError:
+                await update.message.reply_text(step.error)
+                return
+            if step.validate:
+                error = step.validate(value, user_data)
+                if error:
+                    await update.message.reply_text(error)
+                    return
+            user_data[step.field] = value
+        following = form.next.get(step.name)
+        if following is None:
+            await form.on_complete(update, context)
+            return
+        user_data['step'] = following.name
+        await update.message.reply_text(following.prompt)
@@ -0,0 +1,166 @@
+# ایندکس‌های درون‌حافظه‌ای که با هر تغییر در AccountingBot به‌روز می‌شوند.
+# هر ایندکس سه متد دارد: rebuild(data)، added(collection, record) و removed(collection, record)
+
+from bisect import bisect_left, insort
+
+
+class RecordIndex:
+    """نگاشت id به رکورد برای خریدها، فروش‌ها و هزینه‌ها"""
+
+    COLLECTIONS = ('purchases', 'sales', 'costs')
+
+    def __init__(self):
+        self.by_id = {c: {} for c in self.COLLECTIONS}
+
+    def rebuild(self, data):
+        self.by_id = {c: {} for c in self.COLLECTIONS}
+        for c in self.COLLECTIONS:
+            index = self.by_id[c]
+            for r in data.get(c, []):
+                # مثل next() اولین رکورد با این id برنده است
+                index.setdefault(r.get('id'), r)
+
+    def added(self, collection, record):
+        index = self.by_id.get(collection)
+        if index is not None:
+            index.setdefault(record.get('id'), record)
+
+    def removed(self, collection, record):
+        index = self.by_id.get(collection)
+        if index is not None and index.get(record.get('id')) is record:
+            del index[record['id']]
+
+    def get(self, collection, record_id):
+        return self.by_id[collection].get(record_id)
+
+
+class PaymentTotals:
+    """جمع پرداخت‌های هر فروش (sale_id) و هر خرید (purchase_id)"""
+
+    def __init__(self):
+        self.sales = {}
+        self.purchases = {}
+
+    @staticmethod
+    def target(collection):
+        if collection == 'debt_payments':
+            return 'sales', 'sale_id'
+        if collection == 'purchase_debt_payments':
+            return 'purchases', 'purchase_id'
+        return None, None
+
+    def rebuild(self, data):
+        self.sales = {}
+        self.purchases = {}
+        for c in ('debt_payments', 'purchase_debt_payments'):
+            for payment in data.get(c, []):
+                self.added(c, payment)
+
+    def added(self, collection, record):
+        name, key = self.target(collection)
+        if name:
+            totals = getattr(self, name)
+            totals[record[key]] = totals.get(record[key], 0) + record['amount']
+
+    def removed(self, collection, record):
+        name, key = self.target(collection)
+        if name:
+            totals = getattr(self, name)
+            total = totals.get(record[key], 0) - record['amount']
+            if total:
+                totals[record[key]] = total
+            else:
+                totals.pop(record[key], None)
+
+    def sale_total(self, sale_id):
+        return self.sales.get(sale_id, 0)
+
+    def purchase_total(self, purchase_id):
+        return self.purchases.get(purchase_id, 0)
+
+    def verify(self, data):
+        """ساخت دوباره‌ی جمع‌ها از صفر و مقایسه با مقادیر جاری؛ خروجی لیست مغایرت‌هاست"""
+        fresh = PaymentTotals()
+        fresh.rebuild(data)
+        mismatches = []
+        for name in ('sales', 'purchases'):
+            live, expected = getattr(self, name), getattr(fresh, name)
+            for key in set(live) | set(expected):
+                if live.get(key, 0) != expected.get(key, 0):
+                    mismatches.append((name, key, live.get(key, 0), expected.get(key, 0)))
+        return mismatches
+
+
+class Page:
+    def __init__(self, records, number, total, older, newer, has_newer):
+        self.records = records
+        self.number = number  # شماره‌ی اولین رکورد صفحه (۱ = جدیدترین)
+        self.total = total
+        self.older = older  # cursor صفحه‌ی قدیمی‌تر یا None
+        self.newer = newer  # cursor صفحه‌ی جدیدتر؛ None با has_newer یعنی صفحه‌ی اول
+        self.has_newer = has_newer
+
+
+class OrderedIndex:
+    """شناسه‌های مرتب هر لیست برای صفحه‌بندی با cursor؛ هر صفحه با جستجوی دودویی و برش O(اندازه‌ی صفحه)"""
+
+    COLLECTIONS = ('purchases', 'sales', 'costs', 'transactions', 'partner_transactions')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ids = {c: [] for c in self.COLLECTIONS}
+        self.records = {c: {} for c in self.COLLECTIONS}
+        # خریدهای فروخته‌نشده برای منوی فروش
+        self.ids['unsold'] = []
+        self.records['unsold'] = self.records['purchases']
+
+    def rebuild(self, data):
+        self.reset()
+        for c in self.COLLECTIONS:
+            records = self.records[c]
+            for r in data.get(c, []):
+                # مثل RecordIndex اولین رکورد با هر id برنده است
+                if r.get('id') is not None:
+                    records.setdefault(r['id'], r)
+            self.ids[c] = sorted(records)
+        self.ids['unsold'] = [pid for pid in self.ids['purchases'] if not self.records['purchases'][pid].get('sold')]
+
+    def added(self, collection, record):
+        records = self.records.get(collection)
+        rid = record.get('id')
+        if records is None or rid is None or rid in records:
+            return
+        records[rid] = record
+        insort(self.ids[collection], rid)
+        if collection == 'purchases' and not record.get('sold'):
+            insort(self.ids['unsold'], rid)
+
+    def removed(self, collection, record):
+        records = self.records.get(collection)
+        rid = record.get('id')
+        if records is None or records.get(rid) is not record:
+            return
+        del records[rid]
+        self.discard(collection, rid)
+        if collection == 'purchases' and not record.get('sold'):
+            self.discard('unsold', rid)
+
+    def discard(self, name, rid):
+        ids = self.ids[name]
+        i = bisect_left(ids, rid)
+        if i < len(ids) and ids[i] == rid:
+            del ids[i]
+
+    def page(self, name, cursor=None, size=10):
+        """صفحه‌ای از جدید به قدیم: رکوردهای با id کمتر از cursor (None یعنی از جدیدترین)"""
+        ids = self.ids[name]
+        end = len(ids) if cursor is None else bisect_left(ids, cursor)
+        start = max(0, end - size)
+        records = self.records[name]
+        newer_end = end + size
+        return Page([records[rid] for rid in reversed(ids[start:end])], len(ids) - end + 1, len(ids),
+                    ids[start] if start > 0 else None,
+                    ids[newer_end] if newer_end < len(ids) else None,
+                    end < len(ids))
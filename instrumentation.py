@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import deque
+
+from telegram.ext import CallbackQueryHandler, CommandHandler, MessageHandler
+from telegram.request import HTTPXRequest
+
+# اندازه‌گیری زمان‌ها: هندلرها (هر command، هر مسیر callback، هر action پیام)، درخواست‌های Bot API،
+# save_data و نوشتن روی دیسک، و تأخیر event loop (از heartbeat در supervisor.py).
+# صدک‌ها روی WINDOW نمونه‌ی آخر هر سری حساب می‌شوند؛ تعداد و جمع از شروع پروسه‌اند.
+# خروجی: /metrics در app.py (قالب متنی Prometheus) و دستور /stats برای مدیرها.
+
+WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+# خانواده‌ها: نام metric، برچسب و توضیح
+FAMILIES = {
+    'handler': ('hesabdari_handler_seconds', 'route', 'زمان اجرای هندلر هر command / مسیر callback / پیام'),
+    'telegram_api': ('hesabdari_telegram_api_seconds', 'method', 'زمان درخواست‌های Bot API'),
+    'storage': ('hesabdari_storage_seconds', 'operation', 'زمان save_data و نوشتن روی دیسک'),
+    'loop_lag': ('hesabdari_event_loop_lag_sample_seconds', 'loop', 'نمونه‌های تأخیر event loop'),
+}
+
+
+class Series:
+    __slots__ = ('samples', 'count', 'total', 'worst')
+
+    def __init__(self):
+        self.samples = deque(maxlen=WINDOW)
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        if value > self.worst:
+            self.worst = value
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [0.0] * len(QUANTILES)
+        return [ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES]
+
+
+class Metrics:
+    """سری‌های زمانی {خانواده: {برچسب: Series}}؛ از event loop و thread نویسنده صدا زده می‌شود"""
+
+    def __init__(self):
+        self.series = {family: {} for family in FAMILIES}
+        self.lock = threading.Lock()
+
+    def observe(self, family, label, seconds):
+        with self.lock:
+            series = self.series[family].get(label)
+            if series is None:
+                series = self.series[family][label] = Series()
+            series.add(seconds)
+
+    def timer(self, family, label):
+        return Timer(self, family, label)
+
+    def summary(self, family):
+        """[(برچسب، تعداد، p50، p95، p99، بیشینه)] مرتب بر اساس p95"""
+        with self.lock:
+            rows = [(label, s.count, *s.quantiles(), s.worst) for label, s in self.series[family].items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def render(self):
+        """قالب متنی Prometheus (summary)"""
+        lines = []
+        for family, (name, label_name, help_text) in FAMILIES.items():
+            with self.lock:
+                rows = [(label, s.quantiles(), s.count, s.total) for label, s in self.series[family].items()]
+            if not rows:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} summary")
+            for label, values, count, total in sorted(rows):
+                label = f'{label_name}="{escape(label)}"'
+                for q, value in zip(QUANTILES, values):
+                    lines.append(f'{name}{{{label},quantile="{q}"}} {round(value, 6)}')
+                lines.append(f"{name}_sum{{{label}}} {round(total, 6)}")
+                lines.append(f"{name}_count{{{label}}} {count}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def reset(self):
+        with self.lock:
+            self.series = {family: {} for family in FAMILIES}
+
+
+class Timer:
+    __slots__ = ('metrics', 'family', 'label', 'start')
+
+    def __init__(self, metrics, family, label):
+        self.metrics = metrics
+        self.family = family
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.family, self.label, time.perf_counter() - self.start)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+class TimedRequest(HTTPXRequest):
+    """HTTPXRequest که زمان هر درخواست Bot API را با نام متد (آخر URL) ثبت می‌کند"""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().do_request(url, method, request_data, **kwargs)
+        finally:
+            metrics.observe('telegram_api', url.rsplit('/', 1)[-1], time.perf_counter() - start)
+
+
+# ---------- هندلرها ----------
+
+def route_label(handler, router=None):
+    """تابعی که از update نام سری زمانی را می‌سازد"""
+    if isinstance(handler, CommandHandler):
+        name = '/' + sorted(handler.commands)[0]
+        return lambda update, context: name
+    if isinstance(handler, CallbackQueryHandler):
+        def callback_label(update, context):
+            data = update.callback_query.data if update.callback_query else None
+            route = router.resolve(data)[0] if router is not None and isinstance(data, str) else None
+            return 'callback:' + (route.name if route is not None else '?')
+        return callback_label
+    if isinstance(handler, MessageHandler):
+        def message_label(update, context):
+            # فرم‌های چندمرحله‌ای هر مرحله را جدا ثبت می‌کنند: message:<فرم>.<مرحله>
+            user_data = context.user_data or {}
+            step = user_data.get('step')
+            return f"message:{user_data.get('action')}" + (f".{step}" if step else '')
+        return message_label
+    name = type(handler).__name__
+    return lambda update, context: name
+
+
+def timed(callback, label):
+    async def wrapper(update, context):
+        # نام قبل از اجرا ساخته می‌شود؛ هندلر ممکن است action را عوض کند
+        name = label(update, context)
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            metrics.observe('handler', name, time.perf_counter() - start)
+    wrapper.__wrapped__ = callback
+    return wrapper
+
+
+def instrument(application, router=None):
+    """پیچیدن callback همه‌ی هندلرهای ثبت‌شده؛ مسیر callbackها با router پیدا می‌شود"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not hasattr(handler.callback, '__wrapped__'):
+                handler.callback = timed(handler.callback, route_label(handler, router))
+    return application
+
+
+# ---------- گزارش ----------
+
+def stats_text(limit=15):
+    """متن دستور /stats (میلی‌ثانیه)"""
+    titles = {'handler': '⏱ **هندلرها**', 'telegram_api': '📡 **Bot API**', 'storage': '💾 **ذخیره**',
+              'loop_lag': '🔁 **تأخیر event loop**'}
+    text = "📊 **آمار زمان‌ها** (تعداد: p50 / p95 / p99 / بیشینه، میلی‌ثانیه)\n"
+    for family, title in titles.items():
+        rows = metrics.summary(family)
+        if not rows:
+            continue
+        text += f"\n{title}\n"
+        for label, count, p50, p95, p99, worst in rows[:limit]:
+            text += (f"`{label}` ×{count}: {p50 * 1000:.1f} / {p95 * 1000:.1f} / {p99 * 1000:.1f} / "
+                     f"{worst * 1000:.1f}\n")
+    return text
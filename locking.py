@@ -0,0 +1,99 @@
+import asyncio
+import itertools
+
+# کنترل همزمانی برای وقتی که هر دو شریک همزمان با ربات کار می‌کنند:
+# نسخه‌ی هر رکورد (برای فرم‌هایی که بین خواندن و نوشتن چند پیام فاصله دارند)
+# و قفل asyncio برای هر رکورد (برای بخش‌هایی که وسطشان await هست).
+
+
+class ConflictError(Exception):
+    """رکورد از زمان خواندن توسط کاربر دیگری تغییر کرده یا دیگر وجود ندارد"""
+
+
+class VersionTracker:
+    """شماره‌ی نسخه‌ی هر رکورد (observer در AccountingBot)؛ هر افزودن، ویرایش یا حذف نسخه را جلو می‌برد"""
+
+    def __init__(self):
+        self.clock = itertools.count(1)
+        self.floor = 0
+        self.versions = {}
+
+    def rebuild(self, data):
+        # بعد از بارگذاری یا بازیابی هیچ نسخه‌ی خوانده‌شده‌ی قبلی معتبر نیست
+        self.floor = next(self.clock)
+        self.versions = {}
+
+    def added(self, collection, record):
+        self.versions[(collection, record.get('id'))] = next(self.clock)
+
+    def removed(self, collection, record):
+        self.versions[(collection, record.get('id'))] = next(self.clock)
+
+    def version(self, collection, record_id):
+        return self.versions.get((collection, record_id), self.floor)
+
+
+class EntityLocks:
+    """یک asyncio.Lock برای هر رکورد ((collection, id))؛ قفل‌های بی‌استفاده حذف می‌شوند"""
+
+    def __init__(self):
+        self.locks = {}
+
+    async def acquire(self, keys):
+        # ترتیب ثابت تا دو تراکنش با رکوردهای مشترک همدیگر را قفل نکنند
+        held = []
+        try:
+            for key in sorted(set(keys), key=repr):
+                entry = self.locks.get(key)
+                if entry is None:
+                    entry = self.locks[key] = [asyncio.Lock(), 0]
+                entry[1] += 1
+                try:
+                    await entry[0].acquire()
+                except BaseException:
+                    self.drop(key, entry)
+                    raise
+                held.append((key, entry))
+        except BaseException:
+            self.release(held)
+            raise
+        return held
+
+    def release(self, held):
+        for key, entry in reversed(held):
+            entry[0].release()
+            self.drop(key, entry)
+
+    def drop(self, key, entry):
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self.locks[key]
+
+
+class Transaction:
+    """بخش بحرانی روی چند رکورد: تا پایان بلوک async with هیچ تراکنش دیگری به این رکوردها دست نمی‌زند"""
+
+    def __init__(self, bot, keys):
+        self.bot = bot
+        self.keys = keys
+        self.held = None
+
+    async def __aenter__(self):
+        self.held = await self.bot.locks.acquire(self.keys)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.bot.save_data()
+        finally:
+            self.bot.locks.release(self.held)
+
+    def require(self, collection, record_id, version=None):
+        """رکورد فعلی؛ ConflictError اگر حذف شده یا نسخه‌اش با version خوانده‌شده فرق کند"""
+        record = self.bot.find(collection, record_id)
+        if record is None:
+            raise ConflictError("این رکورد همزمان توسط کاربر دیگری حذف شده است.")
+        if version is not None and self.bot.versions.version(collection, record_id) != version:
+            raise ConflictError("این رکورد همزمان توسط کاربر دیگری تغییر کرده است؛ دوباره امتحان کن.")
+        return record
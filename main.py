@@ -1,20 +1,44 @@
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-import json
 import os
+import tempfile
+import time
 from datetime import datetime
 import requests
+import analytics
+import cold
+import instrumentation
+import profiling
+from aggregates import LedgerAggregates
+from backup import SPOOL_MAX_SIZE, BackupManifest, build_backup
+from indexes import OrderedIndex, PaymentTotals, RecordIndex
+import locking
+from locking import ConflictError, EntityLocks, VersionTracker
+from forms import Form, FormEngine, Step, optional_text, parse_amount
+from records import Cost, DebtPayment, PartnerTransaction, Purchase, Sale, Transaction, convert, make
+from reports import ReportBuckets, period_label
+from restore import RestoreError, load_backup, load_chain, load_inventory, read_header
+from router import CallbackRouter
+from search import SearchIndex, parse_query
+from storage import apply_op, open_storage
+from writer import StorageWriter
 
 # تنظیمات logging
 logging.basicConfig(
-    format='%(asame)s - %(name)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
 logger = logging.getLogger(__name__)
 
 # توکن ربات
 TOKEN = '8678842471:AAGg09zAWG7xC2vdzVE4-0iTDaW73QUwuwc'
+# آدرس Bot API؛ برای آزمایش با سرور جعلی محلی (fake_telegram.py) عوض می‌شود
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+ALLOWED_UPDATES = ['message', 'callback_query']
+# شناسه‌ی عددی کاربرانی که به دستورهای مدیریتی (/stats) دسترسی دارند، جدا شده با کاما
+ADMIN_IDS = {int(i) for i in os.environ.get('ADMIN_IDS', '').replace(' ', '').split(',') if i}
 
 
 # فرمت‌کننده قیمت
@@ -27,23 +51,59 @@ def format_price(price):
 
 # کلاس اصلی مدیریت داده‌ها
 class AccountingBot:
-    def __init__(self):
-        self.data_file = 'accounting_data.json'
+    def __init__(self, storage=None):
+        self.storage = storage or open_storage()
+        self.index = RecordIndex()
+        self.payments = PaymentTotals()
+        self.aggregates = LedgerAggregates()
+        self.pages = OrderedIndex()
+        self.search_index = SearchIndex()
+        self.reports = ReportBuckets()
+        self.versions = VersionTracker()
+        self.observers = [self.index, self.payments, self.aggregates, self.pages, self.search_index, self.reports,
+                          self.versions]
+        self.locks = EntityLocks()
+        self.writer = None
         self.load_data()
 
     def load_data(self):
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-            except:
-                self.data = self.get_default_data()
-        else:
-            self.data = self.get_default_data()
+        self.data = convert(self.storage.load(self.get_default_data()))
+        self.rebuild_indexes()
+
+    def rebuild_indexes(self):
+        # رکوردهای قدیمی به segment سرد می‌روند؛ ایندکس‌ها هنوز با رکوردهای کامل ساخته می‌شوند و بعد رها می‌شوند
+        stubs = cold.split(self.data) if cold.HOT_WINDOW else []
+        for observer in self.observers:
+            observer.rebuild(self.data)
+        cold.release(stubs)
 
     def save_data(self):
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        """تحویل تغییرات به writer پس‌زمینه؛ بدون writer همین‌جا نوشته می‌شود"""
+        with instrumentation.metrics.timer('storage', 'save_data'):
+            if self.writer is None:
+                self.storage.commit()
+                return
+            generation, batch = self.storage.take()
+            if batch:
+                self.writer.submit(generation, batch)
+
+    async def flush(self):
+        """نقطه‌ی پایداری: صبر تا همه‌ی تغییرات قبلی روی دیسک نوشته و fsync شوند"""
+        if self.writer is None:
+            self.storage.commit(sync=True)
+            return
+        await self.writer.flush(*self.storage.take())
+
+    def start_writer(self):
+        if self.writer is None:
+            self.writer = StorageWriter(self.storage).start()
+
+    def close(self):
+        if self.writer is not None:
+            self.save_data()
+            self.writer.close()
+            self.writer = None
+        self.storage.close()
 
     def get_default_data(self):
         return {
@@ -57,19 +117,136 @@ class AccountingBot:
             'partner_transactions': []
         }
 
+    # ---------- تغییر داده‌ها (هر تغییر یک عملیات در storage) ----------
+
+    def _log(self, op):
+        self.storage.append(op)
+
+    def _added(self, collection, record):
+        for observer in self.observers:
+            observer.added(collection, record)
+
+    def _removed(self, collection, record):
+        for observer in self.observers:
+            observer.removed(collection, record)
+
+    def find(self, collection, record_id):
+        if collection in self.index.by_id:
+            return self.index.get(collection, record_id)
+        return next((r for r in self.data[collection] if r['id'] == record_id), None)
+
+    def get_purchase(self, purchase_id):
+        return self.index.get('purchases', purchase_id)
+
+    def get_sale(self, sale_id):
+        return self.index.get('sales', sale_id)
+
+    def get_cost(self, cost_id):
+        return self.index.get('costs', cost_id)
+
+    # هر تغییر زیر storage.lock انجام می‌شود تا snapshot گرفتن writer با آن تداخل نکند
+
+    def add(self, collection, record, front=False):
+        record = make(collection, record)
+        op = {'op': 'add', 'c': collection, 'r': record}
+        if front:
+            op['front'] = True
+        with self.storage.lock:
+            self._log(op)
+            apply_op(self.data, op)
+        self._added(collection, record)
+        return record
+
+    def update(self, collection, record_id, changes):
+        record = self.find(collection, record_id)
+        if record is None:
+            return None
+        self._removed(collection, record)
+        with self.storage.lock:
+            self._log({'op': 'set', 'c': collection, 'id': record_id, 'f': changes})
+            record.update(changes)
+        self._added(collection, record)
+        return record
+
+    def remove(self, collection, **match):
+        op = {'op': 'del', 'c': collection, 'm': match}
+        with self.storage.lock:
+            removed = apply_op(self.data, op)
+            if removed:
+                self._log(op)
+        for record in removed:
+            self._removed(collection, record)
+        return removed
+
+    def set_value(self, key, value):
+        op = {'op': 'put', 'k': key, 'v': value}
+        with self.storage.lock:
+            self._log(op)
+            return apply_op(self.data, op)
+
+    def reset(self, data):
+        """جایگزینی کامل داده‌ها (بازیابی / پاک کردن) و نوشتن snapshot جدید"""
+        self.data = convert(data)
+        self.storage.replace(data)
+        self.rebuild_indexes()
+
+    # ایندکس‌هایی که در بازیابی جریانی همزمان با خواندن فایل ساخته می‌شوند
+    STAGED = ('index', 'payments', 'aggregates', 'pages', 'search_index', 'reports')
+
+    def staging_observers(self):
+        """نمونه‌های تازه‌ی ایندکس‌ها برای ساختن حالت بازیابی در کنار حالت فعلی"""
+        return [type(getattr(self, name))() for name in self.STAGED]
+
+    def install(self, data, staged):
+        """جایگزینی یکجای داده‌ها با حالتی که بیرون ساخته شده؛ observerهای دیگر از نو ساخته می‌شوند"""
+        self.storage.replace(data)
+        replaced = {id(getattr(self, name)): observer for name, observer in zip(self.STAGED, staged)}
+        others = [o for o in self.observers if id(o) not in replaced]
+        self.observers = [replaced.get(id(o), o) for o in self.observers]
+        self.data = data
+        for name, observer in zip(self.STAGED, staged):
+            setattr(self, name, observer)
+        if cold.HOT_WINDOW:
+            # ایندکس‌های staged رکوردهای کامل را نگه داشته‌اند؛ بعد از split باید روی ColdRecordها ساخته شوند
+            self.rebuild_indexes()
+            return
+        for observer in others:
+            observer.rebuild(data)
+
+    # ---------- همزمانی ----------
+
+    def version(self, collection, record_id):
+        return self.versions.version(collection, record_id)
+
+    def transaction(self, *keys):
+        """async with bot_accounting.transaction(('sales', sid), ...) as tx: قفل رکوردها و در پایان save_data"""
+        return locking.Transaction(self, keys)
+
     def get_total_purchase_payments(self, purchase_id):
-        total = 0
-        for payment in self.data['purchase_debt_payments']:
-            if payment['purchase_id'] == purchase_id:
-                total += payment['amount']
-        return total
+        return self.payments.purchase_total(purchase_id)
 
     def get_total_sale_payments(self, sale_id):
-        total = 0
-        for payment in self.data['debt_payments']:
-            if payment['sale_id'] == sale_id:
-                total += payment['amount']
-        return total
+        return self.payments.sale_total(sale_id)
+
+    def open_debts(self, collection):
+        """فروش‌ها یا خریدهای با بدهی باقی‌مانده [(رکورد، مانده)] به ترتیب ثبت.
+
+        مانده‌ها از LedgerAggregates خوانده می‌شوند تا همه‌ی رکوردها (از جمله رکوردهای سرد) پیمایش نشوند.
+        """
+        parts, debt = ((self.aggregates.sale_part, 'debt') if collection == 'sales'
+                       else (self.aggregates.purchase_part, 'purchase_debt'))
+        result = []
+        for record_id in sorted(rid for rid, part in parts.items() if part > 0):
+            record = self.index.get(collection, record_id)
+            if record is not None and record.get(debt, 0) > 0:
+                result.append((record, parts[record_id]))
+        return result
+
+    def verify_payment_totals(self):
+        mismatches = self.payments.verify(self.data)
+        for name, key, live, expected in mismatches:
+            logger.error("مغایرت جمع پرداخت %s %s: %s != %s", name, key, live, expected)
+        return mismatches
 
     def calculate_balance(self):
         cash_in = self.data['initial_capital']
@@ -152,14 +329,31 @@ class AccountingBot:
         discrepancy = abs(assets - total_liabilities)
         return assets, total_liabilities, discrepancy
 
+    def verify_aggregates(self):
+        """مقایسه‌ی جمع‌های جاری با محاسبه‌ی کامل از روی داده‌ها"""
+        agg = self.aggregates
+        checks = {
+            'balance': (agg.balance(), self.calculate_balance()),
+            'inventory': (agg.inventory(), self.calculate_inventory()),
+            'total_profit': (agg.total_profit(), self.calculate_total_profit()),
+            'total_costs': (agg.total_costs(), self.calculate_total_costs()),
+            'remaining_debts': (agg.remaining_debts(), self.calculate_remaining_debts()),
+            'partner_balances': (agg.partner_balances(), self.calculate_partner_balances()),
+        }
+        mismatches = {k: v for k, v in checks.items() if v[0] != v[1]}
+        for name, (live, expected) in mismatches.items():
+            logger.error("مغایرت جمع جاری %s: %s != %s", name, live, expected)
+        return mismatches
+
     def get_statistics(self):
-        balance = self.calculate_balance()
-        inv_count, inv_value = self.calculate_inventory()
-        total_profit = self.calculate_total_profit()
-        sales_debt, purchase_debt = self.calculate_remaining_debts()
-        total_costs = self.calculate_total_costs()
-        reza_balance, milad_balance = self.calculate_partner_balances()
-        assets, liabilities, discrepancy = self.calculate_consistency()
+        agg = self.aggregates
+        balance = agg.balance()
+        inv_count, inv_value = agg.inventory()
+        total_profit = agg.total_profit()
+        sales_debt, purchase_debt = agg.remaining_debts()
+        total_costs = agg.total_costs()
+        reza_balance, milad_balance = agg.partner_balances()
+        assets, liabilities, discrepancy = agg.consistency()
 
         reza_status = "✅" if reza_balance >= 0 else "❌"
         milad_status = "✅" if milad_balance >= 0 else "❌"
@@ -190,6 +384,10 @@ class AccountingBot:
 
 
 bot_accounting = AccountingBot()
+router = CallbackRouter()
+forms = FormEngine()
+backup_manifest = BackupManifest()
+bot_accounting.observers.append(backup_manifest.tracker)
 
 
 # ==================== منوی اصلی ====================
@@ -206,7 +404,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
          InlineKeyboardButton("💳 مدیریت بدهی", callback_data='debt_menu')],
         [InlineKeyboardButton("💾 پشتیبان و بازیابی", callback_data='backup_menu'),
          InlineKeyboardButton("⚙️ تنظیمات", callback_data='settings_menu')],
-        [InlineKeyboardButton("📊 داشبورد", callback_data='dashboard')]
+        [InlineKeyboardButton("📊 داشبورد", callback_data='dashboard'),
+         InlineKeyboardButton("🔍 جستجو", callback_data='search_menu')]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await update.message.reply_text(
@@ -228,6 +427,9 @@ async def set_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         BotCommand("transactions", "📜 تراکنش‌ها"),
         BotCommand("partners", "👥 شرکا"),
         BotCommand("debts", "💳 بدهی‌ها"),
+        BotCommand("search", "🔍 جستجو"),
+        BotCommand("report", "📅 گزارش دوره‌ای"),
+        BotCommand("analytics", "📈 تحلیل فروش"),
         BotCommand("backup", "💾 پشتیبان"),
         BotCommand("settings", "⚙️ تنظیمات"),
         BotCommand("cancel", "❌ لغو"),
@@ -239,12 +441,42 @@ async def set_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ==================== توابع لیست ====================
 
-async def list_buys_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# ---------- صفحه‌بندی ----------
+
+def page_header(page):
+    last = page.number + len(page.records) - 1
+    return f"📄 {page.number}-{last} از {page.total}\n\n" if page.total > len(page.records) else ""
+
+
+def page_buttons(route, page):
+    """ردیف دکمه‌های صفحه‌ی قدیمی‌تر/جدیدتر؛ cursor در callback_data به صورت route_<id> می‌آید"""
+    row = []
+    if page.older is not None:
+        row.append(InlineKeyboardButton("⬅️ قدیمی‌تر", callback_data=f"{route}_{page.older}"))
+    if page.has_newer:
+        row.append(InlineKeyboardButton("جدیدتر ➡️", callback_data=route if page.newer is None
+                                        else f"{route}_{page.newer}"))
+    return [row] if row else []
+
+
+async def show_page(update, text, keyboard):
+    """نمایش صفحه: جواب دستور متنی یا ویرایش پیام دکمه‌ای"""
+    markup = InlineKeyboardMarkup(keyboard) if keyboard else None
+    if update.callback_query:
+        await update.callback_query.edit_message_text(text, reply_markup=markup, parse_mode='Markdown')
+    else:
+        await update.message.reply_text(text, reply_markup=markup, parse_mode='Markdown')
+
+
+@router.route('list_buys_page')
+@router.route('list_buys_page_<int:cursor>')
+async def list_buys_command(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
     if not bot_accounting.data['purchases']:
-        await update.message.reply_text("❌ هیچ خریدی ثبت نشده.")
+        await show_page(update, "❌ هیچ خریدی ثبت نشده.", None)
         return
-    text = "📋 **لیست خریدها:**\n\n"
-    for i, p in enumerate(bot_accounting.data['purchases'][-20:], 1):
+    page = bot_accounting.pages.page('purchases', cursor, 20)
+    text = "📋 **لیست خریدها:**\n\n" + page_header(page)
+    for i, p in enumerate(page.records, page.number):
         status = "✅" if p.get('sold') else "🟢"
         text += f"{i}. **{p['model']}** {status}\n"
         text += f"   📅 {p['date']} | 💰 {format_price(p['total_cost'])} ت\n"
@@ -253,15 +485,18 @@ async def list_buys_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 p['id'])
             text += f"   ⚠️ بدهی: {format_price(max(0, remaining))} ت\n"
         text += "\n"
-    await update.message.reply_text(text, parse_mode='Markdown')
+    await show_page(update, text, page_buttons('list_buys_page', page))
 
 
-async def list_sales_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@router.route('list_sales_page')
+@router.route('list_sales_page_<int:cursor>')
+async def list_sales_command(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
     if not bot_accounting.data['sales']:
-        await update.message.reply_text("❌ هیچ فروشی ثبت نشده.")
+        await show_page(update, "❌ هیچ فروشی ثبت نشده.", None)
         return
-    text = "📋 **لیست فروش‌ها:**\n\n"
-    for i, s in enumerate(bot_accounting.data['sales'][-20:], 1):
+    page = bot_accounting.pages.page('sales', cursor, 20)
+    text = "📋 **لیست فروش‌ها:**\n\n" + page_header(page)
+    for i, s in enumerate(page.records, page.number):
         profit_emoji = "📈" if s.get('profit', 0) >= 0 else "📉"
         text += f"{i}. **{s['model']}** {profit_emoji}\n"
         text += f"   📅 {s['date']} | 💰 فروش: {format_price(s['sell_price'])} ت\n"
@@ -272,21 +507,81 @@ async def list_sales_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         if s.get('customer_name'):
             text += f"   👤 {s['customer_name']}\n"
         text += "\n"
-    await update.message.reply_text(text, parse_mode='Markdown')
+    await show_page(update, text, page_buttons('list_sales_page', page))
 
 
-async def list_costs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@router.route('list_costs_page')
+@router.route('list_costs_page_<int:cursor>')
+async def list_costs_command(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
     if not bot_accounting.data['costs']:
-        await update.message.reply_text("❌ هیچ هزینه‌ای ثبت نشده.")
+        await show_page(update, "❌ هیچ هزینه‌ای ثبت نشده.", None)
         return
-    text = "📋 **لیست هزینه‌ها:**\n\n"
-    for i, c in enumerate(bot_accounting.data['costs'][-20:], 1):
+    page = bot_accounting.pages.page('costs', cursor, 20)
+    text = "📋 **لیست هزینه‌ها:**\n\n" + page_header(page)
+    for i, c in enumerate(page.records, page.number):
         text += f"{i}. **{c['title']}**\n"
         text += f"   📅 {c['date']} | 💰 {format_price(c['amount'])} ت\n"
         if c.get('description'):
             text += f"   📌 {c['description']}\n"
         text += "\n"
-    await update.message.reply_text(text, parse_mode='Markdown')
+    await show_page(update, text, page_buttons('list_costs_page', page))
+
+
+# ---------- جستجو ----------
+
+SEARCH_PROMPT = ("🔍 عبارت جستجو را وارد کن (مدل، مشتری، تلفن یا توضیحات).\n"
+                 "فیلترها: `از:1403/01/01` `تا:1403/06/31` `فروخته:بله|نه` `در:خرید|فروش`")
+
+
+async def show_search(update, options):
+    """اجرای جستجو و نمایش نتایج به صورت دکمه‌ی مشاهده‌ی هر رکورد"""
+    start = time.perf_counter()
+    total, results = bot_accounting.search_index.search(**options)
+    elapsed = (time.perf_counter() - start) * 1000
+    keyboard = []
+    for collection, r in results:
+        if collection == 'sales':
+            label = f"💰 {r['model']} - {format_price(r['sell_price'])} ت"
+            if r.get('customer_name'):
+                label += f" - {r['customer_name']}"
+            keyboard.append([InlineKeyboardButton(label, callback_data=f"view_sale_{r['id']}")])
+        else:
+            status = "✅" if r.get('sold') else "🟢"
+            keyboard.append([InlineKeyboardButton(f"🛒 {r['model']} - {format_price(r['total_cost'])} ت {status}",
+                                                  callback_data=f"view_purchase_{r['id']}")])
+    keyboard.append([InlineKeyboardButton("🔍 جستجوی دوباره", callback_data='search_menu'),
+                     InlineKeyboardButton("🏠 منو", callback_data='main_menu')])
+    text = f"🔍 **{total} نتیجه** ({elapsed:.1f} میلی‌ثانیه)"
+    if total > len(results):
+        text += f"\n📄 {len(results)} مورد جدیدتر نمایش داده شد؛ برای محدود کردن، کلمه یا فیلتر اضافه کن."
+    await show_page(update, text, keyboard)
+
+
+@router.route('search_menu')
+async def search_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    forms.begin(context.user_data, 'search')
+    await query.edit_message_text(SEARCH_PROMPT, parse_mode='Markdown')
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = ' '.join(context.args or [])
+    if not text:
+        forms.begin(context.user_data, 'search')
+        await update.message.reply_text(SEARCH_PROMPT, parse_mode='Markdown')
+        return
+    try:
+        options = parse_query(text)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+    await show_search(update, options)
+
+
+async def complete_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    options = context.user_data['search_options']
+    context.user_data.clear()
+    await show_search(update, options)
 
 
 # ==================== هندلر دکمه‌ها ====================
@@ -294,313 +589,623 @@ async def list_costs_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
+    try:
+        if not await router.dispatch(update, context):
+            logger.warning("callback ناشناخته: %s", query.data)
+    except ConflictError as e:
+        await report_conflict(update, context, e)
 
-    if query.data == 'main_menu':
-        keyboard = [
-            [InlineKeyboardButton("💰 ثبت فروش", callback_data='sell_menu'),
-             InlineKeyboardButton("🛒 ثبت خرید", callback_data='buy_menu')],
-            [InlineKeyboardButton("📋 لیست فروش‌ها", callback_data='list_sales_menu'),
-             InlineKeyboardButton("📋 لیست خریدها", callback_data='list_buys_menu')],
-            [InlineKeyboardButton("💸 هزینه‌های جاری", callback_data='costs_menu'),
-             InlineKeyboardButton("📜 تراکنش‌ها", callback_data='transactions')],
-            [InlineKeyboardButton("👥 تراکنش شرکا", callback_data='partner_menu'),
-             InlineKeyboardButton("💳 مدیریت بدهی", callback_data='debt_menu')],
-            [InlineKeyboardButton("💾 پشتیبان و بازیابی", callback_data='backup_menu'),
-             InlineKeyboardButton("⚙️ تنظیمات", callback_data='settings_menu')],
-            [InlineKeyboardButton("📊 داشبورد", callback_data='dashboard')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("🎯 **منوی اصلی**", reply_markup=reply_markup, parse_mode='Markdown')
-
-    elif query.data == 'dashboard':
-        stats = bot_accounting.get_statistics()
-        keyboard = [[InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(stats, reply_markup=reply_markup, parse_mode='Markdown')
-
-    # ========== فروش ==========
-    elif query.data == 'sell_menu':
-        available = [p for p in bot_accounting.data['purchases'] if not p.get('sold', False)]
-        if not available:
-            await query.edit_message_text("❌ گوشی موجود نیست!", reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]))
-            return
-        text = "💰 **ثبت فروش**\n\nانتخاب کنید:\n"
-        keyboard = []
-        for i, p in enumerate(available[-10:], 1):
-            keyboard.append([InlineKeyboardButton(f"{i}. {p['model']} - {format_price(p['total_cost'])} ت",
-                                                  callback_data=f"sell_select_{p['id']}")])
-        keyboard.append([InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    elif query.data.startswith('sell_select_'):
-        pid = int(query.data.replace('sell_select_', ''))
-        context.user_data['sell_purchase_id'] = pid
-        context.user_data['action'] = 'new_sell'
-        context.user_data['step'] = 'waiting_sell_price'
-        p = next((p for p in bot_accounting.data['purchases'] if p['id'] == pid))
-        await query.edit_message_text(
-            f"📱 {p['model']}\n💰 خرید: {format_price(p['total_cost'])} ت\n\nقیمت فروش را وارد کن:")
-
-    # ========== خرید ==========
-    elif query.data == 'buy_menu':
-        context.user_data['action'] = 'new_buy'
-        context.user_data['step'] = 'waiting_buy_model'
-        await query.edit_message_text("📱 مدل گوشی را وارد کن:")
-
-    # ========== لیست خریدها ==========
-    elif query.data == 'list_buys_menu':
-        if not bot_accounting.data['purchases']:
-            await query.edit_message_text("❌ خریدی نیست.", reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]))
-            return
-        text = "📋 **لیست خریدها**\n\n"
-        keyboard = []
-        for i, p in enumerate(bot_accounting.data['purchases'][-10:], 1):
-            status = "✅" if p.get('sold') else "🟢"
-            keyboard.append([InlineKeyboardButton(f"{i}. {p['model']} - {format_price(p['total_cost'])} ت {status}",
-                                                  callback_data=f"view_purchase_{p['id']}")])
-        keyboard.append([InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    elif query.data.startswith('view_purchase_'):
-        pid = int(query.data.replace('view_purchase_', ''))
-        p = next((p for p in bot_accounting.data['purchases'] if p['id'] == pid))
-        remaining = p.get('remaining_debt', p.get('purchase_debt', 0)) - bot_accounting.get_total_purchase_payments(pid)
-        text = f"📱 **{p['model']}**\n📅 {p['date']}\n💰 {format_price(p['total_cost'])} ت\n"
-        if p.get('purchase_debt', 0) > 0:
-            text += f"⚠️ بدهی: {format_price(p['purchase_debt'])} ت\n💸 پرداخت شده: {format_price(bot_accounting.get_total_purchase_payments(pid))} ت\n"
-        text += f"📌 {'✅ فروخته شده' if p.get('sold') else '🟢 در انبار'}"
-        keyboard = []
-        if not p.get('sold'):
-            keyboard.append([InlineKeyboardButton("✏️ ویرایش", callback_data=f"edit_purchase_{pid}"),
-                             InlineKeyboardButton("❌ حذف", callback_data=f"delete_purchase_{pid}")])
-        else:
-            keyboard.append([InlineKeyboardButton("❌ حذف", callback_data=f"delete_purchase_{pid}")])
-        if p.get('purchase_debt', 0) > 0 and remaining > 0:
-            keyboard.append([InlineKeyboardButton("💳 پرداخت بدهی", callback_data=f"pay_purchase_{pid}")])
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='list_buys_menu')])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    # ========== لیست فروش‌ها ==========
-    elif query.data == 'list_sales_menu':
-        if not bot_accounting.data['sales']:
-            await query.edit_message_text("❌ فروشی نیست.", reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]))
-            return
-        text = "📋 **لیست فروش‌ها**\n\n"
-        keyboard = []
-        for i, s in enumerate(bot_accounting.data['sales'][-10:], 1):
-            emoji = "📈" if s.get('profit', 0) >= 0 else "📉"
-            keyboard.append([InlineKeyboardButton(f"{i}. {s['model']} - {format_price(s['sell_price'])} ت {emoji}",
-                                                  callback_data=f"view_sale_{s['id']}")])
-        keyboard.append([InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    elif query.data.startswith('view_sale_'):
-        sid = int(query.data.replace('view_sale_', ''))
-        s = next((s for s in bot_accounting.data['sales'] if s['id'] == sid))
-        remaining = s.get('remaining_debt', s.get('debt', 0)) - bot_accounting.get_total_sale_payments(sid)
-        text = f"💰 **{s['model']}**\n📅 {s['date']}\n💰 خرید: {format_price(s.get('purchase_price', 0))} ت\n💰 فروش: {format_price(s['sell_price'])} ت\n📊 سود: {format_price(s.get('profit', 0))} ت\n"
-        if s.get('debt', 0) > 0:
-            text += f"⚠️ بدهی: {format_price(s['debt'])} ت\n💸 دریافت شده: {format_price(bot_accounting.get_total_sale_payments(sid))} ت\n"
-        if s.get('customer_name'):
-            text += f"👤 {s['customer_name']}\n"
-        keyboard = [
-            [InlineKeyboardButton("✏️ ویرایش", callback_data=f"edit_sale_{sid}"),
-             InlineKeyboardButton("❌ حذف", callback_data=f"delete_sale_{sid}")]
-        ]
-        if s.get('debt', 0) > 0 and remaining > 0:
-            keyboard.append([InlineKeyboardButton("💳 دریافت بدهی", callback_data=f"pay_sale_{sid}")])
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='list_sales_menu')])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    # ========== هزینه‌ها ==========
-    elif query.data == 'costs_menu':
-        keyboard = [
-            [InlineKeyboardButton("➕ ثبت هزینه", callback_data='new_cost')],
-            [InlineKeyboardButton("📋 لیست هزینه‌ها", callback_data='list_costs')],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
-        ]
-        await query.edit_message_text("💸 **هزینه‌ها**", reply_markup=InlineKeyboardMarkup(keyboard),
-                                      parse_mode='Markdown')
-
-    elif query.data == 'new_cost':
-        context.user_data['action'] = 'new_cost'
-        context.user_data['step'] = 'waiting_cost_title'
-        await query.edit_message_text("📝 عنوان هزینه را وارد کن:")
-
-    elif query.data == 'list_costs':
-        if not bot_accounting.data['costs']:
-            await query.edit_message_text("❌ هزینه‌ای نیست.", reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 بازگشت", callback_data='costs_menu')]]))
-            return
-        text = "📋 **لیست هزینه‌ها**\n\n"
-        keyboard = []
-        for i, c in enumerate(bot_accounting.data['costs'][-10:], 1):
-            keyboard.append([InlineKeyboardButton(f"{i}. {c['title']} - {format_price(c['amount'])} ت",
-                                                  callback_data=f"view_cost_{c['id']}")])
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='costs_menu')])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    elif query.data.startswith('view_cost_'):
-        cid = int(query.data.replace('view_cost_', ''))
-        c = next((c for c in bot_accounting.data['costs'] if c['id'] == cid))
-        text = f"💸 **{c['title']}**\n📅 {c['date']}\n💰 {format_price(c['amount'])} ت\n"
-        if c.get('description'):
-            text += f"📌 {c['description']}\n"
-        keyboard = [
-            [InlineKeyboardButton("✏️ ویرایش", callback_data=f"edit_cost_{cid}"),
-             InlineKeyboardButton("❌ حذف", callback_data=f"delete_cost_{cid}")],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data='list_costs')]
-        ]
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    # ========== شرکا ==========
-    elif query.data == 'partner_menu':
-        keyboard = [
-            [InlineKeyboardButton("👤 تراکنش رضا", callback_data='partner_reza')],
-            [InlineKeyboardButton("👤 تراکنش میلاد", callback_data='partner_milad')],
-            [InlineKeyboardButton("📜 لیست تراکنش‌ها", callback_data='list_partner')],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
-        ]
-        await query.edit_message_text("👥 **شرکا**\n\nهزینه شخصی به هزینه‌ها اضافه می‌شود",
-                                      reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    elif query.data == 'partner_reza':
-        context.user_data['partner'] = 'reza'
-        context.user_data['action'] = 'partner_transaction'
-        await query.edit_message_text(
-            "👤 **رضا**\n\n1️⃣ برداشت نقدی\n2️⃣ واریز نقدی\n3️⃣ هزینه شخصی\n4️⃣ استفاده دارایی\n\nشماره را وارد کن:")
-
-    elif query.data == 'partner_milad':
-        context.user_data['partner'] = 'milad'
-        context.user_data['action'] = 'partner_transaction'
-        await query.edit_message_text(
-            "👤 **میلاد**\n\n1️⃣ برداشت نقدی\n2️⃣ واریز نقدی\n3️⃣ هزینه شخصی\n4️⃣ استفاده دارایی\n\nشماره را وارد کن:")
-
-    elif query.data == 'list_partner':
-        if not bot_accounting.data['partner_transactions']:
-            await query.edit_message_text("❌ تراکنشی نیست.", reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 بازگشت", callback_data='partner_menu')]]))
-            return
-        text = "👥 **تراکنش‌ها**\n\n"
-        for i, t in enumerate(bot_accounting.data['partner_transactions'][-20:], 1):
-            partner = "رضا" if t['partner'] == 'reza' else "میلاد"
-            type_text = {'cash_withdraw': 'برداشت', 'cash_deposit': 'واریز', 'personal_expense': 'هزینه شخصی',
-                         'company_asset_use': 'استفاده دارایی', 'other': 'سایر'}.get(t['type'], t['type'])
-            text += f"{i}. {partner} - {type_text}\n   📅 {t['date']} | 💰 {format_price(t['amount'])} ت\n   📝 {t['description'][:30]}\n\n"
-        await query.edit_message_text(text, parse_mode='Markdown')
-
-    # ========== بدهی ==========
-    elif query.data == 'debt_menu':
-        sales, purchase = bot_accounting.calculate_remaining_debts()
-        text = f"💳 **بدهی‌ها**\n\n⚠️ فروش: {format_price(sales)} ت\n⚠️ خرید: {format_price(purchase)} ت\n\n"
-        keyboard = [
-            [InlineKeyboardButton("💳 دریافت بدهی فروش", callback_data='pay_sale_debt')],
-            [InlineKeyboardButton("💳 پرداخت بدهی خرید", callback_data='pay_purchase_debt')],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
-        ]
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    elif query.data == 'pay_sale_debt':
-        sales = []
-        for s in bot_accounting.data['sales']:
-            if s.get('debt', 0) > 0:
-                remaining = s.get('remaining_debt', s['debt']) - bot_accounting.get_total_sale_payments(s['id'])
-                if remaining > 0:
-                    sales.append((s, remaining))
-        if not sales:
-            await query.edit_message_text("✅ بدهی معوقی نیست.", reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 بازگشت", callback_data='debt_menu')]]))
-            return
-        text = "💳 **دریافت بدهی**\n\n"
-        keyboard = []
-        for i, (s, r) in enumerate(sales[-10:], 1):
-            keyboard.append([InlineKeyboardButton(f"{i}. {s['model']} - {format_price(r)} ت",
-                                                  callback_data=f"pay_sale_{s['id']}")])
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='debt_menu')])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    elif query.data == 'pay_purchase_debt':
-        purchases = []
-        for p in bot_accounting.data['purchases']:
-            if p.get('purchase_debt', 0) > 0:
-                remaining = p.get('remaining_debt', p['purchase_debt']) - bot_accounting.get_total_purchase_payments(
-                    p['id'])
-                if remaining > 0:
-                    purchases.append((p, remaining))
-        if not purchases:
-            await query.edit_message_text("✅ بدهی معوقی نیست.", reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🔙 بازگشت", callback_data='debt_menu')]]))
-            return
-        text = "💳 **پرداخت بدهی**\n\n"
-        keyboard = []
-        for i, (p, r) in enumerate(purchases[-10:], 1):
-            keyboard.append([InlineKeyboardButton(f"{i}. {p['model']} - {format_price(r)} ت",
-                                                  callback_data=f"pay_purchase_{p['id']}")])
-        keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='debt_menu')])
-        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
-
-    # ========== پشتیبان ==========
-    elif query.data == 'backup_menu':
-        keyboard = [
-            [InlineKeyboardButton("💾 پشتیبان کامل", callback_data='full_backup')],
-            [InlineKeyboardButton("🔄 بازیابی کامل", callback_data='full_restore')],
-            [InlineKeyboardButton("📦 پشتیبان انبار", callback_data='inventory_backup')],
-            [InlineKeyboardButton("📂 بازیابی انبار", callback_data='inventory_restore')],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
-        ]
-        await query.edit_message_text("💾 **مدیریت پشتیبان**", reply_markup=InlineKeyboardMarkup(keyboard),
-                                      parse_mode='Markdown')
-
-    elif query.data == 'full_backup':
-        await query.edit_message_text("💾 در حال تهیه پشتیبان...")
-        fn = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(fn, 'w', encoding='utf-8') as f:
-            json.dump(bot_accounting.data, f, ensure_ascii=False, indent=2)
-        with open(fn, 'rb') as f:
-            await context.bot.send_document(chat_id=update.effective_chat.id, document=f, filename=fn,
-                                            caption="📦 پشتیبان کامل")
-        os.remove(fn)
-
-    elif query.data == 'full_restore':
-        context.user_data['action'] = 'full_restore'
-        await query.edit_message_text("🔄 فایل پشتیبان را ارسال کن:")
-
-    elif query.data == 'inventory_backup':
-        await query.edit_message_text("📦 در حال تهیه پشتیبان...")
-        items = [p for p in bot_accounting.data['purchases'] if not p.get('sold', False)]
-        data = {'date': str(datetime.now()), 'type': 'inventory', 'items': items}
-        fn = f"inventory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(fn, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        with open(fn, 'rb') as f:
-            await context.bot.send_document(chat_id=update.effective_chat.id, document=f, filename=fn,
-                                            caption="📦 پشتیبان انبار")
-        os.remove(fn)
-
-    elif query.data == 'inventory_restore':
-        context.user_data['action'] = 'inventory_restore'
-        await query.edit_message_text("📂 فایل پشتیبان را ارسال کن:")
-
-    # ========== تنظیمات ==========
-    elif query.data == 'settings_menu':
-        keyboard = [
-            [InlineKeyboardButton("💰 سرمایه اولیه", callback_data='set_initial_capital')],
-            [InlineKeyboardButton("📝 راهنما", callback_data='help')],
-            [InlineKeyboardButton("🧹 پاک کردن همه", callback_data='clear_all')],
-            [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
-        ]
-        await query.edit_message_text("⚙️ **تنظیمات**", reply_markup=InlineKeyboardMarkup(keyboard),
-                                      parse_mode='Markdown')
 
-    elif query.data == 'set_initial_capital':
-        context.user_data['action'] = 'set_capital'
-        await query.edit_message_text("💰 مبلغ سرمایه اولیه را وارد کن:")
+@router.route('main_menu')
+async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [
+        [InlineKeyboardButton("💰 ثبت فروش", callback_data='sell_menu'),
+         InlineKeyboardButton("🛒 ثبت خرید", callback_data='buy_menu')],
+        [InlineKeyboardButton("📋 لیست فروش‌ها", callback_data='list_sales_menu'),
+         InlineKeyboardButton("📋 لیست خریدها", callback_data='list_buys_menu')],
+        [InlineKeyboardButton("💸 هزینه‌های جاری", callback_data='costs_menu'),
+         InlineKeyboardButton("📜 تراکنش‌ها", callback_data='transactions')],
+        [InlineKeyboardButton("👥 تراکنش شرکا", callback_data='partner_menu'),
+         InlineKeyboardButton("💳 مدیریت بدهی", callback_data='debt_menu')],
+        [InlineKeyboardButton("💾 پشتیبان و بازیابی", callback_data='backup_menu'),
+         InlineKeyboardButton("⚙️ تنظیمات", callback_data='settings_menu')],
+        [InlineKeyboardButton("📊 داشبورد", callback_data='dashboard'),
+         InlineKeyboardButton("🔍 جستجو", callback_data='search_menu')]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text("🎯 **منوی اصلی**", reply_markup=reply_markup, parse_mode='Markdown')
+
+
+@router.route('dashboard')
+async def dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    stats = bot_accounting.get_statistics()
+    keyboard = [[InlineKeyboardButton("📅 گزارش دوره‌ای", callback_data='report_day'),
+                 InlineKeyboardButton("📈 تحلیل", callback_data='analytics')],
+                [InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(stats, reply_markup=reply_markup, parse_mode='Markdown')
+
+
+# ---------- گزارش دوره‌ای ----------
+
+# تعداد دوره‌ی نمایش داده‌شده در هر گزارش
+REPORT_SPANS = {'day': 7, 'week': 8, 'month': 12}
+REPORT_TITLES = {'day': "روزانه", 'week': "هفتگی", 'month': "ماهانه"}
+REPORT_ALIASES = {'روز': 'day', 'روزانه': 'day', 'هفته': 'week', 'هفتگی': 'week', 'ماه': 'month', 'ماهانه': 'month'}
+
+
+def report_text(period, count):
+    rows = bot_accounting.reports.recent(period, count)
+    text = f"📅 **گزارش {REPORT_TITLES[period]}** ({count} دوره‌ی اخیر)\n\n"
+    for key, b in rows:
+        if not any(b.values()):
+            text += f"▫️ {period_label(period, key)}: بدون گردش\n"
+            continue
+        text += f"📆 **{period_label(period, key)}**\n"
+        text += f"   💰 فروش: {b['sales']} عدد، {format_price(b['revenue'])} ت | 📈 سود: {format_price(b['profit'])} ت\n"
+        text += f"   🛒 خرید: {b['purchases']} عدد، {format_price(b['purchase_value'])} ت | 💸 هزینه: {format_price(b['costs'])} ت\n"
+        text += f"   💵 ورودی: {format_price(b['cash_in'])} ت | خروجی: {format_price(b['cash_out'])} ت\n"
+    total = bot_accounting.reports.total(rows)
+    text += "\n📊 **جمع دوره‌ها:**\n"
+    text += f"└─ فروش: {total['sales']} عدد ({format_price(total['revenue'])} ت)\n"
+    text += f"└─ سود خالص: {format_price(total['profit'] - total['costs'])} ت\n"
+    text += f"└─ جریان نقد: {format_price(total['cash_in'] - total['cash_out'])} ت"
+    return text
+
+
+@router.route('report_<str:period>')
+async def report_view(update: Update, context: ContextTypes.DEFAULT_TYPE, period='day', count=None):
+    period = period if period in REPORT_SPANS else 'day'
+    keyboard = [[InlineKeyboardButton(("• " if p == period else "") + REPORT_TITLES[p], callback_data=f"report_{p}")
+                 for p in REPORT_SPANS],
+                [InlineKeyboardButton("🔙 داشبورد", callback_data='dashboard')]]
+    await show_page(update, report_text(period, count or REPORT_SPANS[period]), keyboard)
+
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/report [روز|هفته|ماه] [تعداد]"""
+    args = context.args or []
+    period = REPORT_ALIASES.get(args[0], args[0]) if args else 'day'
+    count = None
+    if len(args) > 1:
+        try:
+            count = min(max(parse_amount(args[1]), 1), 60)
+        except ValueError:
+            pass
+    await report_view(update, context, period, count)
+
+
+# ---------- تحلیل ----------
+
+def analytics_text(ledger):
+    text = "📈 **تحلیل فروش**\n\n🏷 **سودآورترین مدل‌ها:**\n"
+    for model, count, revenue, profit, margin in analytics.by_model(ledger)[:10]:
+        text += f"└─ {model}: {count} عدد، سود {format_price(profit)} ت ({margin:.1f}٪)\n"
+    distribution = analytics.profit_distribution(ledger)
+    if distribution:
+        q = distribution['percentiles']
+        text += "\n📊 **سود هر فروش:**\n"
+        text += f"└─ میانگین: {format_price(distribution['mean'])} ت | میانه: {format_price(q[50])} ت\n"
+        text += f"└─ ۱۰٪ پایین: {format_price(q[10])} ت | ۱۰٪ بالا: {format_price(q[90])} ت\n"
+        text += f"└─ زیان‌ده: {distribution['losses']} از {distribution['count']}\n"
+    text += "\n📦 **سن کالاهای انبار (روز):**\n"
+    for label, count, value in analytics.inventory_aging(ledger):
+        if count:
+            text += f"└─ {label}: {count} عدد ({format_price(value)} ت)\n"
+    customers = analytics.by_customer(ledger)[:5]
+    if customers:
+        text += "\n👤 **بهترین مشتری‌ها:**\n"
+        for name, count, revenue, profit in customers:
+            text += f"└─ {name}: {count} خرید، {format_price(revenue)} ت\n"
+    return text
+
+
+@router.route('analytics')
+async def analytics_view(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # ساختن ستون‌ها و گروه‌بندی در thread جدا تا event loop برای دفترهای بزرگ منتظر نماند
+    ledger = await asyncio.to_thread(analytics.load, bot_accounting)
+    text = await asyncio.to_thread(analytics_text, ledger)
+    await show_page(update, text, [[InlineKeyboardButton("🔙 داشبورد", callback_data='dashboard')]])
+
+
+# ---------- فروش ----------
+
+@router.route('sell_menu')
+@router.route('sell_menu_<int:cursor>')
+async def sell_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
+    query = update.callback_query
+    page = bot_accounting.pages.page('unsold', cursor)
+    if not page.total:
+        await query.edit_message_text("❌ گوشی موجود نیست!", reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]))
+        return
+    text = "💰 **ثبت فروش**\n\n" + page_header(page) + "انتخاب کنید:\n"
+    keyboard = []
+    for i, p in enumerate(page.records, page.number):
+        keyboard.append([InlineKeyboardButton(f"{i}. {p['model']} - {format_price(p['total_cost'])} ت",
+                                              callback_data=f"sell_select_{p['id']}")])
+    keyboard += page_buttons('sell_menu', page)
+    keyboard.append([InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+@router.route('sell_select_<int:pid>')
+async def sell_select(update: Update, context: ContextTypes.DEFAULT_TYPE, pid):
+    query = update.callback_query
+    p = bot_accounting.get_purchase(pid)
+    if not p:
+        await query.edit_message_text("❌ یافت نشد.")
+        return
+    if p.get('sold'):
+        await query.edit_message_text("❌ این کالا قبلاً فروخته شده.", reply_markup=menu_button("💰 فروش", 'sell_menu'))
+        return
+    forms.begin(context.user_data, 'new_sell', sell_purchase_id=pid)
+    await query.edit_message_text(
+        f"📱 {p['model']}\n💰 خرید: {format_price(p['total_cost'])} ت\n\nقیمت فروش را وارد کن:")
+
+
+# ---------- خرید ----------
+
+@router.route('buy_menu')
+async def buy_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    forms.begin(context.user_data, 'new_buy')
+    await query.edit_message_text("📱 مدل گوشی را وارد کن:")
+
+
+# ---------- لیست خریدها ----------
 
-    elif query.data == 'help':
-        help_text = """
+@router.route('list_buys_menu')
+@router.route('list_buys_menu_<int:cursor>')
+async def list_buys_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
+    query = update.callback_query
+    if not bot_accounting.data['purchases']:
+        await query.edit_message_text("❌ خریدی نیست.", reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]))
+        return
+    page = bot_accounting.pages.page('purchases', cursor)
+    text = "📋 **لیست خریدها**\n\n" + page_header(page)
+    keyboard = []
+    for i, p in enumerate(page.records, page.number):
+        status = "✅" if p.get('sold') else "🟢"
+        keyboard.append([InlineKeyboardButton(f"{i}. {p['model']} - {format_price(p['total_cost'])} ت {status}",
+                                              callback_data=f"view_purchase_{p['id']}")])
+    keyboard += page_buttons('list_buys_menu', page)
+    keyboard.append([InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+@router.route('view_purchase_<int:pid>')
+async def view_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE, pid):
+    query = update.callback_query
+    p = bot_accounting.get_purchase(pid)
+    if not p:
+        await query.edit_message_text("❌ یافت نشد.")
+        return
+    remaining = p.get('remaining_debt', p.get('purchase_debt', 0)) - bot_accounting.get_total_purchase_payments(pid)
+    text = f"📱 **{p['model']}**\n📅 {p['date']}\n💰 {format_price(p['total_cost'])} ت\n"
+    if p.get('purchase_debt', 0) > 0:
+        text += f"⚠️ بدهی: {format_price(p['purchase_debt'])} ت\n💸 پرداخت شده: {format_price(bot_accounting.get_total_purchase_payments(pid))} ت\n"
+    text += f"📌 {'✅ فروخته شده' if p.get('sold') else '🟢 در انبار'}"
+    keyboard = []
+    if not p.get('sold'):
+        keyboard.append([InlineKeyboardButton("✏️ ویرایش", callback_data=f"edit_purchase_{pid}"),
+                         InlineKeyboardButton("❌ حذف", callback_data=f"delete_purchase_{pid}")])
+    else:
+        keyboard.append([InlineKeyboardButton("❌ حذف", callback_data=f"delete_purchase_{pid}")])
+    if p.get('purchase_debt', 0) > 0 and remaining > 0:
+        keyboard.append([InlineKeyboardButton("💳 پرداخت بدهی", callback_data=f"pay_purchase_{pid}")])
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='list_buys_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+# ---------- لیست فروش‌ها ----------
+
+@router.route('list_sales_menu')
+@router.route('list_sales_menu_<int:cursor>')
+async def list_sales_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
+    query = update.callback_query
+    if not bot_accounting.data['sales']:
+        await query.edit_message_text("❌ فروشی نیست.", reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]))
+        return
+    page = bot_accounting.pages.page('sales', cursor)
+    text = "📋 **لیست فروش‌ها**\n\n" + page_header(page)
+    keyboard = []
+    for i, s in enumerate(page.records, page.number):
+        emoji = "📈" if s.get('profit', 0) >= 0 else "📉"
+        keyboard.append([InlineKeyboardButton(f"{i}. {s['model']} - {format_price(s['sell_price'])} ت {emoji}",
+                                              callback_data=f"view_sale_{s['id']}")])
+    keyboard += page_buttons('list_sales_menu', page)
+    keyboard.append([InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+@router.route('view_sale_<int:sid>')
+async def view_sale(update: Update, context: ContextTypes.DEFAULT_TYPE, sid):
+    query = update.callback_query
+    s = bot_accounting.get_sale(sid)
+    if not s:
+        await query.edit_message_text("❌ یافت نشد.")
+        return
+    remaining = s.get('remaining_debt', s.get('debt', 0)) - bot_accounting.get_total_sale_payments(sid)
+    text = f"💰 **{s['model']}**\n📅 {s['date']}\n💰 خرید: {format_price(s.get('purchase_price', 0))} ت\n💰 فروش: {format_price(s['sell_price'])} ت\n📊 سود: {format_price(s.get('profit', 0))} ت\n"
+    if s.get('debt', 0) > 0:
+        text += f"⚠️ بدهی: {format_price(s['debt'])} ت\n💸 دریافت شده: {format_price(bot_accounting.get_total_sale_payments(sid))} ت\n"
+    if s.get('customer_name'):
+        text += f"👤 {s['customer_name']}\n"
+    keyboard = [
+        [InlineKeyboardButton("✏️ ویرایش", callback_data=f"edit_sale_{sid}"),
+         InlineKeyboardButton("❌ حذف", callback_data=f"delete_sale_{sid}")]
+    ]
+    if s.get('debt', 0) > 0 and remaining > 0:
+        keyboard.append([InlineKeyboardButton("💳 دریافت بدهی", callback_data=f"pay_sale_{sid}")])
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='list_sales_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+# ---------- هزینه‌ها ----------
+
+@router.route('costs_menu')
+async def costs_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [
+        [InlineKeyboardButton("➕ ثبت هزینه", callback_data='new_cost')],
+        [InlineKeyboardButton("📋 لیست هزینه‌ها", callback_data='list_costs')],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
+    ]
+    await query.edit_message_text("💸 **هزینه‌ها**", reply_markup=InlineKeyboardMarkup(keyboard),
+                                  parse_mode='Markdown')
+
+
+@router.route('new_cost')
+async def new_cost(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    forms.begin(context.user_data, 'new_cost')
+    await query.edit_message_text("📝 عنوان هزینه را وارد کن:")
+
+
+@router.route('list_costs')
+@router.route('list_costs_<int:cursor>')
+async def list_costs(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
+    query = update.callback_query
+    if not bot_accounting.data['costs']:
+        await query.edit_message_text("❌ هزینه‌ای نیست.", reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 بازگشت", callback_data='costs_menu')]]))
+        return
+    page = bot_accounting.pages.page('costs', cursor)
+    text = "📋 **لیست هزینه‌ها**\n\n" + page_header(page)
+    keyboard = []
+    for i, c in enumerate(page.records, page.number):
+        keyboard.append([InlineKeyboardButton(f"{i}. {c['title']} - {format_price(c['amount'])} ت",
+                                              callback_data=f"view_cost_{c['id']}")])
+    keyboard += page_buttons('list_costs', page)
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='costs_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+@router.route('view_cost_<int:cid>')
+async def view_cost(update: Update, context: ContextTypes.DEFAULT_TYPE, cid):
+    query = update.callback_query
+    c = bot_accounting.get_cost(cid)
+    if not c:
+        await query.edit_message_text("❌ یافت نشد.")
+        return
+    text = f"💸 **{c['title']}**\n📅 {c['date']}\n💰 {format_price(c['amount'])} ت\n"
+    if c.get('description'):
+        text += f"📌 {c['description']}\n"
+    keyboard = [
+        [InlineKeyboardButton("✏️ ویرایش", callback_data=f"edit_cost_{cid}"),
+         InlineKeyboardButton("❌ حذف", callback_data=f"delete_cost_{cid}")],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data='list_costs')]
+    ]
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+# ---------- شرکا ----------
+
+@router.route('partner_menu')
+async def partner_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [
+        [InlineKeyboardButton("👤 تراکنش رضا", callback_data='partner_reza')],
+        [InlineKeyboardButton("👤 تراکنش میلاد", callback_data='partner_milad')],
+        [InlineKeyboardButton("📜 لیست تراکنش‌ها", callback_data='list_partner')],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
+    ]
+    await query.edit_message_text("👥 **شرکا**\n\nهزینه شخصی به هزینه‌ها اضافه می‌شود",
+                                  reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+@router.route('partner_reza')
+async def partner_reza(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    forms.begin(context.user_data, 'partner_transaction', partner='reza')
+    await query.edit_message_text(
+        "👤 **رضا**\n\n1️⃣ برداشت نقدی\n2️⃣ واریز نقدی\n3️⃣ هزینه شخصی\n4️⃣ استفاده دارایی\n\nشماره را وارد کن:")
+
+
+@router.route('partner_milad')
+async def partner_milad(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    forms.begin(context.user_data, 'partner_transaction', partner='milad')
+    await query.edit_message_text(
+        "👤 **میلاد**\n\n1️⃣ برداشت نقدی\n2️⃣ واریز نقدی\n3️⃣ هزینه شخصی\n4️⃣ استفاده دارایی\n\nشماره را وارد کن:")
+
+
+@router.route('list_partner')
+@router.route('list_partner_<int:cursor>')
+async def list_partner(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
+    query = update.callback_query
+    if not bot_accounting.data['partner_transactions']:
+        await query.edit_message_text("❌ تراکنشی نیست.", reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 بازگشت", callback_data='partner_menu')]]))
+        return
+    page = bot_accounting.pages.page('partner_transactions', cursor, 20)
+    text = "👥 **تراکنش‌ها**\n\n" + page_header(page)
+    for i, t in enumerate(page.records, page.number):
+        partner = "رضا" if t['partner'] == 'reza' else "میلاد"
+        type_text = {'cash_withdraw': 'برداشت', 'cash_deposit': 'واریز', 'personal_expense': 'هزینه شخصی',
+                     'company_asset_use': 'استفاده دارایی', 'other': 'سایر'}.get(t['type'], t['type'])
+        text += f"{i}. {partner} - {type_text}\n   📅 {t['date']} | 💰 {format_price(t['amount'])} ت\n   📝 {t['description'][:30]}\n\n"
+    keyboard = page_buttons('list_partner', page)
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='partner_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+# ---------- بدهی ----------
+
+@router.route('debt_menu')
+async def debt_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    sales, purchase = bot_accounting.aggregates.remaining_debts()
+    text = f"💳 **بدهی‌ها**\n\n⚠️ فروش: {format_price(sales)} ت\n⚠️ خرید: {format_price(purchase)} ت\n\n"
+    keyboard = [
+        [InlineKeyboardButton("💳 دریافت بدهی فروش", callback_data='pay_sale_debt')],
+        [InlineKeyboardButton("💳 پرداخت بدهی خرید", callback_data='pay_purchase_debt')],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
+    ]
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+@router.route('pay_sale_debt')
+async def pay_sale_debt(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    sales = bot_accounting.open_debts('sales')
+    if not sales:
+        await query.edit_message_text("✅ بدهی معوقی نیست.", reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 بازگشت", callback_data='debt_menu')]]))
+        return
+    text = "💳 **دریافت بدهی**\n\n"
+    keyboard = []
+    for i, (s, r) in enumerate(sales[-10:], 1):
+        keyboard.append([InlineKeyboardButton(f"{i}. {s['model']} - {format_price(r)} ت",
+                                              callback_data=f"pay_sale_{s['id']}")])
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='debt_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+@router.route('pay_purchase_debt')
+async def pay_purchase_debt(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    purchases = bot_accounting.open_debts('purchases')
+    if not purchases:
+        await query.edit_message_text("✅ بدهی معوقی نیست.", reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🔙 بازگشت", callback_data='debt_menu')]]))
+        return
+    text = "💳 **پرداخت بدهی**\n\n"
+    keyboard = []
+    for i, (p, r) in enumerate(purchases[-10:], 1):
+        keyboard.append([InlineKeyboardButton(f"{i}. {p['model']} - {format_price(r)} ت",
+                                              callback_data=f"pay_purchase_{p['id']}")])
+    keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='debt_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
+
+
+@router.route('pay_sale_<int:sid>')
+async def pay_sale(update: Update, context: ContextTypes.DEFAULT_TYPE, sid):
+    query = update.callback_query
+    s = bot_accounting.get_sale(sid)
+    if not s:
+        await query.edit_message_text("❌ یافت نشد.")
+        return
+    remaining = s.get('remaining_debt', s.get('debt', 0)) - bot_accounting.get_total_sale_payments(sid)
+    forms.begin(context.user_data, 'pay_sale_debt', payment_sale_id=sid)
+    await query.edit_message_text(f"💳 {s['model']}\n⚠️ باقی‌مانده: {format_price(remaining)} ت\n\n"
+                                  f"مبلغ دریافتی را وارد کن:")
+
+
+@router.route('pay_purchase_<int:pid>')
+async def pay_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE, pid):
+    query = update.callback_query
+    p = bot_accounting.get_purchase(pid)
+    if not p:
+        await query.edit_message_text("❌ یافت نشد.")
+        return
+    remaining = p.get('remaining_debt', p.get('purchase_debt', 0)) - bot_accounting.get_total_purchase_payments(pid)
+    forms.begin(context.user_data, 'pay_purchase_debt', payment_purchase_id=pid)
+    await query.edit_message_text(f"💳 {p['model']}\n⚠️ باقی‌مانده: {format_price(remaining)} ت\n\n"
+                                  f"مبلغ پرداختی را وارد کن:")
+
+
+# ---------- پشتیبان ----------
+
+@router.route('backup_menu')
+async def backup_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [
+        [InlineKeyboardButton("💾 پشتیبان کامل", callback_data='full_backup'),
+         InlineKeyboardButton("🗜 پشتیبان فشرده", callback_data='full_backup_gz')],
+        [InlineKeyboardButton("🔄 بازیابی کامل", callback_data='full_restore')],
+        [InlineKeyboardButton("🧩 پشتیبان افزایشی", callback_data='incremental_backup'),
+         InlineKeyboardButton("🧩 بازیابی زنجیره‌ای", callback_data='chain_restore')],
+        [InlineKeyboardButton("📦 پشتیبان انبار", callback_data='inventory_backup')],
+        [InlineKeyboardButton("📂 بازیابی انبار", callback_data='inventory_restore')],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
+    ]
+    await query.edit_message_text("💾 **مدیریت پشتیبان**", reply_markup=InlineKeyboardMarkup(keyboard),
+                                  parse_mode='Markdown')
+
+
+def record_full_backup():
+    """ثبت پایه‌ی زنجیره؛ فقط کپی سطحی زیر storage.lock و اثر انگشت‌ها بیرون از آن (قابل اجرا در thread)"""
+    with backup_manifest.lock:
+        with bot_accounting.storage.lock:
+            data, _ = backup_manifest.take(bot_accounting.data)
+        return backup_manifest.record_full(data), data
+
+
+def record_incremental_backup():
+    """ساخت پشتیبان افزایشی مثل record_full_backup (قابل اجرا در thread)؛ None اگر پایه‌ای نباشد"""
+    with backup_manifest.lock:
+        with bot_accounting.storage.lock:
+            data, changed = backup_manifest.take(bot_accounting.data)
+        return backup_manifest.make_delta(data, changed)
+
+
+@router.route('full_backup')
+async def full_backup(update: Update, context: ContextTypes.DEFAULT_TYPE, compress=False):
+    query = update.callback_query
+    await query.edit_message_text("💾 در حال تهیه پشتیبان...")
+    fn = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json" + ('.gz' if compress else '')
+    # اثر انگشت همه‌ی رکوردها در thread جدا؛ پشتیبان از همان کپی ساخته می‌شود تا با manifest یکی باشد
+    meta, data = await asyncio.to_thread(record_full_backup)
+    buffer = await build_backup({**data, '_backup': meta}, compress=compress)
+    try:
+        with buffer:
+            await context.bot.send_document(chat_id=update.effective_chat.id, document=buffer, filename=fn,
+                                            caption=f"📦 پشتیبان کامل\n🆔 {meta['id']}")
+    except Exception:
+        backup_manifest.invalidate()
+        raise
+
+
+@router.route('full_backup_gz')
+async def full_backup_gz(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await full_backup(update, context, compress=True)
+
+
+@router.route('incremental_backup')
+async def incremental_backup(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    # بعد از شروع دوباره tracker خالی است و همه‌ی رکوردها با اثر انگشت مقایسه می‌شوند؛ در thread جدا
+    delta = await asyncio.to_thread(record_incremental_backup)
+    if delta is None:
+        await query.edit_message_text("ℹ️ پشتیبان پایه‌ای نیست؛ پشتیبان کامل تهیه می‌شود...")
+        await full_backup(update, context, compress=True)
+        return
+    await query.edit_message_text("🧩 در حال تهیه پشتیبان افزایشی...")
+    count = backup_manifest.chain[-1]['records']
+    fn = f"backup_inc_{delta['backup_id']}.json.gz"
+    buffer = await build_backup(delta, compress=True)
+    try:
+        with buffer:
+            await context.bot.send_document(chat_id=update.effective_chat.id, document=buffer, filename=fn,
+                                            caption=f"🧩 پشتیبان افزایشی ({count} تغییر)\n"
+                                                    f"🆔 {delta['backup_id']}\n⬅️ پایه: {delta['base']}")
+    except Exception:
+        backup_manifest.invalidate()
+        raise
+
+
+@router.route('chain_restore')
+async def chain_restore(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    close_chain(context.user_data)
+    context.user_data.clear()
+    context.user_data['action'] = 'chain_restore'
+    await query.edit_message_text("🧩 ابتدا پشتیبان کامل و سپس پشتیبان‌های افزایشی را به ترتیب ارسال کن:")
+
+
+def close_chain(user_data):
+    """بستن فایل‌های دریافت‌شده‌ی بازیابی زنجیره‌ای"""
+    for buffer in user_data.pop('chain_files', []):
+        buffer.close()
+
+
+@router.route('apply_chain_restore')
+async def apply_chain_restore(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    files = context.user_data.get('chain_files')
+    if context.user_data.get('action') != 'chain_restore' or not files:
+        await query.edit_message_text("❌ پشتیبانی دریافت نشده.")
+        return
+    await query.edit_message_text("⏳ در حال بازیابی...")
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton("💾 پشتیبان", callback_data='backup_menu')]])
+    try:
+        # مثل بازیابی کامل: خواندن و اعتبارسنجی در thread جدا و جایگزینی یکجا در پایان موفق
+        data, staged = bot_accounting.get_default_data(), bot_accounting.staging_observers()
+        last = await asyncio.to_thread(load_chain, files, staged, data)
+        bot_accounting.install(data, staged)
+        backup_manifest.invalidate()
+    except RestoreError as e:
+        await query.edit_message_text(f"❌ فایل نامعتبر است؛ چیزی تغییر نکرد.\n{e}", reply_markup=markup)
+        return
+    except Exception as e:
+        await query.edit_message_text(f"❌ خطا: {e}", reply_markup=markup)
+        return
+    finally:
+        close_chain(context.user_data)
+        context.user_data.clear()
+    await query.edit_message_text(f"✅ بازیابی شد ({len(files)} فایل).\n🆔 آخرین: {last}", reply_markup=markup)
+
+
+@router.route('full_restore')
+async def full_restore(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    context.user_data['action'] = 'full_restore'
+    await query.edit_message_text("🔄 فایل پشتیبان را ارسال کن:")
+
+
+@router.route('inventory_backup')
+async def inventory_backup(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.edit_message_text("📦 در حال تهیه پشتیبان...")
+    pages = bot_accounting.pages
+    items = [pages.records['unsold'][pid] for pid in pages.ids['unsold']]
+    data = {'date': str(datetime.now()), 'type': 'inventory', 'items': items}
+    fn = f"inventory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    buffer = await build_backup(data)
+    with buffer:
+        await context.bot.send_document(chat_id=update.effective_chat.id, document=buffer, filename=fn,
+                                        caption="📦 پشتیبان انبار")
+
+
+@router.route('inventory_restore')
+async def inventory_restore(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    context.user_data['action'] = 'inventory_restore'
+    await query.edit_message_text("📂 فایل پشتیبان را ارسال کن:")
+
+
+# ---------- تنظیمات ----------
+
+@router.route('settings_menu')
+async def settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [
+        [InlineKeyboardButton("💰 سرمایه اولیه", callback_data='set_initial_capital')],
+        [InlineKeyboardButton("📝 راهنما", callback_data='help')],
+        [InlineKeyboardButton("🧹 پاک کردن همه", callback_data='clear_all')],
+        [InlineKeyboardButton("🔙 بازگشت", callback_data='main_menu')]
+    ]
+    await query.edit_message_text("⚙️ **تنظیمات**", reply_markup=InlineKeyboardMarkup(keyboard),
+                                  parse_mode='Markdown')
+
+
+@router.route('set_initial_capital')
+async def set_initial_capital(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    forms.begin(context.user_data, 'set_capital')
+    await query.edit_message_text("💰 مبلغ سرمایه اولیه را وارد کن:")
+
+
+@router.route('help')
+async def help_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    help_text = """
 ❓ **راهنما**
 
 🛒 **ثبت خرید:** مدل، قیمت، هزینه‌ها، بدهی
@@ -610,639 +1215,648 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 👥 **شرکا:** تراکنش رضا و میلاد
 💳 **بدهی‌ها:** دریافت و پرداخت
 💾 **پشتیبان:** کامل و انبار
+📈 **تحلیل:** /analytics سود هر مدل، سن انبار، بهترین مشتری‌ها
+📅 **گزارش:** `/report روز|هفته|ماه` با تعداد دوره، مثلاً `/report ماه 6`
+🔍 **جستجو:** `/search سامسونگ از:1403/01/01 تا:1403/06/31 فروخته:نه`
 ⚙️ **تنظیمات:** سرمایه، پاک کردن
 
 📝 برای انصراف /cancel بزن
-        """
-        await query.edit_message_text(help_text, parse_mode='Markdown')
+    """
+    await query.edit_message_text(help_text, parse_mode='Markdown')
 
-    elif query.data == 'clear_all':
-        keyboard = [
-            [InlineKeyboardButton("✅ بله", callback_data='confirm_clear')],
-            [InlineKeyboardButton("❌ خیر", callback_data='settings_menu')]
-        ]
-        await query.edit_message_text("⚠️ همه داده‌ها پاک شوند؟", reply_markup=InlineKeyboardMarkup(keyboard))
 
-    elif query.data == 'confirm_clear':
-        bot_accounting.data = bot_accounting.get_default_data()
-        bot_accounting.save_data()
-        await query.edit_message_text("✅ پاک شد.", reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton("🏠 منو", callback_data='main_menu')]]))
-
-    # ========== تراکنش‌ها ==========
-    elif query.data == 'transactions':
-        if not bot_accounting.data['transactions']:
-            await query.edit_message_text("❌ تراکنشی نیست.", reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]))
-            return
-        text = "📜 **تراکنش‌ها**\n\n"
-        for i, t in enumerate(bot_accounting.data['transactions'][-15:], 1):
-            emoji = "💰" if t['amount'] > 0 else "💸"
-            text += f"{i}. {emoji} {t['type']} - {t['date']}\n   {t['model']} | {format_price(abs(t['amount']))} ت\n"
-        await query.edit_message_text(text, parse_mode='Markdown')
-
-    # ========== ویرایش/حذف خرید ==========
-    elif query.data.startswith('edit_purchase_'):
-        pid = int(query.data.replace('edit_purchase_', ''))
-        p = next((p for p in bot_accounting.data['purchases'] if p['id'] == pid))
-        if p.get('sold'):
-            await query.edit_message_text("❌ قابل ویرایش نیست")
-            return
-        context.user_data['edit_purchase_id'] = pid
-        context.user_data['action'] = 'edit_purchase'
-        context.user_data['step'] = 'waiting_buy_model'
-        context.user_data.update({
-            'buy_model': p['model'], 'buy_price': p['buy_price'],
-            'buy_delivery': p.get('delivery_cost', 0), 'buy_extra': p.get('extra_cost', 0),
-            'buy_debt': p.get('purchase_debt', 0), 'original_notes': p.get('notes', '')
-        })
-        await query.edit_message_text(f"✏️ مدل جدید ({p['model']}) را وارد کن:")
-
-    elif query.data.startswith('delete_purchase_'):
-        pid = int(query.data.replace('delete_purchase_', ''))
-        context.user_data['delete_purchase_id'] = pid
-        keyboard = [
-            [InlineKeyboardButton("✅ بله", callback_data='confirm_delete_purchase')],
-            [InlineKeyboardButton("❌ خیر", callback_data='list_buys_menu')]
-        ]
-        await query.edit_message_text("⚠️ حذف شود؟", reply_markup=InlineKeyboardMarkup(keyboard))
-
-    elif query.data == 'confirm_delete_purchase':
-        pid = context.user_data.get('delete_purchase_id')
-        if pid:
-            bot_accounting.data['purchases'] = [p for p in bot_accounting.data['purchases'] if p['id'] != pid]
-            bot_accounting.data['transactions'] = [t for t in bot_accounting.data['transactions']
-                                                   if not (t.get('type') == 'خرید' and t.get('purchase_id') == pid)]
-            bot_accounting.data['purchase_debt_payments'] = [p for p in bot_accounting.data['purchase_debt_payments']
-                                                             if p['purchase_id'] != pid]
-            bot_accounting.save_data()
-        context.user_data.pop('delete_purchase_id', None)
-        await query.edit_message_text("✅ حذف شد.", reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton("📋 لیست", callback_data='list_buys_menu')]]))
-
-    # ========== ویرایش/حذف فروش ==========
-    elif query.data.startswith('edit_sale_'):
-        sid = int(query.data.replace('edit_sale_', ''))
-        s = next((s for s in bot_accounting.data['sales'] if s['id'] == sid))
-        context.user_data['edit_sale_id'] = sid
-        context.user_data['action'] = 'edit_sale'
-        context.user_data['step'] = 'waiting_sell_price'
-        context.user_data.update({
-            'sell_price': s['sell_price'], 'sell_debt': s.get('debt', 0),
-            'sell_customer': s.get('customer_name', ''), 'sell_phone': s.get('customer_phone', ''),
-            'original_notes': s.get('notes', '')
-        })
-        await query.edit_message_text(f"✏️ قیمت جدید ({format_price(s['sell_price'])} ت) را وارد کن:")
-
-    elif query.data.startswith('delete_sale_'):
-        sid = int(query.data.replace('delete_sale_', ''))
-        context.user_data['delete_sale_id'] = sid
-        keyboard = [
-            [InlineKeyboardButton("✅ بله", callback_data='confirm_delete_sale')],
-            [InlineKeyboardButton("❌ خیر", callback_data='list_sales_menu')]
-        ]
-        await query.edit_message_text("⚠️ حذف شود؟", reply_markup=InlineKeyboardMarkup(keyboard))
-
-    elif query.data == 'confirm_delete_sale':
-        sid = context.user_data.get('delete_sale_id')
-        if sid:
-            s = next((s for s in bot_accounting.data['sales'] if s['id'] == sid), None)
-            if s:
-                p = next((p for p in bot_accounting.data['purchases'] if p['id'] == s['purchase_id']), None)
-                if p:
-                    p['sold'] = False
-                bot_accounting.data['sales'] = [x for x in bot_accounting.data['sales'] if x['id'] != sid]
-                bot_accounting.data['transactions'] = [t for t in bot_accounting.data['transactions']
-                                                       if not (t.get('type') == 'فروش' and t.get('sale_id') == sid)]
-                bot_accounting.data['debt_payments'] = [d for d in bot_accounting.data['debt_payments']
-                                                        if d['sale_id'] != sid]
-                bot_accounting.save_data()
-        context.user_data.pop('delete_sale_id', None)
-        await query.edit_message_text("✅ حذف شد.", reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton("📋 لیست", callback_data='list_sales_menu')]]))
-
-    # ========== ویرایش/حذف هزینه ==========
-    elif query.data.startswith('edit_cost_'):
-        cid = int(query.data.replace('edit_cost_', ''))
-        c = next((c for c in bot_accounting.data['costs'] if c['id'] == cid))
-        context.user_data['edit_cost_id'] = cid
-        context.user_data['action'] = 'edit_cost'
-        context.user_data['step'] = 'waiting_cost_title'
-        context.user_data.update({
-            'cost_title': c['title'], 'cost_amount': c['amount'],
-            'cost_description': c.get('description', '')
-        })
-        await query.edit_message_text(f"✏️ عنوان جدید ({c['title']}) را وارد کن:")
-
-    elif query.data.startswith('delete_cost_'):
-        cid = int(query.data.replace('delete_cost_', ''))
-        context.user_data['delete_cost_id'] = cid
-        keyboard = [
-            [InlineKeyboardButton("✅ بله", callback_data='confirm_delete_cost')],
-            [InlineKeyboardButton("❌ خیر", callback_data='list_costs')]
-        ]
-        await query.edit_message_text("⚠️ حذف شود؟", reply_markup=InlineKeyboardMarkup(keyboard))
-
-    elif query.data == 'confirm_delete_cost':
-        cid = context.user_data.get('delete_cost_id')
-        if cid:
-            c = next((c for c in bot_accounting.data['costs'] if c['id'] == cid), None)
-            if c:
-                bot_accounting.data['costs'] = [x for x in bot_accounting.data['costs'] if x['id'] != cid]
-                bot_accounting.data['transactions'] = [t for t in bot_accounting.data['transactions']
-                                                       if
-                                                       not (t.get('type') == 'هزینه' and t.get('model') == c['title'])]
-                bot_accounting.save_data()
-        context.user_data.pop('delete_cost_id', None)
-        await query.edit_message_text("✅ حذف شد.", reply_markup=InlineKeyboardMarkup([[
-            InlineKeyboardButton("📋 لیست", callback_data='list_costs')]]))
+@router.route('clear_all')
+async def clear_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    keyboard = [
+        [InlineKeyboardButton("✅ بله", callback_data='confirm_clear')],
+        [InlineKeyboardButton("❌ خیر", callback_data='settings_menu')]
+    ]
+    await query.edit_message_text("⚠️ همه داده‌ها پاک شوند؟", reply_markup=InlineKeyboardMarkup(keyboard))
 
 
-# ==================== هندلر پیام‌ها ====================
+@router.route('confirm_clear')
+async def confirm_clear(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    bot_accounting.reset(bot_accounting.get_default_data())
+    backup_manifest.invalidate()
+    await query.edit_message_text("✅ پاک شد.", reply_markup=InlineKeyboardMarkup([[
+        InlineKeyboardButton("🏠 منو", callback_data='main_menu')]]))
 
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    text = update.message.text
-    user_data = context.user_data
-    action = user_data.get('action')
 
-    if not action:
-        await update.message.reply_text("لطفاً از منو استفاده کنید.")
-        return
+# ---------- تراکنش‌ها ----------
 
-    # سرمایه اولیه
-    if action == 'set_capital':
-        try:
-            amount = int(text.replace(',', ''))
-            bot_accounting.data['initial_capital'] = amount
-            bot_accounting.data['transactions'].insert(0, {
-                'id': int(datetime.now().timestamp() * 1000), 'date': datetime.now().strftime('%Y/%m/%d'),
-                'type': 'سرمایه اولیه', 'model': '-', 'amount': amount, 'debt': 0, 'profit': 0,
-                'description': 'سرمایه اولیه'
-            })
-            bot_accounting.save_data()
-            await update.message.reply_text(f"✅ سرمایه {format_price(amount)} ت ثبت شد.",
-                                            reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("⚙️ تنظیمات", callback_data='settings_menu')]]))
-            user_data.clear()
-        except:
-            await update.message.reply_text("❌ عدد معتبر وارد کن.")
+@router.route('transactions')
+@router.route('transactions_<int:cursor>')
+async def transactions(update: Update, context: ContextTypes.DEFAULT_TYPE, cursor=None):
+    query = update.callback_query
+    if not bot_accounting.data['transactions']:
+        await query.edit_message_text("❌ تراکنشی نیست.", reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')]]))
         return
+    page = bot_accounting.pages.page('transactions', cursor, 15)
+    text = "📜 **تراکنش‌ها**\n\n" + page_header(page)
+    for i, t in enumerate(page.records, page.number):
+        emoji = "💰" if t['amount'] > 0 else "💸"
+        text += f"{i}. {emoji} {t['type']} - {t['date']}\n   {t['model']} | {format_price(abs(t['amount']))} ت\n"
+    keyboard = page_buttons('transactions', page)
+    keyboard.append([InlineKeyboardButton("🏠 بازگشت", callback_data='main_menu')])
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='Markdown')
 
-    # خرید جدید
-    if action == 'new_buy':
-        step = user_data.get('step')
-        if step == 'waiting_buy_model':
-            if text == '-':
-                user_data.clear();
-                await update.message.reply_text("❌ لغو شد.");
-                return
-            user_data['buy_model'] = text
-            user_data['step'] = 'waiting_buy_price'
-            await update.message.reply_text("💰 قیمت خرید را وارد کن:")
-        elif step == 'waiting_buy_price':
-            try:
-                user_data['buy_price'] = int(text.replace(',', ''))
-                user_data['step'] = 'waiting_buy_delivery'
-                await update.message.reply_text("🚚 هزینه پیک (0):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر وارد کن.")
-        elif step == 'waiting_buy_delivery':
-            try:
-                user_data['buy_delivery'] = int(text.replace(',', ''))
-                user_data['step'] = 'waiting_buy_extra'
-                await update.message.reply_text("💰 هزینه جانبی (0):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر وارد کن.")
-        elif step == 'waiting_buy_extra':
-            try:
-                user_data['buy_extra'] = int(text.replace(',', ''))
-                user_data['step'] = 'waiting_buy_debt'
-                await update.message.reply_text("⚠️ بدهی به فروشنده (0):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر وارد کن.")
-        elif step == 'waiting_buy_debt':
-            try:
-                user_data['buy_debt'] = int(text.replace(',', ''))
-                user_data['step'] = 'waiting_buy_notes'
-                await update.message.reply_text("📝 توضیحات (یا -):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر وارد کن.")
-        elif step == 'waiting_buy_notes':
-            notes = text if text != '-' else ''
-            total = user_data['buy_price'] + user_data['buy_delivery'] + user_data['buy_extra']
-            cash = total - user_data['buy_debt']
-            p = {
-                'id': int(datetime.now().timestamp() * 1000), 'date': datetime.now().strftime('%Y/%m/%d'),
-                'model': user_data['buy_model'], 'buy_price': user_data['buy_price'],
-                'delivery_cost': user_data['buy_delivery'], 'extra_cost': user_data['buy_extra'],
-                'total_cost': total, 'purchase_debt': user_data['buy_debt'],
-                'remaining_debt': user_data['buy_debt'], 'cash_paid': cash, 'notes': notes, 'sold': False
-            }
-            bot_accounting.data['purchases'].append(p)
-            bot_accounting.data['transactions'].insert(0, {
-                'id': int(datetime.now().timestamp() * 1000) + 1, 'date': datetime.now().strftime('%Y/%m/%d'),
-                'type': 'خرید', 'model': user_data['buy_model'], 'amount': -cash,
-                'debt': user_data['buy_debt'], 'profit': 0, 'description': f"خرید {user_data['buy_model']}"
-            })
-            bot_accounting.save_data()
-            await update.message.reply_text(f"✅ خرید ثبت شد.\n💰 {format_price(total)} ت",
-                                            reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("🏠 منو", callback_data='main_menu')]]))
-            user_data.clear()
-        return
 
-    # فروش جدید
-    if action == 'new_sell':
-        step = user_data.get('step')
-        if step == 'waiting_sell_price':
-            try:
-                user_data['sell_price'] = int(text.replace(',', ''))
-                user_data['step'] = 'waiting_sell_debt'
-                await update.message.reply_text("⚠️ بدهی مشتری (0):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر وارد کن.")
-        elif step == 'waiting_sell_debt':
-            try:
-                debt = int(text.replace(',', ''))
-                pid = user_data.get('sell_purchase_id')
-                p = next((p for p in bot_accounting.data['purchases'] if p['id'] == pid))
-                if debt > user_data['sell_price']:
-                    await update.message.reply_text("❌ بدهی بیشتر از فروش!")
-                    return
-                user_data['sell_debt'] = debt
-                user_data['step'] = 'waiting_sell_customer'
-                await update.message.reply_text("👤 نام مشتری (یا -):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر وارد کن.")
-        elif step == 'waiting_sell_customer':
-            user_data['sell_customer'] = text if text != '-' else ''
-            user_data['step'] = 'waiting_sell_phone'
-            await update.message.reply_text("📞 تلفن (یا -):")
-        elif step == 'waiting_sell_phone':
-            user_data['sell_phone'] = text if text != '-' else ''
-            user_data['step'] = 'waiting_sell_notes'
-            await update.message.reply_text("📝 توضیحات (یا -):")
-        elif step == 'waiting_sell_notes':
-            notes = text if text != '-' else ''
-            pid = user_data.get('sell_purchase_id')
-            p = next((p for p in bot_accounting.data['purchases'] if p['id'] == pid))
-            profit = user_data['sell_price'] - p['total_cost']
-            cash = user_data['sell_price'] - user_data['sell_debt']
-            s = {
-                'id': int(datetime.now().timestamp() * 1000), 'date': datetime.now().strftime('%Y/%m/%d'),
-                'purchase_id': pid, 'model': p['model'], 'purchase_price': p['total_cost'],
-                'sell_price': user_data['sell_price'], 'debt': user_data['sell_debt'],
-                'remaining_debt': user_data['sell_debt'], 'profit': profit, 'cash_received': cash,
-                'customer_name': user_data['sell_customer'], 'customer_phone': user_data['sell_phone'],
-                'notes': notes
-            }
-            bot_accounting.data['sales'].append(s)
-            p['sold'] = True
-            bot_accounting.data['transactions'].insert(0, {
-                'id': int(datetime.now().timestamp() * 1000) + 1, 'date': datetime.now().strftime('%Y/%m/%d'),
-                'type': 'فروش', 'model': p['model'], 'amount': cash,
-                'debt': user_data['sell_debt'], 'profit': profit,
-                'description': f"فروش به {user_data['sell_customer'] or 'مشتری'}"
-            })
-            bot_accounting.save_data()
-            emoji = "📈" if profit >= 0 else "📉"
-            await update.message.reply_text(f"✅ فروش ثبت شد.\n{emoji} سود: {format_price(profit)} ت",
-                                            reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("🏠 منو", callback_data='main_menu')]]))
-            user_data.clear()
-        return
+# ---------- ویرایش/حذف خرید ----------
 
-    # هزینه جدید
-    if action == 'new_cost':
-        step = user_data.get('step')
-        if step == 'waiting_cost_title':
-            if text == '-':
-                user_data.clear();
-                await update.message.reply_text("❌ لغو شد.");
-                return
-            user_data['cost_title'] = text
-            user_data['step'] = 'waiting_cost_amount'
-            await update.message.reply_text("💰 مبلغ را وارد کن:")
-        elif step == 'waiting_cost_amount':
-            try:
-                user_data['cost_amount'] = int(text.replace(',', ''))
-                user_data['step'] = 'waiting_cost_desc'
-                await update.message.reply_text("📝 توضیحات (یا -):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر وارد کن.")
-        elif step == 'waiting_cost_desc':
-            desc = text if text != '-' else ''
-            c = {
-                'id': int(datetime.now().timestamp() * 1000), 'date': datetime.now().strftime('%Y/%m/%d'),
-                'title': user_data['cost_title'], 'amount': user_data['cost_amount'], 'description': desc
-            }
-            bot_accounting.data['costs'].append(c)
-            bot_accounting.data['transactions'].insert(0, {
-                'id': int(datetime.now().timestamp() * 1000) + 1, 'date': datetime.now().strftime('%Y/%m/%d'),
-                'type': 'هزینه', 'model': user_data['cost_title'], 'amount': -user_data['cost_amount'],
-                'debt': 0, 'profit': 0, 'description': desc or user_data['cost_title']
-            })
-            bot_accounting.save_data()
-            await update.message.reply_text(f"✅ هزینه ثبت شد.",
-                                            reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("💸 هزینه‌ها", callback_data='costs_menu')]]))
-            user_data.clear()
+@router.route('edit_purchase_<int:pid>')
+async def edit_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE, pid):
+    query = update.callback_query
+    p = bot_accounting.get_purchase(pid)
+    if not p:
+        await query.edit_message_text("❌ یافت نشد.")
+        return
+    if p.get('sold'):
+        await query.edit_message_text("❌ قابل ویرایش نیست")
         return
+    forms.begin(context.user_data, 'edit_purchase', edit_purchase_id=pid,
+                edit_version=bot_accounting.version('purchases', pid),
+                buy_model=p['model'], buy_price=p['buy_price'],
+                buy_delivery=p.get('delivery_cost', 0), buy_extra=p.get('extra_cost', 0),
+                buy_debt=p.get('purchase_debt', 0), buy_notes=p.get('notes', ''))
+    await query.edit_message_text(f"✏️ مدل جدید ({p['model']}) را وارد کن:")
 
-    # ویرایش خرید
-    if action == 'edit_purchase':
-        step = user_data.get('step')
-        if step == 'waiting_buy_model':
-            if text != '-': user_data['buy_model'] = text
-            user_data['step'] = 'waiting_buy_price'
-            await update.message.reply_text("💰 قیمت جدید (یا -):")
-        elif step == 'waiting_buy_price':
-            if text != '-':
-                try:
-                    user_data['buy_price'] = int(text.replace(',', ''))
-                except:
-                    await update.message.reply_text("❌ عدد معتبر."); return
-            user_data['step'] = 'waiting_buy_delivery'
-            await update.message.reply_text("🚚 پیک جدید (یا -):")
-        elif step == 'waiting_buy_delivery':
-            if text != '-':
-                try:
-                    user_data['buy_delivery'] = int(text.replace(',', ''))
-                except:
-                    await update.message.reply_text("❌ عدد معتبر."); return
-            user_data['step'] = 'waiting_buy_extra'
-            await update.message.reply_text("💰 جانبی جدید (یا -):")
-        elif step == 'waiting_buy_extra':
-            if text != '-':
-                try:
-                    user_data['buy_extra'] = int(text.replace(',', ''))
-                except:
-                    await update.message.reply_text("❌ عدد معتبر."); return
-            user_data['step'] = 'waiting_buy_debt'
-            await update.message.reply_text("⚠️ بدهی جدید (یا -):")
-        elif step == 'waiting_buy_debt':
-            if text != '-':
-                try:
-                    user_data['buy_debt'] = int(text.replace(',', ''))
-                except:
-                    await update.message.reply_text("❌ عدد معتبر."); return
-            user_data['step'] = 'waiting_buy_notes'
-            await update.message.reply_text("📝 توضیحات جدید (یا -):")
-        elif step == 'waiting_buy_notes':
-            pid = user_data['edit_purchase_id']
-            p = next((p for p in bot_accounting.data['purchases'] if p['id'] == pid))
-            total = user_data['buy_price'] + user_data['buy_delivery'] + user_data['buy_extra']
-            cash = total - user_data['buy_debt']
-            p.update({
-                'model': user_data['buy_model'], 'buy_price': user_data['buy_price'],
-                'delivery_cost': user_data['buy_delivery'], 'extra_cost': user_data['buy_extra'],
-                'total_cost': total, 'purchase_debt': user_data['buy_debt'],
-                'remaining_debt': user_data['buy_debt'], 'cash_paid': cash,
-                'notes': text if text != '-' else user_data.get('original_notes', '')
-            })
-            bot_accounting.save_data()
-            await update.message.reply_text("✅ ویرایش شد.",
-                                            reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("📋 لیست", callback_data='list_buys_menu')]]))
-            user_data.clear()
+
+@router.route('delete_purchase_<int:pid>')
+async def delete_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE, pid):
+    query = update.callback_query
+    context.user_data['delete_purchase_id'] = pid
+    context.user_data['delete_version'] = bot_accounting.version('purchases', pid)
+    keyboard = [
+        [InlineKeyboardButton("✅ بله", callback_data='confirm_delete_purchase')],
+        [InlineKeyboardButton("❌ خیر", callback_data='list_buys_menu')]
+    ]
+    await query.edit_message_text("⚠️ حذف شود؟", reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+@router.route('confirm_delete_purchase')
+async def confirm_delete_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    pid = context.user_data.get('delete_purchase_id')
+    if pid:
+        async with bot_accounting.transaction(('purchases', pid)) as tx:
+            tx.require('purchases', pid, context.user_data.get('delete_version'))
+            bot_accounting.remove('purchases', id=pid)
+            bot_accounting.remove('transactions', type='خرید', purchase_id=pid)
+            bot_accounting.remove('purchase_debt_payments', purchase_id=pid)
+    context.user_data.pop('delete_purchase_id', None)
+    await query.edit_message_text("✅ حذف شد.", reply_markup=InlineKeyboardMarkup([[
+        InlineKeyboardButton("📋 لیست", callback_data='list_buys_menu')]]))
+
+
+# ---------- ویرایش/حذف فروش ----------
+
+@router.route('edit_sale_<int:sid>')
+async def edit_sale(update: Update, context: ContextTypes.DEFAULT_TYPE, sid):
+    query = update.callback_query
+    s = bot_accounting.get_sale(sid)
+    if not s:
+        await query.edit_message_text("❌ یافت نشد.")
         return
+    forms.begin(context.user_data, 'edit_sale', edit_sale_id=sid,
+                edit_version=bot_accounting.version('sales', sid),
+                sell_price=s['sell_price'], sell_debt=s.get('debt', 0),
+                sell_customer=s.get('customer_name', ''), sell_phone=s.get('customer_phone', ''),
+                sell_notes=s.get('notes', ''))
+    await query.edit_message_text(f"✏️ قیمت جدید ({format_price(s['sell_price'])} ت) را وارد کن:")
 
-    # ویرایش فروش
-    if action == 'edit_sale':
-        step = user_data.get('step')
-        if step == 'waiting_sell_price':
-            if text != '-':
-                try:
-                    user_data['sell_price'] = int(text.replace(',', ''))
-                except:
-                    await update.message.reply_text("❌ عدد معتبر."); return
-            user_data['step'] = 'waiting_sell_debt'
-            await update.message.reply_text("⚠️ بدهی جدید (یا -):")
-        elif step == 'waiting_sell_debt':
-            if text != '-':
-                try:
-                    user_data['sell_debt'] = int(text.replace(',', ''))
-                except:
-                    await update.message.reply_text("❌ عدد معتبر."); return
-            user_data['step'] = 'waiting_sell_customer'
-            await update.message.reply_text("👤 نام مشتری جدید (یا -):")
-        elif step == 'waiting_sell_customer':
-            if text != '-': user_data['sell_customer'] = text
-            user_data['step'] = 'waiting_sell_phone'
-            await update.message.reply_text("📞 تلفن جدید (یا -):")
-        elif step == 'waiting_sell_phone':
-            if text != '-': user_data['sell_phone'] = text
-            user_data['step'] = 'waiting_sell_notes'
-            await update.message.reply_text("📝 توضیحات جدید (یا -):")
-        elif step == 'waiting_sell_notes':
-            sid = user_data['edit_sale_id']
-            s = next((s for s in bot_accounting.data['sales'] if s['id'] == sid))
-            p = next((p for p in bot_accounting.data['purchases'] if p['id'] == s['purchase_id']))
-            profit = user_data['sell_price'] - p['total_cost']
-            cash = user_data['sell_price'] - user_data['sell_debt']
-            s.update({
-                'sell_price': user_data['sell_price'], 'debt': user_data['sell_debt'],
-                'remaining_debt': user_data['sell_debt'], 'profit': profit, 'cash_received': cash,
-                'customer_name': user_data['sell_customer'], 'customer_phone': user_data['sell_phone'],
-                'notes': text if text != '-' else user_data.get('original_notes', '')
-            })
-            bot_accounting.save_data()
-            await update.message.reply_text("✅ ویرایش شد.",
-                                            reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("📋 لیست", callback_data='list_sales_menu')]]))
-            user_data.clear()
+
+@router.route('delete_sale_<int:sid>')
+async def delete_sale(update: Update, context: ContextTypes.DEFAULT_TYPE, sid):
+    query = update.callback_query
+    context.user_data['delete_sale_id'] = sid
+    context.user_data['delete_version'] = bot_accounting.version('sales', sid)
+    keyboard = [
+        [InlineKeyboardButton("✅ بله", callback_data='confirm_delete_sale')],
+        [InlineKeyboardButton("❌ خیر", callback_data='list_sales_menu')]
+    ]
+    await query.edit_message_text("⚠️ حذف شود؟", reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+@router.route('confirm_delete_sale')
+async def confirm_delete_sale(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    sid = context.user_data.get('delete_sale_id')
+    if sid:
+        s = bot_accounting.get_sale(sid)
+        if s:
+            async with bot_accounting.transaction(('sales', sid), ('purchases', s['purchase_id'])) as tx:
+                tx.require('sales', sid, context.user_data.get('delete_version'))
+                p = bot_accounting.get_purchase(s['purchase_id'])
+                if p:
+                    bot_accounting.update('purchases', p['id'], {'sold': False})
+                bot_accounting.remove('sales', id=sid)
+                bot_accounting.remove('transactions', type='فروش', sale_id=sid)
+                bot_accounting.remove('debt_payments', sale_id=sid)
+    context.user_data.pop('delete_sale_id', None)
+    await query.edit_message_text("✅ حذف شد.", reply_markup=InlineKeyboardMarkup([[
+        InlineKeyboardButton("📋 لیست", callback_data='list_sales_menu')]]))
+
+
+# ---------- ویرایش/حذف هزینه ----------
+
+@router.route('edit_cost_<int:cid>')
+async def edit_cost(update: Update, context: ContextTypes.DEFAULT_TYPE, cid):
+    query = update.callback_query
+    c = bot_accounting.get_cost(cid)
+    if not c:
+        await query.edit_message_text("❌ یافت نشد.")
         return
+    forms.begin(context.user_data, 'edit_cost', edit_cost_id=cid,
+                edit_version=bot_accounting.version('costs', cid),
+                cost_title=c['title'], cost_amount=c['amount'], cost_description=c.get('description', ''))
+    await query.edit_message_text(f"✏️ عنوان جدید ({c['title']}) را وارد کن:")
 
-    # پرداخت بدهی
-    if action == 'pay_sale_debt':
-        step = user_data.get('step')
-        if step == 'waiting_payment_amount':
-            try:
-                amt = int(text.replace(',', ''))
-                sid = user_data['payment_sale_id']
-                s = next((s for s in bot_accounting.data['sales'] if s['id'] == sid))
-                remaining = s.get('remaining_debt', s['debt']) - bot_accounting.get_total_sale_payments(sid)
-                if amt > remaining:
-                    await update.message.reply_text(f"❌ حداکثر {format_price(remaining)} ت")
-                    return
-                user_data['payment_amount'] = amt
-                user_data['step'] = 'waiting_payment_notes'
-                await update.message.reply_text("📝 توضیحات (یا -):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر.")
-        elif step == 'waiting_payment_notes':
-            notes = text if text != '-' else ''
-            sid = user_data['payment_sale_id']
-            s = next((s for s in bot_accounting.data['sales'] if s['id'] == sid))
-            bot_accounting.data['debt_payments'].append({
-                'id': int(datetime.now().timestamp() * 1000), 'sale_id': sid,
-                'date': datetime.now().strftime('%Y/%m/%d'), 'amount': user_data['payment_amount'],
-                'notes': notes, 'model': s['model'], 'customer_name': s.get('customer_name', '')
-            })
-            if 'remaining_debt' not in s: s['remaining_debt'] = s['debt']
-            s['remaining_debt'] -= user_data['payment_amount']
-            bot_accounting.data['transactions'].insert(0, {
-                'id': int(datetime.now().timestamp() * 1000) + 1, 'date': datetime.now().strftime('%Y/%m/%d'),
-                'type': 'دریافت بدهی', 'model': s['model'], 'amount': user_data['payment_amount'],
-                'debt': 0, 'profit': 0, 'description': f"دریافت از {s.get('customer_name', 'مشتری')}"
-            })
-            bot_accounting.save_data()
-            await update.message.reply_text("✅ دریافت شد.",
-                                            reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("💳 بدهی", callback_data='debt_menu')]]))
-            user_data.clear()
+
+@router.route('delete_cost_<int:cid>')
+async def delete_cost(update: Update, context: ContextTypes.DEFAULT_TYPE, cid):
+    query = update.callback_query
+    context.user_data['delete_cost_id'] = cid
+    context.user_data['delete_version'] = bot_accounting.version('costs', cid)
+    keyboard = [
+        [InlineKeyboardButton("✅ بله", callback_data='confirm_delete_cost')],
+        [InlineKeyboardButton("❌ خیر", callback_data='list_costs')]
+    ]
+    await query.edit_message_text("⚠️ حذف شود؟", reply_markup=InlineKeyboardMarkup(keyboard))
+
+
+@router.route('confirm_delete_cost')
+async def confirm_delete_cost(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    cid = context.user_data.get('delete_cost_id')
+    if cid and bot_accounting.get_cost(cid):
+        async with bot_accounting.transaction(('costs', cid)) as tx:
+            c = tx.require('costs', cid, context.user_data.get('delete_version'))
+            bot_accounting.remove('costs', id=cid)
+            bot_accounting.remove('transactions', type='هزینه', model=c['title'])
+    context.user_data.pop('delete_cost_id', None)
+    await query.edit_message_text("✅ حذف شد.", reply_markup=InlineKeyboardMarkup([[
+        InlineKeyboardButton("📋 لیست", callback_data='list_costs')]]))
+
+# ==================== فرم‌های چندمرحله‌ای ====================
+
+last_id = 0
+
+
+def now_id(offset=0):
+    """شناسه بر پایه‌ی زمان (میلی‌ثانیه)؛ پایه‌ها حداقل ۴ تا فاصله دارند تا درخواست‌های همزمان
+    (با offset های 0 تا 3) شناسه‌ی تکراری نگیرند"""
+    global last_id
+    base = int(datetime.now().timestamp() * 1000)
+    if offset == 0:
+        last_id = base = max(base, last_id + 4)
+    else:
+        base = last_id
+    return base + offset
+
+
+def today():
+    return datetime.now().strftime('%Y/%m/%d')
+
+
+def menu_button(text, callback_data):
+    return InlineKeyboardMarkup([[InlineKeyboardButton(text, callback_data=callback_data)]])
+
+
+def sell_debt_limit(debt, user_data):
+    if debt > user_data['sell_price']:
+        return "❌ بدهی بیشتر از فروش!"
+
+
+def sale_debt(sid):
+    """فروش و بدهی باقی‌مانده‌اش؛ ConflictError اگر فروش همزمان حذف شده باشد"""
+    s = bot_accounting.get_sale(sid)
+    if s is None:
+        raise ConflictError("این فروش همزمان توسط کاربر دیگری حذف شده است.")
+    return s, s.get('remaining_debt', s['debt']) - bot_accounting.get_total_sale_payments(sid)
+
+
+def purchase_debt(pid):
+    p = bot_accounting.get_purchase(pid)
+    if p is None:
+        raise ConflictError("این خرید همزمان توسط کاربر دیگری حذف شده است.")
+    return p, p.get('remaining_debt', p.get('purchase_debt', 0)) - bot_accounting.get_total_purchase_payments(pid)
+
+
+def sale_payment_limit(amount, user_data):
+    s, remaining = sale_debt(user_data['payment_sale_id'])
+    if amount > remaining:
+        return f"❌ حداکثر {format_price(remaining)} ت"
+
+
+def purchase_payment_limit(amount, user_data):
+    p, remaining = purchase_debt(user_data['payment_purchase_id'])
+    if amount > remaining:
+        return f"❌ حداکثر {format_price(remaining)} ت"
+
+
+def partner_option(option, user_data):
+    if option not in PARTNER_OPTIONS:
+        return "❌ 1-4 را انتخاب کن."
+
+
+PARTNER_OPTIONS = {1: 'cash_withdraw', 2: 'cash_deposit', 3: 'personal_expense', 4: 'company_asset_use'}
+
+
+def purchase_steps(edit):
+    if edit:
+        return [
+            Step('waiting_buy_model', 'buy_model', "✏️ مدل جدید را وارد کن:", keep=True),
+            Step('waiting_buy_price', 'buy_price', "💰 قیمت جدید (یا -):", parse_amount, keep=True,
+                 error="❌ عدد معتبر."),
+            Step('waiting_buy_delivery', 'buy_delivery', "🚚 پیک جدید (یا -):", parse_amount, keep=True,
+                 error="❌ عدد معتبر."),
+            Step('waiting_buy_extra', 'buy_extra', "💰 جانبی جدید (یا -):", parse_amount, keep=True,
+                 error="❌ عدد معتبر."),
+            Step('waiting_buy_debt', 'buy_debt', "⚠️ بدهی جدید (یا -):", parse_amount, keep=True,
+                 error="❌ عدد معتبر."),
+            Step('waiting_buy_notes', 'buy_notes', "📝 توضیحات جدید (یا -):", keep=True),
+        ]
+    return [
+        Step('waiting_buy_model', 'buy_model', "📱 مدل گوشی را وارد کن:"),
+        Step('waiting_buy_price', 'buy_price', "💰 قیمت خرید را وارد کن:", parse_amount),
+        Step('waiting_buy_delivery', 'buy_delivery', "🚚 هزینه پیک (0):", parse_amount),
+        Step('waiting_buy_extra', 'buy_extra', "💰 هزینه جانبی (0):", parse_amount),
+        Step('waiting_buy_debt', 'buy_debt', "⚠️ بدهی به فروشنده (0):", parse_amount),
+        Step('waiting_buy_notes', 'buy_notes', "📝 توضیحات (یا -):", optional_text),
+    ]
+
+
+def sale_steps(edit):
+    if edit:
+        return [
+            Step('waiting_sell_price', 'sell_price', "✏️ قیمت جدید را وارد کن:", parse_amount, keep=True,
+                 error="❌ عدد معتبر."),
+            Step('waiting_sell_debt', 'sell_debt', "⚠️ بدهی جدید (یا -):", parse_amount, sell_debt_limit, keep=True,
+                 error="❌ عدد معتبر."),
+            Step('waiting_sell_customer', 'sell_customer', "👤 نام مشتری جدید (یا -):", keep=True),
+            Step('waiting_sell_phone', 'sell_phone', "📞 تلفن جدید (یا -):", keep=True),
+            Step('waiting_sell_notes', 'sell_notes', "📝 توضیحات جدید (یا -):", keep=True),
+        ]
+    return [
+        Step('waiting_sell_price', 'sell_price', "قیمت فروش را وارد کن:", parse_amount),
+        Step('waiting_sell_debt', 'sell_debt', "⚠️ بدهی مشتری (0):", parse_amount, sell_debt_limit),
+        Step('waiting_sell_customer', 'sell_customer', "👤 نام مشتری (یا -):", optional_text),
+        Step('waiting_sell_phone', 'sell_phone', "📞 تلفن (یا -):", optional_text),
+        Step('waiting_sell_notes', 'sell_notes', "📝 توضیحات (یا -):", optional_text),
+    ]
+
+
+def cost_steps(edit):
+    if edit:
+        return [
+            Step('waiting_cost_title', 'cost_title', "✏️ عنوان جدید را وارد کن:", keep=True),
+            Step('waiting_cost_amount', 'cost_amount', "💰 مبلغ جدید (یا -):", parse_amount, keep=True,
+                 error="❌ عدد معتبر."),
+            Step('waiting_cost_desc', 'cost_description', "📝 توضیحات جدید (یا -):", keep=True),
+        ]
+    return [
+        Step('waiting_cost_title', 'cost_title', "📝 عنوان هزینه را وارد کن:"),
+        Step('waiting_cost_amount', 'cost_amount', "💰 مبلغ را وارد کن:", parse_amount),
+        Step('waiting_cost_desc', 'cost_description', "📝 توضیحات (یا -):", optional_text),
+    ]
+
+
+async def complete_set_capital(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    amount = context.user_data['capital']
+    bot_accounting.set_value('initial_capital', amount)
+    bot_accounting.add('transactions', Transaction(
+        id=now_id(), date=today(),
+        type='سرمایه اولیه', model='-', amount=amount, debt=0, profit=0,
+        description='سرمایه اولیه'
+    ), front=True)
+    bot_accounting.save_data()
+    await update.message.reply_text(f"✅ سرمایه {format_price(amount)} ت ثبت شد.",
+                                    reply_markup=menu_button("⚙️ تنظیمات", 'settings_menu'))
+    context.user_data.clear()
+
+
+async def complete_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    total = user_data['buy_price'] + user_data['buy_delivery'] + user_data['buy_extra']
+    cash = total - user_data['buy_debt']
+    fields = {
+        'model': user_data['buy_model'], 'buy_price': user_data['buy_price'],
+        'delivery_cost': user_data['buy_delivery'], 'extra_cost': user_data['buy_extra'],
+        'total_cost': total, 'purchase_debt': user_data['buy_debt'],
+        'remaining_debt': user_data['buy_debt'], 'cash_paid': cash, 'notes': user_data['buy_notes']
+    }
+    if user_data['action'] == 'edit_purchase':
+        pid = user_data['edit_purchase_id']
+        async with bot_accounting.transaction(('purchases', pid)) as tx:
+            tx.require('purchases', pid, user_data['edit_version'])
+            bot_accounting.update('purchases', pid, fields)
+        await update.message.reply_text("✅ ویرایش شد.", reply_markup=menu_button("📋 لیست", 'list_buys_menu'))
+    else:
+        bot_accounting.add('purchases', Purchase(id=now_id(), date=today(), **fields, sold=False))
+        bot_accounting.add('transactions', Transaction(
+            id=now_id(1), date=today(),
+            type='خرید', model=user_data['buy_model'], amount=-cash,
+            debt=user_data['buy_debt'], profit=0, description=f"خرید {user_data['buy_model']}"
+        ), front=True)
+        bot_accounting.save_data()
+        await update.message.reply_text(f"✅ خرید ثبت شد.\n💰 {format_price(total)} ت",
+                                        reply_markup=menu_button("🏠 منو", 'main_menu'))
+    user_data.clear()
+
+
+async def complete_sale(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    editing = user_data['action'] == 'edit_sale'
+    s = bot_accounting.get_sale(user_data['edit_sale_id']) if editing else None
+    if editing and s is None:
+        raise ConflictError("این فروش همزمان توسط کاربر دیگری حذف شده است.")
+    pid = s['purchase_id'] if editing else user_data['sell_purchase_id']
+    keys = [('purchases', pid)] + ([('sales', s['id'])] if editing else [])
+    async with bot_accounting.transaction(*keys) as tx:
+        p = tx.require('purchases', pid)
+        profit = user_data['sell_price'] - p['total_cost']
+        cash = user_data['sell_price'] - user_data['sell_debt']
+        fields = {
+            'sell_price': user_data['sell_price'], 'debt': user_data['sell_debt'],
+            'remaining_debt': user_data['sell_debt'], 'profit': profit, 'cash_received': cash,
+            'customer_name': user_data['sell_customer'], 'customer_phone': user_data['sell_phone'],
+            'notes': user_data['sell_notes']
+        }
+        if editing:
+            tx.require('sales', s['id'], user_data['edit_version'])
+            bot_accounting.update('sales', s['id'], fields)
+        else:
+            # دو نفر ممکن است همزمان یک کالا را برای فروش انتخاب کرده باشند
+            if p.get('sold'):
+                raise ConflictError("این کالا همزمان توسط کاربر دیگری فروخته شد.")
+            bot_accounting.add('sales', Sale(
+                id=now_id(), date=today(),
+                purchase_id=pid, model=p['model'], purchase_price=p['total_cost'], **fields
+            ))
+            bot_accounting.update('purchases', pid, {'sold': True})
+            bot_accounting.add('transactions', Transaction(
+                id=now_id(1), date=today(),
+                type='فروش', model=p['model'], amount=cash,
+                debt=user_data['sell_debt'], profit=profit,
+                description=f"فروش به {user_data['sell_customer'] or 'مشتری'}"
+            ), front=True)
+    if editing:
+        await update.message.reply_text("✅ ویرایش شد.", reply_markup=menu_button("📋 لیست", 'list_sales_menu'))
+    else:
+        emoji = "📈" if profit >= 0 else "📉"
+        await update.message.reply_text(f"✅ فروش ثبت شد.\n{emoji} سود: {format_price(profit)} ت",
+                                        reply_markup=menu_button("🏠 منو", 'main_menu'))
+    user_data.clear()
+
+
+async def complete_cost(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    fields = {'title': user_data['cost_title'], 'amount': user_data['cost_amount'],
+              'description': user_data['cost_description']}
+    if user_data['action'] == 'edit_cost':
+        cid = user_data['edit_cost_id']
+        async with bot_accounting.transaction(('costs', cid)) as tx:
+            tx.require('costs', cid, user_data['edit_version'])
+            bot_accounting.update('costs', cid, fields)
+        await update.message.reply_text("✅ ویرایش شد.", reply_markup=menu_button("📋 لیست", 'list_costs'))
+    else:
+        bot_accounting.add('costs', Cost(id=now_id(), date=today(), **fields))
+        bot_accounting.add('transactions', Transaction(
+            id=now_id(1), date=today(),
+            type='هزینه', model=user_data['cost_title'], amount=-user_data['cost_amount'],
+            debt=0, profit=0, description=user_data['cost_description'] or user_data['cost_title']
+        ), front=True)
+        bot_accounting.save_data()
+        await update.message.reply_text("✅ هزینه ثبت شد.", reply_markup=menu_button("💸 هزینه‌ها", 'costs_menu'))
+    user_data.clear()
+
+
+async def complete_sale_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    sid = user_data['payment_sale_id']
+    amount = user_data['payment_amount']
+    async with bot_accounting.transaction(('sales', sid)):
+        # مبلغ در مرحله‌ی قبل بررسی شده ولی ممکن است در این فاصله پرداخت دیگری ثبت شده باشد
+        s, remaining = sale_debt(sid)
+        if amount > remaining:
+            raise ConflictError(f"بدهی همزمان تغییر کرد؛ حداکثر {format_price(remaining)} ت قابل دریافت است.")
+        bot_accounting.add('debt_payments', DebtPayment(
+            id=now_id(), sale_id=sid,
+            date=today(), amount=amount,
+            notes=user_data['payment_notes'], model=s['model'], customer_name=s.get('customer_name', '')
+        ))
+        bot_accounting.update('sales', sid, {
+            'remaining_debt': s.get('remaining_debt', s['debt']) - amount})
+        bot_accounting.add('transactions', Transaction(
+            id=now_id(1), date=today(),
+            type='دریافت بدهی', model=s['model'], amount=amount,
+            debt=0, profit=0, description=f"دریافت از {s.get('customer_name', 'مشتری')}"
+        ), front=True)
+        # قفل تا نوشته شدن روی دیسک نگه داشته می‌شود
+        await bot_accounting.flush()
+    await update.message.reply_text("✅ دریافت شد.", reply_markup=menu_button("💳 بدهی", 'debt_menu'))
+    user_data.clear()
+
+
+async def complete_purchase_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    pid = user_data['payment_purchase_id']
+    amount = user_data['purchase_payment_amount']
+    async with bot_accounting.transaction(('purchases', pid)):
+        p, remaining = purchase_debt(pid)
+        if amount > remaining:
+            raise ConflictError(f"بدهی همزمان تغییر کرد؛ حداکثر {format_price(remaining)} ت قابل پرداخت است.")
+        bot_accounting.add('purchase_debt_payments', DebtPayment(
+            id=now_id(), purchase_id=pid,
+            date=today(), amount=amount,
+            notes=user_data['purchase_payment_notes'], model=p['model']
+        ))
+        bot_accounting.update('purchases', pid, {
+            'remaining_debt': p.get('remaining_debt', p.get('purchase_debt', 0)) - amount})
+        bot_accounting.add('transactions', Transaction(
+            id=now_id(1), date=today(),
+            type='پرداخت بدهی خرید', model=p['model'], amount=-amount,
+            debt=0, profit=0, description=f"پرداخت بدهی {p['model']}"
+        ), front=True)
+        await bot_accounting.flush()
+    await update.message.reply_text("✅ پرداخت شد.", reply_markup=menu_button("💳 بدهی", 'debt_menu'))
+    user_data.clear()
+
+
+async def complete_partner_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    partner = user_data['partner']
+    ttype = PARTNER_OPTIONS[user_data['partner_option']]
+    amt = user_data['partner_amount']
+    desc = user_data['partner_desc']
+    name = "رضا" if partner == 'reza' else "میلاد"
+    bot_accounting.add('partner_transactions', PartnerTransaction(
+        id=now_id(), partner=partner,
+        type=ttype, amount=amt, date=today(), description=desc
+    ))
+    if ttype == 'cash_withdraw':
+        bot_accounting.add('transactions', Transaction(
+            id=now_id(1), date=today(),
+            type='برداشت شریک', model=name,
+            amount=-amt, debt=0, profit=0, description=desc
+        ), front=True)
+    elif ttype == 'cash_deposit':
+        bot_accounting.add('transactions', Transaction(
+            id=now_id(1), date=today(),
+            type='واریز شریک', model=name,
+            amount=amt, debt=0, profit=0, description=desc
+        ), front=True)
+    elif ttype == 'personal_expense':
+        bot_accounting.add('costs', Cost(
+            id=now_id(2), date=today(),
+            title=f"هزینه شخصی {partner}", amount=amt, description=desc
+        ))
+        bot_accounting.add('transactions', Transaction(
+            id=now_id(3), date=today(),
+            type='هزینه', model=f"هزینه شخصی {partner}",
+            amount=-amt, debt=0, profit=0, description=desc
+        ), front=True)
+    bot_accounting.save_data()
+    await update.message.reply_text(f"✅ تراکنش {name} ثبت شد.", reply_markup=menu_button("👥 شرکا", 'partner_menu'))
+    user_data.clear()
+
+
+forms.register(Form('set_capital', [
+    Step('waiting_capital', 'capital', "💰 مبلغ سرمایه اولیه را وارد کن:", parse_amount),
+], complete_set_capital))
+forms.register(Form('new_buy', purchase_steps(edit=False), complete_purchase, cancel_on_dash=True))
+forms.register(Form('edit_purchase', purchase_steps(edit=True), complete_purchase))
+forms.register(Form('new_sell', sale_steps(edit=False), complete_sale))
+forms.register(Form('edit_sale', sale_steps(edit=True), complete_sale))
+forms.register(Form('new_cost', cost_steps(edit=False), complete_cost, cancel_on_dash=True))
+forms.register(Form('edit_cost', cost_steps(edit=True), complete_cost))
+forms.register(Form('pay_sale_debt', [
+    Step('waiting_payment_amount', 'payment_amount', "💰 مبلغ دریافتی را وارد کن:", parse_amount,
+         sale_payment_limit, error="❌ عدد معتبر."),
+    Step('waiting_payment_notes', 'payment_notes', "📝 توضیحات (یا -):", optional_text),
+], complete_sale_payment))
+forms.register(Form('pay_purchase_debt', [
+    Step('waiting_purchase_payment_amount', 'purchase_payment_amount', "💰 مبلغ پرداختی را وارد کن:",
+         parse_amount, purchase_payment_limit, error="❌ عدد معتبر."),
+    Step('waiting_purchase_payment_notes', 'purchase_payment_notes', "📝 توضیحات (یا -):", optional_text),
+], complete_purchase_payment))
+forms.register(Form('partner_transaction', [
+    Step('waiting_partner_type', 'partner_option',
+         "1️⃣ برداشت نقدی\n2️⃣ واریز نقدی\n3️⃣ هزینه شخصی\n4️⃣ استفاده دارایی\n\nشماره را وارد کن:",
+         parse_amount, partner_option, error="❌ عدد وارد کن."),
+    Step('waiting_partner_amount', 'partner_amount', "💰 مبلغ را وارد کن:", parse_amount, error="❌ عدد معتبر."),
+    Step('waiting_partner_desc', 'partner_desc', "📝 شرح:"),
+], complete_partner_transaction))
+forms.register(Form('search', [
+    Step('waiting_search', 'search_options', SEARCH_PROMPT, parse_query,
+         error="❌ فیلتر نامعتبر؛ تاریخ به شکل 1403/01/31 و فروخته:بله یا نه."),
+], complete_search))
+
+
+# ==================== هندلر پیام‌ها ====================
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_data = context.user_data
+    action = user_data.get('action')
+
+    if not action:
+        await update.message.reply_text("لطفاً از منو استفاده کنید.")
         return
 
-    if action == 'pay_purchase_debt':
-        step = user_data.get('step')
-        if step == 'waiting_purchase_payment_amount':
-            try:
-                amt = int(text.replace(',', ''))
-                pid = user_data['payment_purchase_id']
-                p = next((p for p in bot_accounting.data['purchases'] if p['id'] == pid))
-                remaining = p.get('remaining_debt',
-                                  p.get('purchase_debt', 0)) - bot_accounting.get_total_purchase_payments(pid)
-                if amt > remaining:
-                    await update.message.reply_text(f"❌ حداکثر {format_price(remaining)} ت")
-                    return
-                user_data['purchase_payment_amount'] = amt
-                user_data['step'] = 'waiting_purchase_payment_notes'
-                await update.message.reply_text("📝 توضیحات (یا -):")
-            except:
-                await update.message.reply_text("❌ عدد معتبر.")
-        elif step == 'waiting_purchase_payment_notes':
-            notes = text if text != '-' else ''
-            pid = user_data['payment_purchase_id']
-            p = next((p for p in bot_accounting.data['purchases'] if p['id'] == pid))
-            bot_accounting.data['purchase_debt_payments'].append({
-                'id': int(datetime.now().timestamp() * 1000), 'purchase_id': pid,
-                'date': datetime.now().strftime('%Y/%m/%d'), 'amount': user_data['purchase_payment_amount'],
-                'notes': notes, 'model': p['model']
-            })
-            if 'remaining_debt' not in p: p['remaining_debt'] = p.get('purchase_debt', 0)
-            p['remaining_debt'] -= user_data['purchase_payment_amount']
-            bot_accounting.data['transactions'].insert(0, {
-                'id': int(datetime.now().timestamp() * 1000) + 1, 'date': datetime.now().strftime('%Y/%m/%d'),
-                'type': 'پرداخت بدهی خرید', 'model': p['model'], 'amount': -user_data['purchase_payment_amount'],
-                'debt': 0, 'profit': 0, 'description': f"پرداخت بدهی {p['model']}"
-            })
-            bot_accounting.save_data()
-            await update.message.reply_text("✅ پرداخت شد.",
-                                            reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("💳 بدهی", callback_data='debt_menu')]]))
-            user_data.clear()
+    try:
+        if await forms.handle(update, context):
+            return
+    except ConflictError as e:
+        await report_conflict(update, context, e)
         return
 
-    # تراکنش شریک
-    if action == 'partner_transaction':
-        step = user_data.get('step')
-        if not step:
-            try:
-                opt = int(text)
-                types = {1: 'cash_withdraw', 2: 'cash_deposit', 3: 'personal_expense', 4: 'company_asset_use'}
-                if opt in types:
-                    user_data['partner_type'] = types[opt]
-                    user_data['step'] = 'waiting_partner_amount'
-                    await update.message.reply_text("💰 مبلغ را وارد کن:")
-                else:
-                    await update.message.reply_text("❌ 1-4 را انتخاب کن.")
-            except:
-                await update.message.reply_text("❌ عدد وارد کن.")
-        elif step == 'waiting_partner_amount':
-            try:
-                user_data['partner_amount'] = int(text.replace(',', ''))
-                user_data['step'] = 'waiting_partner_desc'
-                await update.message.reply_text("📝 شرح:")
-            except:
-                await update.message.reply_text("❌ عدد معتبر.")
-        elif step == 'waiting_partner_desc':
-            partner = user_data['partner']
-            ttype = user_data['partner_type']
-            amt = user_data['partner_amount']
-            desc = text
-            trans = {
-                'id': int(datetime.now().timestamp() * 1000), 'partner': partner,
-                'type': ttype, 'amount': amt, 'date': datetime.now().strftime('%Y/%m/%d'), 'description': desc
-            }
-            bot_accounting.data['partner_transactions'].append(trans)
-            if ttype == 'cash_withdraw':
-                bot_accounting.data['transactions'].insert(0, {
-                    'id': int(datetime.now().timestamp() * 1000) + 1, 'date': datetime.now().strftime('%Y/%m/%d'),
-                    'type': 'برداشت شریک', 'model': 'رضا' if partner == 'reza' else 'میلاد',
-                    'amount': -amt, 'debt': 0, 'profit': 0, 'description': desc
-                })
-            elif ttype == 'cash_deposit':
-                bot_accounting.data['transactions'].insert(0, {
-                    'id': int(datetime.now().timestamp() * 1000) + 1, 'date': datetime.now().strftime('%Y/%m/%d'),
-                    'type': 'واریز شریک', 'model': 'رضا' if partner == 'reza' else 'میلاد',
-                    'amount': amt, 'debt': 0, 'profit': 0, 'description': desc
-                })
-            elif ttype == 'personal_expense':
-                bot_accounting.data['costs'].append({
-                    'id': int(datetime.now().timestamp() * 1000) + 2, 'date': datetime.now().strftime('%Y/%m/%d'),
-                    'title': f"هزینه شخصی {partner}", 'amount': amt, 'description': desc
-                })
-                bot_accounting.data['transactions'].insert(0, {
-                    'id': int(datetime.now().timestamp() * 1000) + 3, 'date': datetime.now().strftime('%Y/%m/%d'),
-                    'type': 'هزینه', 'model': f"هزینه شخصی {partner}",
-                    'amount': -amt, 'debt': 0, 'profit': 0, 'description': desc
-                })
-            bot_accounting.save_data()
-            name = "رضا" if partner == 'reza' else "میلاد"
-            await update.message.reply_text(f"✅ تراکنش {name} ثبت شد.",
+    # بازیابی
+    if action == 'full_restore' and update.message.document:
+        file = await update.message.document.get_file()
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            await file.download_to_memory(buffer)
+            buffer.seek(0)
+            await update.message.reply_text("⏳ در حال بررسی فایل...")
+            # خواندن و اعتبارسنجی در thread جدا؛ تا پایان موفق، داده‌ی فعلی دست نمی‌خورد
+            data, staged = bot_accounting.get_default_data(), bot_accounting.staging_observers()
+            await asyncio.to_thread(load_backup, buffer, staged, data)
+            bot_accounting.install(data, staged)
+            backup_manifest.invalidate()
+            await update.message.reply_text(f"✅ بازیابی شد.\n📦 {len(data['purchases'])} خرید، "
+                                            f"{len(data['sales'])} فروش، {len(data['costs'])} هزینه",
                                             reply_markup=InlineKeyboardMarkup(
-                                                [[InlineKeyboardButton("👥 شرکا", callback_data='partner_menu')]]))
+                                                [[InlineKeyboardButton("💾 پشتیبان", callback_data='backup_menu')]]))
+        except RestoreError as e:
+            await update.message.reply_text(f"❌ فایل نامعتبر است؛ چیزی تغییر نکرد.\n{e}")
+        except Exception as e:
+            await update.message.reply_text(f"❌ خطا: {e}")
+        finally:
+            buffer.close()
             user_data.clear()
         return
 
-    # بازیابی
-    if action == 'full_restore' and update.message.document:
+    if action == 'chain_restore' and update.message.document:
         file = await update.message.document.get_file()
-        fn = f"restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        await file.download_to_drive(fn)
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
         try:
-            with open(fn, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            if all(k in data for k in ['purchases', 'sales', 'costs', 'transactions', 'partner_transactions']):
-                bot_accounting.data = data
-                bot_accounting.save_data()
-                await update.message.reply_text("✅ بازیابی شد.",
-                                                reply_markup=InlineKeyboardMarkup(
-                                                    [[InlineKeyboardButton("💾 پشتیبان", callback_data='backup_menu')]]))
+            await file.download_to_memory(buffer)
+            buffer.seek(0)
+            # فقط نوع و شناسه خوانده می‌شود؛ فایل‌ها تا «اعمال بازیابی» در بافر می‌مانند
+            header = await asyncio.to_thread(read_header, buffer)
+            files = user_data.get('chain_files')
+            if header['type'] == 'incremental':
+                if not files:
+                    await update.message.reply_text("❌ اول پشتیبان کامل را بفرست.")
+                    return
+                if header['base'] != user_data['chain_ids'][-1]:
+                    await update.message.reply_text(f"❌ ترتیب اشتباه است؛ فایل بعد از {header['base']} لازم است.")
+                    return
+                files.append(buffer)
+                user_data['chain_ids'].append(header['id'])
             else:
-                await update.message.reply_text("❌ فرمت نامعتبر.")
+                close_chain(user_data)
+                user_data['chain_files'] = [buffer]
+                user_data['chain_ids'] = [header['id']]
+            buffer = None
+            await update.message.reply_text(
+                f"✅ {len(user_data['chain_ids'])} فایل دریافت شد (آخرین: {user_data['chain_ids'][-1]}).\n"
+                f"فایل افزایشی بعدی را بفرست یا اعمال کن.",
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("✅ اعمال بازیابی", callback_data='apply_chain_restore')]]))
+        except RestoreError as e:
+            await update.message.reply_text(f"❌ فایل نامعتبر است.\n{e}")
         except Exception as e:
             await update.message.reply_text(f"❌ خطا: {e}")
         finally:
-            if os.path.exists(fn): os.remove(fn)
-            user_data.clear()
+            if buffer is not None:
+                buffer.close()
         return
 
     if action == 'inventory_restore' and update.message.document:
         file = await update.message.document.get_file()
-        fn = f"restore_inv_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        await file.download_to_drive(fn)
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
         try:
-            with open(fn, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            if data.get('type') == 'inventory':
-                count = 0
-                for item in data.get('items', []):
-                    new = item.copy()
-                    new['id'] = int(datetime.now().timestamp() * 1000) + count
-                    new['sold'] = False
-                    bot_accounting.data['purchases'].append(new)
-                    count += 1
-                bot_accounting.save_data()
-                await update.message.reply_text(f"✅ {count} قلم اضافه شد.",
-                                                reply_markup=InlineKeyboardMarkup(
-                                                    [[InlineKeyboardButton("💾 پشتیبان", callback_data='backup_menu')]]))
-            else:
-                await update.message.reply_text("❌ فرمت نامعتبر.")
+            await file.download_to_memory(buffer)
+            buffer.seek(0)
+            items = await asyncio.to_thread(load_inventory, buffer)
+            for new in items:
+                new['id'] = now_id()
+                new['sold'] = False
+                bot_accounting.add('purchases', new)
+            await bot_accounting.flush()
+            await update.message.reply_text(f"✅ {len(items)} قلم اضافه شد.",
+                                            reply_markup=InlineKeyboardMarkup(
+                                                [[InlineKeyboardButton("💾 پشتیبان", callback_data='backup_menu')]]))
+        except RestoreError as e:
+            await update.message.reply_text(f"❌ فایل نامعتبر است؛ چیزی تغییر نکرد.\n{e}")
         except Exception as e:
             await update.message.reply_text(f"❌ خطا: {e}")
         finally:
-            if os.path.exists(fn): os.remove(fn)
+            buffer.close()
             user_data.clear()
         return
 
@@ -1251,44 +1865,121 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ==================== توابع کمکی ====================
 
+async def report_conflict(update: Update, context: ContextTypes.DEFAULT_TYPE, error):
+    context.user_data.clear()
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton("🏠 منو", callback_data='main_menu')]])
+    if update.callback_query:
+        await update.callback_query.edit_message_text(f"⚠️ {error}", reply_markup=markup)
+    else:
+        await update.message.reply_text(f"⚠️ {error}", reply_markup=markup)
+
+
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     await update.message.reply_text("❌ لغو شد.", reply_markup=InlineKeyboardMarkup([[
         InlineKeyboardButton("🏠 منو", callback_data='main_menu')]]))
 
 
+def is_admin(update: Update):
+    return update.effective_user is not None and update.effective_user.id in ADMIN_IDS
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        await update.message.reply_text("⛔ این دستور فقط برای مدیرهاست (ADMIN_IDS).")
+        return
+    text = instrumentation.stats_text()
+    if not any(instrumentation.metrics.series.values()):
+        text += "\n❌ هنوز چیزی ثبت نشده."
+    await update.message.reply_text(text[:4000], parse_mode='Markdown')
+
+
+# هندلرها و متدهایی که /profile دورشان cProfile روشن می‌کند
+PROFILE_FUNCTIONS = ('button_handler', 'handle_message')
+PROFILE_METHODS = ('get_statistics', 'save_data')
+
+
+def start_profiling(application, updates, chats):
+    return profiling.start(application, globals(), PROFILE_FUNCTIONS, [(bot_accounting, PROFILE_METHODS)],
+                           updates, chats)
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        await update.message.reply_text("⛔ این دستور فقط برای مدیرهاست (ADMIN_IDS).")
+        return
+    arg = context.args[0] if context.args else '20'
+    if arg == 'stop':
+        session = await profiling.stop(context.bot)
+        if session is None:
+            await update.message.reply_text("❌ پروفایلی در جریان نیست.")
+        return
+    if not arg.isdigit() or int(arg) < 1:
+        await update.message.reply_text("❌ استفاده: /profile [تعداد update] یا /profile stop")
+        return
+    session = start_profiling(context.application, int(arg), [update.effective_chat.id])
+    if session is None:
+        await update.message.reply_text("⏳ یک پروفایل در جریان است؛ برای پایان: /profile stop")
+        return
+    await update.message.reply_text(f"🔬 پروفایل {session.updates} update بعدی شروع شد؛ "
+                                    f"فایل‌ها بعد از آن فرستاده می‌شوند.")
+
+
 # ==================== تابع اصلی ====================
 
+def build_application():
+    """Application با همه‌ی هندلرها؛ مشترک بین polling (همین فایل) و webhook (app.py)"""
+    # هر update در task جدا اجرا می‌شود؛ تداخل‌ها با bot_accounting.transaction کنترل می‌شوند
+    # زمان درخواست‌های Bot API با TimedRequest ثبت می‌شود (getUpdates با long poll جدا و بدون اندازه‌گیری)
+    app = (Application.builder().token(TOKEN)
+           .base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+           .request(instrumentation.TimedRequest(connection_pool_size=256))
+           .concurrent_updates(True).build())
+
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("setmenu", set_menu))
+    app.add_handler(CommandHandler("cancel", cancel_command))
+    app.add_handler(CommandHandler("stats", stats_command))
+    app.add_handler(CommandHandler("profile", profile_command))
+    app.add_handler(CommandHandler("search", search_command))
+    app.add_handler(CommandHandler("report", report_command))
+    app.add_handler(CommandHandler("analytics", analytics_view))
+    app.add_handler(CommandHandler("dashboard", lambda u, c: button_handler(u, c) if u.message else None))
+    app.add_handler(CommandHandler("sell", lambda u, c: button_handler(u, c) if u.message else None))
+    app.add_handler(CommandHandler("buy", lambda u, c: button_handler(u, c) if u.message else None))
+    app.add_handler(CommandHandler("list_sales", list_sales_command))
+    app.add_handler(CommandHandler("list_buys", list_buys_command))
+    app.add_handler(CommandHandler("list_costs", list_costs_command))
+    app.add_handler(CommandHandler("costs", lambda u, c: button_handler(u, c) if u.message else None))
+    app.add_handler(CommandHandler("partners", lambda u, c: button_handler(u, c) if u.message else None))
+    app.add_handler(CommandHandler("debts", lambda u, c: button_handler(u, c) if u.message else None))
+    app.add_handler(CommandHandler("backup", lambda u, c: button_handler(u, c) if u.message else None))
+    app.add_handler(CommandHandler("settings", lambda u, c: button_handler(u, c) if u.message else None))
+    app.add_handler(CommandHandler("help", lambda u, c: button_handler(u, c) if u.message else None))
+
+    app.add_handler(CallbackQueryHandler(button_handler))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    app.add_handler(MessageHandler(filters.Document.ALL, handle_message))
+    instrumentation.instrument(app, router)
+    # PROFILE_UPDATES فقط یک بار از شروع پروسه (نه بعد از هر راه‌اندازی دوباره) و نتیجه برای مدیرها
+    if profiling.PROFILE_UPDATES and not profiling.env_used:
+        profiling.env_used = True
+        start_profiling(app, profiling.PROFILE_UPDATES, sorted(ADMIN_IDS))
+    return app
+
+
 def main():
     try:
         print("🤖 ربات در حال راه‌اندازی...")
-        requests.get(f"https://api.telegram.org/bot{TOKEN}/deleteWebhook")
-        app = Application.builder().token(TOKEN).build()
-
-        app.add_handler(CommandHandler("start", start))
-        app.add_handler(CommandHandler("setmenu", set_menu))
-        app.add_handler(CommandHandler("cancel", cancel_command))
-        app.add_handler(CommandHandler("dashboard", lambda u, c: button_handler(u, c) if u.message else None))
-        app.add_handler(CommandHandler("sell", lambda u, c: button_handler(u, c) if u.message else None))
-        app.add_handler(CommandHandler("buy", lambda u, c: button_handler(u, c) if u.message else None))
-        app.add_handler(CommandHandler("list_sales", list_sales_command))
-        app.add_handler(CommandHandler("list_buys", list_buys_command))
-        app.add_handler(CommandHandler("list_costs", list_costs_command))
-        app.add_handler(CommandHandler("costs", lambda u, c: button_handler(u, c) if u.message else None))
-        app.add_handler(CommandHandler("partners", lambda u, c: button_handler(u, c) if u.message else None))
-        app.add_handler(CommandHandler("debts", lambda u, c: button_handler(u, c) if u.message else None))
-        app.add_handler(CommandHandler("backup", lambda u, c: button_handler(u, c) if u.message else None))
-        app.add_handler(CommandHandler("settings", lambda u, c: button_handler(u, c) if u.message else None))
-        app.add_handler(CommandHandler("help", lambda u, c: button_handler(u, c) if u.message else None))
-
-        app.add_handler(CallbackQueryHandler(button_handler))
-        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
-        app.add_handler(MessageHandler(filters.Document.ALL, handle_message))
-
+        requests.get(f"{TELEGRAM_API_URL}/bot{TOKEN}/deleteWebhook")
+        app = build_application()
         print("✅ ربات آماده است!")
-        app.run_polling(allowed_updates=['message', 'callback_query'])
+        bot_accounting.start_writer()
+        app.run_polling(allowed_updates=ALLOWED_UPDATES)
     except Exception as e:
         print(f"❌ خطا: {e}")
+    finally:
+        bot_accounting.close()
 
 
 if __name__ == '__main__':
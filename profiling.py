@@ -0,0 +1,213 @@
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# پروفایل روی درخواست: دستور /profile N (مدیرها) یا PROFILE_UPDATES=N (از شروع ربات) برای N update بعدی
+# cProfile و tracemalloc را دور هندلرهای اصلی و چند متد سنگین روشن می‌کند و در پایان فایل .pstats و
+# گزارش متنی (توابع پرهزینه + بیشترین تخصیص‌های حافظه) را به صورت document می‌فرستد.
+# وقتی پروفایل خاموش است هیچ wrapperی در کار نیست: توابع اصلی فقط در طول یک دوره جایگزین و بعد برگردانده می‌شوند.
+
+PROFILE_UPDATES = int(os.environ.get('PROFILE_UPDATES', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or tempfile.gettempdir()
+MAX_UPDATES = 1000
+TRACE_FRAMES = 10
+
+# update فعلی (task فعلی) داخل یک تابع پروفایل‌شده است؛ فراخوانی‌های تو در تو دوباره شمرده نمی‌شوند
+inside = contextvars.ContextVar('profiled', default=False)
+current = None
+env_used = False
+
+
+class Session:
+    """یک دوره‌ی پروفایل: جایگزینی توابع، شمارش updateها و ساخت گزارش"""
+
+    def __init__(self, application, namespace, functions, methods, updates, chats, directory=PROFILE_DIR):
+        self.application = application
+        self.namespace = namespace
+        self.functions = functions
+        self.methods = methods
+        self.updates = updates
+        self.chats = chats
+        self.directory = directory
+        self.profile = cProfile.Profile()
+        self.depth = 0
+        self.done = 0
+        self.finished = False
+        self.swapped = []
+        self.started = time.time()
+        self.traced = False
+        self.baseline = None
+
+    # ---------- جایگزینی ----------
+
+    def install(self):
+        originals = {}
+        for name in self.functions:
+            fn = self.namespace[name]
+            originals[fn] = self.entry(fn)
+            self.swap(self.namespace, name, originals[fn], item=True)
+        # هندلرها callback را مستقیم نگه می‌دارند (شاید پیچیده در wrapper زمان‌سنجی)
+        for handlers in self.application.handlers.values():
+            for handler in handlers:
+                if unwrap(handler.callback) in originals:
+                    self.swap(handler, 'callback', self.entry(handler.callback))
+        for obj, names in self.methods:
+            for name in names:
+                self.swap(obj, name, self.nested(getattr(obj, name)), instance=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+            self.traced = True
+        self.baseline = tracemalloc.take_snapshot()
+
+    def swap(self, target, name, value, item=False, instance=False):
+        if item:
+            self.swapped.append((target, name, target[name], 'item'))
+            target[name] = value
+        else:
+            # متد روی خود شیء گذاشته می‌شود و با حذف آن دوباره متد کلاس دیده می‌شود
+            previous = None if instance else getattr(target, name)
+            self.swapped.append((target, name, previous, 'instance' if instance else 'attr'))
+            setattr(target, name, value)
+
+    def uninstall(self):
+        for target, name, previous, kind in reversed(self.swapped):
+            if kind == 'item':
+                target[name] = previous
+            elif kind == 'instance':
+                delattr(target, name)
+            else:
+                setattr(target, name, previous)
+        self.swapped = []
+
+    # ---------- wrapperها ----------
+
+    def enter(self):
+        self.depth += 1
+        if self.depth == 1 and not self.finished:
+            self.profile.enable()
+
+    def exit(self):
+        self.depth -= 1
+        if self.depth == 0:
+            self.profile.disable()
+
+    def entry(self, fn):
+        """wrapper هندلر: هر update یک بار شمرده می‌شود"""
+        async def profiled(update, context):
+            if inside.get() or self.finished:
+                return await fn(update, context)
+            token = inside.set(True)
+            self.enter()
+            try:
+                return await fn(update, context)
+            finally:
+                self.exit()
+                inside.reset(token)
+                self.done += 1
+                if self.done >= self.updates and self.depth == 0:
+                    await self.finish(context.bot)
+        profiled.__wrapped__ = fn
+        return profiled
+
+    def nested(self, fn):
+        """wrapper متدهای همگام (get_statistics، save_data)؛ بیرون از هندلرها هم پروفایل می‌شوند"""
+        def profiled(*args, **kwargs):
+            if self.finished:
+                return fn(*args, **kwargs)
+            self.enter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.exit()
+        profiled.__wrapped__ = fn
+        return profiled
+
+    # ---------- گزارش ----------
+
+    async def finish(self, bot):
+        global current
+        if self.finished:
+            return
+        self.finished = True
+        self.uninstall()
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        if self.traced:
+            tracemalloc.stop()
+        if current is self:
+            current = None
+        paths = self.write(snapshot)
+        logger.info("پروفایل %s update در %s نوشته شد", self.done, paths[0])
+        for chat in self.chats:
+            for path in paths:
+                try:
+                    with open(path, 'rb') as f:
+                        await bot.send_document(chat_id=chat, document=f, filename=os.path.basename(path),
+                                                caption=f"🔬 پروفایل {self.done} update")
+                except Exception as e:
+                    logger.warning("ارسال فایل پروفایل به %s نشد: %s", chat, e)
+
+    def write(self, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, time.strftime('profile-%Y%m%d-%H%M%S', time.localtime(self.started)))
+        self.profile.dump_stats(base + '.pstats')
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(self.report(snapshot))
+        return [base + '.pstats', base + '.txt']
+
+    def report(self, snapshot):
+        out = io.StringIO()
+        out.write(f"profile: {self.done} updates, {time.time() - self.started:.1f}s\n")
+        out.write(f"targets: {', '.join(self.functions)}, "
+                  f"{', '.join(n for _, names in self.methods for n in names)}\n\n")
+        try:
+            stats = pstats.Stats(self.profile, stream=out)
+        except TypeError:
+            out.write("(هیچ تابعی اجرا نشد)\n")
+        else:
+            out.write("=== cumulative ===\n")
+            stats.sort_stats('cumulative').print_stats(40)
+            out.write("=== tottime ===\n")
+            stats.sort_stats('tottime').print_stats(20)
+        own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        snapshot, baseline = snapshot.filter_traces(own), self.baseline.filter_traces(own)
+        out.write("=== tracemalloc: بیشترین حافظه‌ی زنده (lineno) ===\n")
+        for stat in snapshot.statistics('lineno')[:25]:
+            out.write(f"{stat}\n")
+        out.write("\n=== tracemalloc: رشد نسبت به شروع پروفایل ===\n")
+        for stat in snapshot.compare_to(baseline, 'lineno')[:25]:
+            out.write(f"{stat}\n")
+        return out.getvalue()
+
+
+def unwrap(fn):
+    while hasattr(fn, '__wrapped__'):
+        fn = fn.__wrapped__
+    return fn
+
+
+def start(application, namespace, functions, methods, updates, chats):
+    """شروع یک دوره؛ اگر دوره‌ای در جریان باشد None"""
+    global current
+    if current is not None:
+        return None
+    current = Session(application, namespace, functions, methods, min(updates, MAX_UPDATES), chats)
+    current.install()
+    return current
+
+
+async def stop(bot):
+    """پایان زودتر دوره‌ی فعلی با همان چیزهایی که تا حالا جمع شده"""
+    session = current
+    if session is None:
+        return None
+    await session.finish(bot)
+    return session
@@ -0,0 +1,243 @@
+import gc
+import sys
+from collections.abc import MutableMapping
+from dataclasses import dataclass, field, fields
+
+# نوع رکوردهای دفتر حساب: dataclass با __slots__ به جای dict، برای مصرف حافظه‌ی کمتر در دفترهای بزرگ.
+# هر رکورد رابط dict را پیاده می‌کند (r['x']، r.get، update، ...) تا ایندکس‌ها و هندلرها بدون تغییر کار کنند؛
+# فیلدی که مقدار نگرفته ABSENT است و مثل کلید نبودن در dict رفتار می‌کند. کلیدهای ناشناخته در _extra می‌روند.
+
+
+class Absent:
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'ABSENT'
+
+    def __bool__(self):
+        return False
+
+
+ABSENT = Absent()
+
+# فیلدهای متنی پرتکرار (مدل، تاریخ، ...) که یک نسخه‌ی مشترک از آن‌ها نگه داشته می‌شود
+SHARED = frozenset({'date', 'model', 'type', 'partner', 'customer_name', 'title'})
+
+
+class Record(MutableMapping):
+    __slots__ = ()
+    FIELDS = ()
+    FIELD_SET = frozenset()
+    SHARED_FIELDS = ()
+
+    @classmethod
+    def from_json(cls, values):
+        try:
+            record = cls(**values)
+        except TypeError:
+            # کلید ناشناخته (یا غیر رشته‌ای) در رکورد: یکی‌یکی تا بقیه به _extra بروند
+            record = cls()
+            for key, value in values.items():
+                record[key] = value
+        for name in cls.SHARED_FIELDS:
+            value = getattr(record, name)
+            if type(value) is str:
+                setattr(record, name, sys.intern(value))
+        return record
+
+    def to_json(self):
+        values = {}
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if value is not ABSENT:
+                values[name] = value
+        if self._extra:
+            values.update(self._extra)
+        return values
+
+    def __getitem__(self, key):
+        if key in self.FIELD_SET:
+            value = getattr(self, key)
+            if value is not ABSENT:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self.FIELD_SET:
+            value = getattr(self, key)
+            return default if value is ABSENT else value
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        if key in self.FIELD_SET:
+            return getattr(self, key) is not ABSENT
+        return self._extra is not None and key in self._extra
+
+    def __setitem__(self, key, value):
+        if key in self.FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self.FIELD_SET and getattr(self, key) is not ABSENT:
+            setattr(self, key, ABSENT)
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for name in self.FIELDS:
+            if getattr(self, name) is not ABSENT:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(getattr(self, name) is not ABSENT for name in self.FIELDS) + len(self._extra or ())
+
+    def copy(self):
+        return self.from_json(self.to_json())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_json()!r})"
+
+
+def record_type(cls):
+    cls = dataclass(slots=True, eq=False, repr=False)(cls)
+    cls.FIELDS = tuple(f.name for f in fields(cls) if f.name != '_extra')
+    cls.FIELD_SET = frozenset(cls.FIELDS)
+    cls.SHARED_FIELDS = tuple(name for name in cls.FIELDS if name in SHARED)
+    return cls
+
+
+@record_type
+class Purchase(Record):
+    id: int = ABSENT
+    date: str = ABSENT
+    model: str = ABSENT
+    buy_price: int = ABSENT
+    delivery_cost: int = ABSENT
+    extra_cost: int = ABSENT
+    total_cost: int = ABSENT
+    purchase_debt: int = ABSENT
+    remaining_debt: int = ABSENT
+    cash_paid: int = ABSENT
+    notes: str = ABSENT
+    sold: bool = ABSENT
+    _extra: dict = field(default=None, init=False)
+
+
+@record_type
+class Sale(Record):
+    id: int = ABSENT
+    date: str = ABSENT
+    purchase_id: int = ABSENT
+    model: str = ABSENT
+    purchase_price: int = ABSENT
+    sell_price: int = ABSENT
+    debt: int = ABSENT
+    remaining_debt: int = ABSENT
+    profit: int = ABSENT
+    cash_received: int = ABSENT
+    customer_name: str = ABSENT
+    customer_phone: str = ABSENT
+    notes: str = ABSENT
+    _extra: dict = field(default=None, init=False)
+
+
+@record_type
+class Cost(Record):
+    id: int = ABSENT
+    date: str = ABSENT
+    title: str = ABSENT
+    amount: int = ABSENT
+    description: str = ABSENT
+    _extra: dict = field(default=None, init=False)
+
+
+@record_type
+class Transaction(Record):
+    id: int = ABSENT
+    date: str = ABSENT
+    type: str = ABSENT
+    model: str = ABSENT
+    amount: int = ABSENT
+    debt: int = ABSENT
+    profit: int = ABSENT
+    description: str = ABSENT
+    _extra: dict = field(default=None, init=False)
+
+
+@record_type
+class DebtPayment(Record):
+    """پرداخت بدهی فروش (sale_id) یا خرید (purchase_id)"""
+    id: int = ABSENT
+    sale_id: int = ABSENT
+    purchase_id: int = ABSENT
+    date: str = ABSENT
+    amount: int = ABSENT
+    notes: str = ABSENT
+    model: str = ABSENT
+    customer_name: str = ABSENT
+    _extra: dict = field(default=None, init=False)
+
+
+@record_type
+class PartnerTransaction(Record):
+    id: int = ABSENT
+    partner: str = ABSENT
+    type: str = ABSENT
+    amount: int = ABSENT
+    date: str = ABSENT
+    description: str = ABSENT
+    _extra: dict = field(default=None, init=False)
+
+
+TYPES = {
+    'purchases': Purchase,
+    'sales': Sale,
+    'costs': Cost,
+    'transactions': Transaction,
+    'debt_payments': DebtPayment,
+    'purchase_debt_payments': DebtPayment,
+    'partner_transactions': PartnerTransaction,
+}
+
+
+def make(collection, record):
+    """تبدیل dict خوانده‌شده از JSON به نوع رکورد همان لیست؛ رکوردهای تبدیل‌شده و لیست‌های ناشناخته دست نمی‌خورند"""
+    cls = TYPES.get(collection)
+    if cls is None or not isinstance(record, dict):
+        return record
+    return cls.from_json(record)
+
+
+def convert(data):
+    """تبدیل در جای همه‌ی لیست‌های data"""
+    # ساختن صدها هزار شیء پشت سر هم GC را بی‌فایده بارها اجرا می‌کند
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for c in TYPES:
+            records = data.get(c)
+            if isinstance(records, list):
+                records[:] = [make(c, r) for r in records]
+    finally:
+        if enabled:
+            gc.enable()
+    return data
+
+
+def to_json(value):
+    """برای json.dumps(..., default=to_json)"""
+    if isinstance(value, Record):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,188 @@
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# گزارش دوره‌ای (روزانه، هفتگی، ماهانه به تقویم شمسی) از جمع‌های از پیش ساخته‌شده‌ی هر دوره.
+# مثل LedgerAggregates با rebuild / added / removed به‌روز می‌شود تا گزارش بدون پیمایش داده‌ها ساخته شود.
+
+PERIODS = ('day', 'week', 'month')
+FIELDS = ('sales', 'revenue', 'profit', 'purchases', 'purchase_value', 'costs', 'cash_in', 'cash_out')
+MONTHS = ['فروردین', 'اردیبهشت', 'خرداد', 'تیر', 'مرداد', 'شهریور',
+          'مهر', 'آبان', 'آذر', 'دی', 'بهمن', 'اسفند']
+
+
+def gregorian_to_jalali(gy, gm, gd):
+    days_before = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+    gy2 = gy + 1 if gm > 2 else gy
+    days = 355666 + 365 * gy + (gy2 + 3) // 4 - (gy2 + 99) // 100 + (gy2 + 399) // 400 + gd + days_before[gm - 1]
+    jy = -1595 + 33 * (days // 12053)
+    days %= 12053
+    jy += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        jy += (days - 1) // 365
+        days = (days - 1) % 365
+    if days < 186:
+        return jy, 1 + days // 31, 1 + days % 31
+    return jy, 7 + (days - 186) // 30, 1 + (days - 186) % 30
+
+
+def jalali_to_gregorian(jy, jm, jd):
+    jy += 1595
+    days = -355668 + 365 * jy + (jy // 33) * 8 + ((jy % 33) + 3) // 4 + jd
+    days += (jm - 1) * 31 if jm < 7 else (jm - 7) * 30 + 186
+    gy = 400 * (days // 146097)
+    days %= 146097
+    if days > 36524:
+        days -= 1
+        gy += 100 * (days // 36524)
+        days %= 36524
+        if days >= 365:
+            days += 1
+    gy += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        gy += (days - 1) // 365
+        days = (days - 1) % 365
+    leap = gy % 4 == 0 and gy % 100 != 0 or gy % 400 == 0
+    month_days = [31, 29 if leap else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    gd = days + 1
+    gm = 1
+    for length in month_days:
+        if gd <= length:
+            break
+        gd -= length
+        gm += 1
+    return gy, gm, gd
+
+
+@lru_cache(maxsize=4096)
+def parse_day(text):
+    """تاریخ ذخیره‌شده (YYYY/MM/DD میلادی، یا شمسی اگر سال کمتر از ۱۷۰۰ باشد) به date میلادی؛ None اگر نامعتبر"""
+    try:
+        year, month, day = (int(p) for p in str(text).replace('-', '/').split('/'))
+        if year < 1700:
+            if not (1 <= month <= 12 and 1 <= day <= 31):
+                return None
+            year, month, day = jalali_to_gregorian(year, month, day)
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def jalali_text(day):
+    return "%04d/%02d/%02d" % gregorian_to_jalali(day.year, day.month, day.day)
+
+
+def period_key(period, day):
+    """کلید دوره‌ی یک روز: روز شمسی، شنبه‌ی شروع هفته، یا ماه شمسی"""
+    if period == 'day':
+        return jalali_text(day)
+    if period == 'week':
+        # هفته از شنبه شروع می‌شود (weekday شنبه = ۵)
+        return jalali_text(day - timedelta(days=(day.weekday() - 5) % 7))
+    return jalali_text(day)[:7]
+
+
+@lru_cache(maxsize=4096)
+def period_keys(text):
+    """کلیدهای روز، هفته و ماه یک تاریخ ذخیره‌شده؛ None اگر نامعتبر (تاریخ‌ها زیاد تکرار می‌شوند)"""
+    day = parse_day(text)
+    if day is None:
+        return None
+    return tuple((period, period_key(period, day)) for period in PERIODS)
+
+
+def period_label(period, key):
+    if period == 'month':
+        year, month = key.split('/')
+        return f"{MONTHS[int(month) - 1]} {year}"
+    if period == 'week':
+        return f"هفته‌ی {key}"
+    return key
+
+
+class ReportBuckets:
+    """جمع فروش، سود، خرید، هزینه و جریان نقدی برای هر روز، هفته و ماه شمسی"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buckets = {p: {} for p in PERIODS}
+
+    def rebuild(self, data):
+        self.reset()
+        for c in ('purchases', 'sales', 'costs', 'debt_payments', 'purchase_debt_payments', 'partner_transactions'):
+            for record in data.get(c, []):
+                self.added(c, record)
+
+    def added(self, collection, record):
+        self._apply(collection, record, 1)
+
+    def removed(self, collection, record):
+        self._apply(collection, record, -1)
+
+    @staticmethod
+    def changes(collection, r):
+        """سهم یک رکورد در جمع‌های دوره"""
+        if collection == 'sales':
+            return {'sales': 1, 'revenue': r['sell_price'], 'profit': r.get('profit', 0),
+                    'cash_in': r.get('cash_received', r['sell_price'] - r.get('debt', 0))}
+        if collection == 'purchases':
+            return {'purchases': 1, 'purchase_value': r['total_cost'],
+                    'cash_out': r.get('cash_paid', r['total_cost'] - r.get('purchase_debt', 0))}
+        if collection == 'costs':
+            return {'costs': r['amount'], 'cash_out': r['amount']}
+        if collection == 'debt_payments':
+            return {'cash_in': r['amount']}
+        if collection == 'purchase_debt_payments':
+            return {'cash_out': r['amount']}
+        if collection == 'partner_transactions':
+            if r['type'] == 'cash_withdraw':
+                return {'cash_out': r['amount']}
+            if r['type'] == 'cash_deposit':
+                return {'cash_in': r['amount']}
+            if r['type'] == 'personal_expense':
+                # مثل total_costs داشبورد، هزینه‌ی شخصی شریک جزو هزینه‌هاست
+                return {'costs': r['amount']}
+        return None
+
+    def _apply(self, collection, record, sign):
+        changes = self.changes(collection, record)
+        if not changes:
+            return
+        keys = period_keys(record.get('date'))
+        if keys is None:
+            return
+        for period, key in keys:
+            buckets = self.buckets[period]
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = dict.fromkeys(FIELDS, 0)
+            for field, value in changes.items():
+                bucket[field] += sign * value
+            if not any(bucket.values()):
+                del buckets[key]
+
+    # ---------- خواندن ----------
+
+    def recent(self, period, count, today=None):
+        """count دوره‌ی آخر تا امروز (از جدید به قدیم)، شامل دوره‌های خالی: [(کلید، جمع‌ها)]"""
+        day = today or datetime.now().date()
+        result = []
+        key = None
+        while len(result) < count:
+            current = period_key(period, day)
+            if current != key:
+                key = current
+                result.append((key, self.buckets[period].get(key) or dict.fromkeys(FIELDS, 0)))
+            day -= timedelta(days=7 if period == 'week' else 1)
+        return result
+
+    @staticmethod
+    def total(rows):
+        total = dict.fromkeys(FIELDS, 0)
+        for _, bucket in rows:
+            for field in FIELDS:
+                total[field] += bucket[field]
+        return total
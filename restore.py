@@ -0,0 +1,284 @@
+import json
+
+from backup import apply_delta, open_backup
+from records import make
+
+# بازیابی جریانی: فایل پشتیبان تکه‌تکه خوانده می‌شود، هر رکورد همان لحظه اعتبارسنجی
+# و به ایندکس‌های تازه داده می‌شود؛ حالت فعلی ربات تا پایان موفق خواندن دست نمی‌خورد.
+
+READ_CHUNK = 64 * 1024
+REQUIRED_KEYS = ['purchases', 'sales', 'costs', 'transactions', 'partner_transactions']
+
+NUMBER = (int, float)
+# فیلدهای لازم هر رکورد و نوعشان؛ فیلدهایی که با ? تمام می‌شوند اختیاری‌اند.
+# فیلدهای لازم همان‌هایی‌اند که لیست‌ها و صفحه‌های جزئیات مستقیم (بدون get) می‌خوانند.
+SCHEMAS = {
+    'purchases': {'id': int, 'date': str, 'model': str, 'buy_price': NUMBER, 'total_cost': NUMBER,
+                  'sold?': bool, 'delivery_cost?': NUMBER, 'extra_cost?': NUMBER, 'purchase_debt?': NUMBER,
+                  'remaining_debt?': NUMBER, 'cash_paid?': NUMBER, 'notes?': str},
+    'sales': {'id': int, 'date': str, 'purchase_id': int, 'model': str, 'sell_price': NUMBER,
+              'purchase_price?': NUMBER, 'debt?': NUMBER, 'remaining_debt?': NUMBER, 'profit?': NUMBER,
+              'cash_received?': NUMBER, 'customer_name?': str, 'notes?': str},
+    'costs': {'id': int, 'date': str, 'title': str, 'amount': NUMBER, 'description?': str},
+    'transactions': {'id': int, 'date': str, 'type': str, 'model': str, 'amount': NUMBER,
+                     'debt?': NUMBER, 'profit?': NUMBER, 'description?': str},
+    'debt_payments': {'sale_id': int, 'amount': NUMBER, 'date?': str},
+    'purchase_debt_payments': {'purchase_id': int, 'amount': NUMBER, 'date?': str},
+    'partner_transactions': {'partner': str, 'type': str, 'amount': NUMBER, 'date': str, 'description': str},
+}
+SCALARS = {'initial_capital': NUMBER}
+
+
+class RestoreError(ValueError):
+    def __init__(self, message, line=None):
+        super().__init__(f"خط {line}: {message}" if line else message)
+        self.line = line
+
+
+def type_matches(value, kind):
+    # bool زیرکلاس int است ولی به جای عدد قبول نمی‌شود
+    if isinstance(value, bool) and kind is not bool:
+        return False
+    return isinstance(value, kind)
+
+
+def check_record(collection, record):
+    """پیام خطای اعتبارسنجی رکورد، یا None اگر رکورد سالم باشد"""
+    if not isinstance(record, dict):
+        return "رکورد باید شیء JSON باشد"
+    for field, kind in SCHEMAS.get(collection, {}).items():
+        optional = field.endswith('?')
+        field = field.rstrip('?')
+        if field not in record:
+            if optional:
+                continue
+            return f"فیلد «{field}» وجود ندارد"
+        if not type_matches(record[field], kind):
+            return f"نوع فیلد «{field}» نامعتبر است ({record[field]!r})"
+    return None
+
+
+class StreamParser:
+    """پارسر افزایشی JSON برای پشتیبان: کلیدهای سطح بالا و رکوردهای هر لیست را یکی‌یکی برمی‌گرداند"""
+
+    def __init__(self, stream, chunk_size=READ_CHUNK):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.line = 1
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """اولین کاراکتر غیر فاصله (بدون مصرف آن)؛ در پایان فایل رشته‌ی خالی"""
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                if buf[pos] == '\n':
+                    self.line += 1
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ''
+
+    def _take(self, expected):
+        ch = self._peek()
+        if ch not in expected:
+            raise RestoreError(f"انتظار «{expected[0]}» بود ولی «{ch or 'پایان فایل'}» آمد", self.line)
+        self.pos += 1
+        return ch
+
+    def _value(self):
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise RestoreError(f"JSON نامعتبر: {e.msg}", self.line + self.buf.count('\n', self.pos, e.pos))
+            # عدد یا کلمه‌ای که درست در انتهای بافر تمام شده ممکن است ادامه داشته باشد
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.line += self.buf.count('\n', self.pos, end)
+            self.pos = end
+            return value
+
+    def events(self):
+        """رویدادها: ('scalar', کلید، مقدار، خط)، ('list', کلید، None، خط) و ('record', کلید، رکورد، خط)"""
+        self._take('{')
+        if self._peek() == '}':
+            self.pos += 1
+        else:
+            while True:
+                self._peek()
+                line = self.line
+                key = self._value()
+                if not isinstance(key, str):
+                    raise RestoreError("کلید سطح بالا باید رشته باشد", line)
+                self._take(':')
+                if self._peek() == '[':
+                    self.pos += 1
+                    yield 'list', key, None, line
+                    if self._peek() == ']':
+                        self.pos += 1
+                    else:
+                        while True:
+                            self._peek()
+                            line = self.line
+                            yield 'record', key, self._value(), line
+                            if self._take(',]') == ']':
+                                break
+                else:
+                    yield 'scalar', key, self._value(), line
+                if self._take(',}') == '}':
+                    break
+        if self._peek():
+            raise RestoreError("داده‌ی اضافه بعد از پایان JSON", self.line)
+
+
+def load_backup(fileobj, observers, data):
+    """خواندن و اعتبارسنجی جریانی پشتیبان کامل در data (اسکلت خالی) و ساختن observers همزمان با آن.
+
+    برای اجرا در thread جدا نوشته شده: فقط روی اشیای تازه کار می‌کند. خروجی متادیتای _backup است.
+    """
+    for observer in observers:
+        observer.rebuild(data)
+    meta = {}
+    seen = set()
+    with open_backup(fileobj) as stream:
+        for kind, key, value, line in StreamParser(stream).events():
+            if kind == 'record':
+                records = data[key]
+                error = check_record(key, value)
+                if error:
+                    raise RestoreError(f"{key}[{len(records)}]: {error}", line)
+                value = make(key, value)
+                records.append(value)
+                for observer in observers:
+                    observer.added(key, value)
+            elif key in seen:
+                raise RestoreError(f"کلید «{key}» تکراری است", line)
+            elif kind == 'list':
+                if key in SCALARS:
+                    raise RestoreError(f"مقدار «{key}» نامعتبر است", line)
+                seen.add(key)
+                data[key] = []
+            else:
+                seen.add(key)
+                if key == '_backup':
+                    meta = value
+                    continue
+                if key in SCHEMAS or (key in SCALARS and not type_matches(value, SCALARS[key])):
+                    raise RestoreError(f"مقدار «{key}» نامعتبر است", line)
+                data[key] = value
+    missing = [k for k in REQUIRED_KEYS if k not in seen]
+    if missing:
+        raise RestoreError(f"کلیدهای لازم وجود ندارند: {', '.join(missing)}")
+    return meta
+
+
+def read_header(fileobj):
+    """نوع و شناسه‌ی یک فایل بازیابی زنجیره‌ای: {'type': 'full'|'incremental', 'id', 'base'}.
+
+    فایل بسته نمی‌شود و به ابتدا برمی‌گردد تا در اعمال بازیابی دوباره خوانده شود.
+    """
+    stream = open_backup(fileobj)
+    scalars, lists = {}, set()
+    try:
+        for kind, key, value, line in StreamParser(stream).events():
+            if kind == 'scalar':
+                scalars[key] = value
+            elif kind == 'list':
+                lists.add(key)
+    finally:
+        inner = stream.detach()
+        if inner is not fileobj:
+            inner.close()
+        fileobj.seek(0)
+    if scalars.get('type') == 'incremental':
+        if not isinstance(scalars.get('changes'), dict) or not isinstance(scalars.get('backup_id'), str):
+            raise RestoreError("پشتیبان افزایشی نامعتبر است")
+        return {'type': 'incremental', 'id': scalars['backup_id'], 'base': scalars.get('base')}
+    missing = [k for k in REQUIRED_KEYS if k not in lists]
+    if missing:
+        raise RestoreError(f"کلیدهای لازم وجود ندارند: {', '.join(missing)}")
+    meta = scalars.get('_backup')
+    return {'type': 'full', 'id': meta.get('id', '-') if isinstance(meta, dict) else '-', 'base': None}
+
+
+def load_delta(fileobj):
+    """خواندن و اعتبارسنجی پشتیبان افزایشی (کوچک است و یکجا خوانده می‌شود)"""
+    with open_backup(fileobj) as stream:
+        try:
+            delta = json.load(stream)
+        except ValueError as e:
+            raise RestoreError(f"JSON نامعتبر: {e}")
+    if not isinstance(delta, dict) or delta.get('type') != 'incremental' or not isinstance(delta.get('changes'), dict):
+        raise RestoreError("پشتیبان افزایشی نامعتبر است")
+    scalars = delta.get('scalars', {})
+    if not isinstance(scalars, dict):
+        raise RestoreError("مقدار «scalars» نامعتبر است")
+    for key, value in scalars.items():
+        if key in SCHEMAS or (key in SCALARS and not type_matches(value, SCALARS[key])):
+            raise RestoreError(f"مقدار «{key}» نامعتبر است")
+    for collection, change in delta['changes'].items():
+        if collection not in SCHEMAS or not isinstance(change, dict):
+            raise RestoreError(f"تغییرات «{collection}» نامعتبر است")
+        upserts = change.get('upsert', [])
+        if not isinstance(upserts, list) or not isinstance(change.get('delete', []), list):
+            raise RestoreError(f"تغییرات «{collection}» نامعتبر است")
+        for i, record in enumerate(upserts):
+            error = check_record(collection, record)
+            if error:
+                raise RestoreError(f"{collection}.upsert[{i}]: {error}")
+        change['upsert'] = [make(collection, record) for record in upserts]
+    return delta
+
+
+def load_chain(files, observers, data):
+    """بازیابی زنجیره‌ای: پشتیبان کامل files[0] و بعد پشتیبان‌های افزایشی به ترتیب، در data.
+
+    مثل load_backup برای اجرا در thread جدا؛ خروجی شناسه‌ی آخرین فایل اعمال‌شده است.
+    """
+    if len(files) == 1:
+        return load_backup(files[0], observers, data).get('id', '-')
+    # تغییرات افزایشی رکوردها را جابه‌جا می‌کنند؛ observerها یک بار روی نتیجه‌ی نهایی ساخته می‌شوند
+    last = load_backup(files[0], [], data).get('id', '-')
+    for fileobj in files[1:]:
+        delta = load_delta(fileobj)
+        if delta.get('base') != last:
+            raise RestoreError(f"ترتیب اشتباه است؛ فایل بعد از {last} لازم است")
+        apply_delta(data, delta)
+        last = delta.get('backup_id', '-')
+    for observer in observers:
+        observer.rebuild(data)
+    return last
+
+
+def load_inventory(fileobj):
+    """خواندن و اعتبارسنجی پشتیبان انبار؛ خروجی لیست خریدها (قابل اجرا در thread)"""
+    with open_backup(fileobj) as stream:
+        try:
+            data = json.load(stream)
+        except ValueError as e:
+            raise RestoreError(f"JSON نامعتبر: {e}")
+    if not isinstance(data, dict) or data.get('type') != 'inventory' or not isinstance(data.get('items', []), list):
+        raise RestoreError("فرمت نامعتبر")
+    items = data.get('items', [])
+    for i, item in enumerate(items):
+        error = check_record('purchases', item)
+        if error:
+            raise RestoreError(f"items[{i}]: {error}")
+    return [make('purchases', item) for item in items]
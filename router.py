@@ -0,0 +1,85 @@
+import re
+
+# مبدل‌های پارامترهای مسیر: <int:pid> یا <str:name>
+CONVERTERS = {
+    'int': (r'-?\d+', int),
+    'str': (r'[^:]+', str),
+}
+
+PARAM = re.compile(r'<(\w+):(\w+)>')
+
+
+class Route:
+    def __init__(self, pattern, handler):
+        self.pattern = pattern
+        self.handler = handler
+        self.name = pattern
+        self.prefix = PARAM.split(pattern, 1)[0] if PARAM.search(pattern) else pattern
+        regex, self.converters = '', {}
+        pos = 0
+        for m in PARAM.finditer(pattern):
+            kind, name = m.group(1), m.group(2)
+            regex += re.escape(pattern[pos:m.start()]) + f'(?P<{name}>{CONVERTERS[kind][0]})'
+            self.converters[name] = CONVERTERS[kind][1]
+            pos = m.end()
+        regex += re.escape(pattern[pos:])
+        self.regex = re.compile(regex)
+
+    def parse(self, data):
+        m = self.regex.fullmatch(data)
+        if not m:
+            return None
+        return {k: self.converters[k](v) for k, v in m.groupdict().items()}
+
+
+class CallbackRouter:
+    """مسیریابی callback_data: جستجوی مستقیم برای مسیرهای ثابت و trie پیشوندی برای مسیرهای پارامتردار"""
+
+    def __init__(self):
+        self.exact = {}
+        self.trie = {}
+
+    def route(self, pattern):
+        def decorator(handler):
+            self.add(pattern, handler)
+            return handler
+        return decorator
+
+    def add(self, pattern, handler):
+        route = Route(pattern, handler)
+        if not route.converters:
+            self.exact[pattern] = route
+            return route
+        node = self.trie
+        for ch in route.prefix:
+            node = node.setdefault(ch, {})
+        node.setdefault(None, []).append(route)
+        return route
+
+    def resolve(self, data):
+        route = self.exact.get(data)
+        if route:
+            return route, {}
+        # همه‌ی گره‌های مسیر را جمع می‌کنیم و از طولانی‌ترین پیشوند شروع می‌کنیم
+        candidates = []
+        node = self.trie
+        for ch in data:
+            node = node.get(ch)
+            if node is None:
+                break
+            if None in node:
+                candidates.append(node[None])
+        for routes in reversed(candidates):
+            for route in routes:
+                kwargs = route.parse(data)
+                if kwargs is not None:
+                    return route, kwargs
+        return None, None
+
+    async def dispatch(self, update, context):
+        # زمان هر مسیر را wrapper هندلر در instrumentation با برچسب callback:<مسیر> ثبت می‌کند
+        route, kwargs = self.resolve(update.callback_query.data)
+        if route is None:
+            return False
+        await route.handler(update, context, **kwargs)
+        return True
@@ -0,0 +1,225 @@
+import gc
+import heapq
+import re
+from functools import lru_cache
+from bisect import bisect_left, insort
+from operator import itemgetter
+
+from reports import parse_day
+
+# جستجوی متنی روی خریدها و فروش‌ها: ایندکس معکوس (کلمه ← رکوردها) که مثل بقیه‌ی ایندکس‌ها
+# با rebuild / added / removed در AccountingBot به‌روز می‌شود.
+
+# فیلدهایی که در هر لیست جستجو می‌شوند
+FIELDS = {
+    'purchases': ('model', 'notes'),
+    'sales': ('model', 'customer_name', 'customer_phone', 'notes'),
+}
+
+NORMALIZE = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ؤ': 'و',
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4', '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4', '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+    '‌': ' ',  # نیم‌فاصله
+    'ـ': None,  # کشیده
+})
+DIACRITICS = re.compile('[ً-ٰٟ]')
+WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+    """یکسان‌سازی متن فارسی: ی/ک عربی، ارقام فارسی و عربی، اعراب، نیم‌فاصله و حروف بزرگ لاتین"""
+    return DIACRITICS.sub('', str(text).translate(NORMALIZE)).lower()
+
+
+def tokenize(text):
+    return WORD.findall(normalize(text))
+
+
+@lru_cache(maxsize=8192)
+def field_words(value):
+    # مدل‌ها و نام مشتری‌ها زیاد تکرار می‌شوند؛ نتیجه‌ی یکسان‌سازی هر مقدار cache می‌شود
+    return frozenset(tokenize(value))
+
+
+def normalize_date(text):
+    """تاریخ ورودی کاربر (1403/1/5 یا ۱۴۰۳-۰۱-۰۵ یا میلادی) به کلید میلادی YYYY/MM/DD ایندکس تاریخ"""
+    parts = re.split(r'[/\-.]', normalize(text).strip())
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        raise ValueError(f"تاریخ نامعتبر: {text}")
+    # سال کمتر از ۱۷۰۰ شمسی است (مثل parse_day در reports)
+    day = parse_day('/'.join(parts))
+    if day is None:
+        raise ValueError(f"تاریخ نامعتبر: {text}")
+    return day.strftime('%Y/%m/%d')
+
+
+@lru_cache(maxsize=4096)
+def date_key(text):
+    """تاریخ ذخیره‌شده (میلادی یا شمسی) به YYYY/MM/DD میلادی تا بازه‌ها با هر دو تقویم درست مقایسه شوند"""
+    day = parse_day(text)
+    return day.strftime('%Y/%m/%d') if day is not None else text
+
+
+class SearchIndex:
+    """ایندکس معکوس با جستجوی پیشوندی (واژگان مرتب + bisect) و ایندکس تاریخ برای فیلتر بازه"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.postings = {}  # کلمه ← مجموعه‌ی کلیدهای (collection, id)
+        self.vocabulary = []  # کلمه‌ها به ترتیب الفبا برای پیدا کردن پیشوندها
+        self.docs = {}  # کلید ← رکورد
+        self.by_date = []  # (تاریخ، collection، id) مرتب
+        self.keys = {c: set() for c in FIELDS}  # کلیدهای هر لیست برای فیلتر «در:»
+        self.unsold = set()  # خریدهای فروخته‌نشده برای فیلتر «فروخته:»
+
+    def rebuild(self, data):
+        self.reset()
+        # ساخت یکجا و مرتب‌سازی در پایان؛ insort تک‌تک برای ده‌ها هزار کلمه کند است.
+        # ده‌ها هزار set و tuple تازه GC را مدام به کار می‌اندازد، پس موقتاً خاموش می‌شود.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for c in FIELDS:
+                for record in data.get(c, []):
+                    self.insert(c, record, bulk=True)
+        finally:
+            if enabled:
+                gc.enable()
+        self.vocabulary = sorted(self.postings)
+        self.by_date.sort()
+
+    @staticmethod
+    def words(collection, record):
+        words = set()
+        for field in FIELDS[collection]:
+            value = record.get(field)
+            if value:
+                words |= field_words(value) if isinstance(value, str) else set(tokenize(value))
+        return words
+
+    @staticmethod
+    def date_entry(key, record):
+        return (date_key(record.get('date') or ''),) + key
+
+    def added(self, collection, record):
+        if collection in FIELDS:
+            self.insert(collection, record)
+
+    def insert(self, collection, record, bulk=False):
+        if record.get('id') is None:
+            return
+        key = (collection, record['id'])
+        # مثل RecordIndex اولین رکورد با هر id برنده است
+        if key in self.docs:
+            return
+        self.docs[key] = record
+        self.keys[collection].add(key)
+        if collection == 'purchases' and not record.get('sold'):
+            self.unsold.add(key)
+        for word in self.words(collection, record):
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = set()
+                if not bulk:
+                    insort(self.vocabulary, word)
+            posting.add(key)
+        if bulk:
+            self.by_date.append(self.date_entry(key, record))
+        else:
+            insort(self.by_date, self.date_entry(key, record))
+
+    def removed(self, collection, record):
+        if collection not in FIELDS:
+            return
+        key = (collection, record.get('id'))
+        if self.docs.get(key) is not record:
+            return
+        del self.docs[key]
+        self.keys[collection].discard(key)
+        self.unsold.discard(key)
+        for word in self.words(collection, record):
+            posting = self.postings.get(word)
+            if posting is None:
+                continue
+            posting.discard(key)
+            if not posting:
+                del self.postings[word]
+                self.vocabulary.pop(bisect_left(self.vocabulary, word))
+        entry = self.date_entry(key, record)
+        i = bisect_left(self.by_date, entry)
+        if i < len(self.by_date) and self.by_date[i] == entry:
+            del self.by_date[i]
+
+    def prefix(self, term):
+        """همه‌ی رکوردهایی که کلمه‌ای با این پیشوند دارند"""
+        start = bisect_left(self.vocabulary, term)
+        end = bisect_left(self.vocabulary, term + '\uffff', start)
+        words = self.vocabulary[start:end]
+        if len(words) == 1:
+            return self.postings[words[0]]
+        return set().union(*map(self.postings.__getitem__, words))
+
+    def date_bounds(self, start=None, end=None):
+        low = bisect_left(self.by_date, (start,)) if start else 0
+        high = bisect_left(self.by_date, (end + '\uffff',)) if end else len(self.by_date)
+        return low, high
+
+    def search(self, terms, start=None, end=None, sold=None, collections=None, limit=20):
+        """جستجوی AND روی پیشوند کلمه‌ها با فیلتر تاریخ، وضعیت فروش و نوع؛ خروجی (تعداد کل، جدیدترین‌ها)
+
+        همه‌ی فیلترها با عملیات مجموعه انجام می‌شوند تا حلقه‌ی پایتونی روی نتایج نباشد.
+        """
+        sets = [self.prefix(t) for t in terms]
+        if collections:
+            sets.append(set().union(*(self.keys[c] for c in collections)))
+        if sold is False:
+            sets.append(self.unsold)
+        low, high = self.date_bounds(start, end) if start or end else (0, None)
+        # بازه‌ی تاریخ اگر از بقیه‌ی فیلترها کوچک‌تر باشد مجموعه می‌شود، وگرنه نتایج یکی‌یکی بررسی می‌شوند
+        if high is not None and (not sets or high - low < min(map(len, sets))):
+            sets.append({entry[1:] for entry in self.by_date[low:high]})
+            high = None
+        if not sets:
+            sets.append(self.docs.keys())
+        # کوچک‌ترین مجموعه اول تا اشتراک‌ها سریع‌تر شوند
+        sets.sort(key=len)
+        matches = set(sets[0]).intersection(*sets[1:])
+        if high is not None:
+            start, end = start or '', (end or '') + '\uffff'
+            matches = {key for key in matches if start <= date_key(self.docs[key].get('date') or '') < end}
+        if sold:
+            # فروش‌ها همیشه فروخته‌شده حساب می‌شوند
+            matches -= self.unsold
+        newest = heapq.nlargest(limit, matches, key=itemgetter(1))
+        return len(matches), [(key[0], self.docs[key]) for key in newest]
+
+
+SOLD_VALUES = {'yes': True, 'بله': True, 'آره': True, '1': True, 'no': False, 'نه': False, 'خیر': False, '0': False}
+KIND_VALUES = {'buy': 'purchases', 'خرید': 'purchases', 'sell': 'sales', 'فروش': 'sales'}
+
+
+def parse_query(text):
+    """تبدیل متن جستجو به پارامترهای search: کلمه‌ها و فیلترهای from: to: sold: in:"""
+    options = {'terms': [], 'start': None, 'end': None, 'sold': None, 'collections': None}
+    for part in text.split():
+        name, sep, value = part.partition(':')
+        name = normalize(name)
+        if sep and name in ('from', 'از'):
+            options['start'] = normalize_date(value)
+        elif sep and name in ('to', 'تا'):
+            options['end'] = normalize_date(value)
+        elif sep and name in ('sold', 'فروخته'):
+            if normalize(value) not in SOLD_VALUES:
+                raise ValueError(f"مقدار sold نامعتبر: {value}")
+            options['sold'] = SOLD_VALUES[normalize(value)]
+        elif sep and name in ('in', 'در'):
+            if normalize(value) not in KIND_VALUES:
+                raise ValueError(f"مقدار in نامعتبر: {value}")
+            options['collections'] = {KIND_VALUES[normalize(value)]}
+        else:
+            options['terms'].extend(tokenize(part))
+    return options
@@ -0,0 +1,227 @@
+import gc
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from records import ABSENT, TYPES, Record, to_json
+
+# قالب دودویی ستونی برای snapshot (SNAPSHOT_FORMAT=binary در storage.py)، فقط با کتابخانه‌ی استاندارد.
+#
+#   MAGIC | طول هدر (uint32) | هدر JSON | بخش‌ها (هر کدام تراز ۸ بایتی) | sha256 همه‌ی بایت‌های قبل
+#
+# هدر ترتیب کلیدها، مقادیر عددی (initial_capital) و برای هر لیست، ستون‌ها را با نوع، جای شروع و طول
+# نگه می‌دارد. نوع ستون‌ها: q عدد صحیح ۶۴ بیتی، d اعشاری، b بولی، s اندیس در جدول رشته‌ها،
+# j اندیس متن JSON مقدار (برای ستون‌های با نوع مخلوط). ستونی که در بعضی رکوردها نیست یک بخش «حضور»
+# (یک بایت برای هر ردیف) هم دارد. جدول رشته‌ها همه‌ی رشته‌های یکتا با جداکننده‌ی \0 است.
+# خواندن با mmap و memoryview.cast انجام می‌شود و هر ستون یکجا (در C) به لیست پایتون تبدیل می‌شود.
+
+MAGIC = b'HSNAP\x00\x01\n'
+DIGEST_SIZE = 32
+INT64 = (-2 ** 63, 2 ** 63 - 1)
+# اندیس رشته‌ها: int32
+INDEX = 'i'
+MISSING = object()
+
+
+class Writer:
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.strings = {}
+
+    def section(self, payload):
+        """افزودن یک بخش؛ خروجی [offset، طول] نسبت به ابتدای بخش‌ها"""
+        if isinstance(payload, array):
+            if sys.byteorder == 'big':
+                payload = array(payload.typecode, payload)
+                payload.byteswap()
+            payload = payload.tobytes()
+        offset = self.size
+        self.chunks.append(payload)
+        self.size += len(payload)
+        padding = -self.size % 8
+        if padding:
+            self.chunks.append(b'\x00' * padding)
+            self.size += padding
+        return [offset, len(payload)]
+
+    def codes(self, texts):
+        """اندیس هر رشته در جدول رشته‌ها (رشته‌ی تازه به انتهای جدول اضافه می‌شود)"""
+        strings = self.strings
+        add = strings.setdefault
+        return array(INDEX, [-1 if v is MISSING else add(v, len(strings)) for v in texts])
+
+    def column(self, values):
+        """کدگذاری یک ستون (MISSING یعنی فیلد در آن ردیف نیست)"""
+        meta = {'mask': None}
+        found = values
+        if MISSING in values:
+            meta['mask'] = self.section(bytes(v is not MISSING for v in values))
+            found = [v for v in values if v is not MISSING]
+        kinds = set(map(type, found))
+        if kinds <= {int} and (not found or INT64[0] <= min(found) and max(found) <= INT64[1]):
+            meta['kind'] = 'q'
+            meta['data'] = self.section(array('q', [0 if v is MISSING else v for v in values]
+                                              if found is not values else values))
+        elif kinds == {float}:
+            meta['kind'] = 'd'
+            meta['data'] = self.section(array('d', [0.0 if v is MISSING else v for v in values]
+                                              if found is not values else values))
+        elif kinds == {bool}:
+            meta['kind'] = 'b'
+            meta['data'] = self.section(bytes(v is True for v in values))
+        elif kinds == {str} and not any('\x00' in v for v in set(found)):
+            meta['kind'] = 's'
+            meta['data'] = self.section(self.codes(values))
+        else:
+            meta['kind'] = 'j'
+            meta['data'] = self.section(self.codes([
+                v if v is MISSING else json.dumps(v, ensure_ascii=False, default=to_json) for v in values]))
+        return meta
+
+
+def field_names(collection, records):
+    """ترتیب ستون‌ها: فیلدهای نوع رکورد، بعد کلیدهای اضافه به ترتیب اولین دیده شدن"""
+    cls = TYPES.get(collection)
+    names = dict.fromkeys(cls.FIELDS if cls else ())
+    for r in records:
+        for key in r:
+            if key not in names:
+                names[key] = None
+    return [name for name in names if isinstance(name, str)]
+
+
+def dumps(data):
+    """snapshot دودویی data (dict یا Record در لیست‌ها)"""
+    writer = Writer()
+    header = {'order': list(data), 'scalars': {}, 'collections': {}}
+    for key, value in data.items():
+        if not (isinstance(value, list) and all(isinstance(r, (dict, Record)) for r in value)):
+            header['scalars'][key] = value
+            continue
+        columns = {}
+        for name in field_names(key, value):
+            columns[name] = writer.column([r.get(name, MISSING) for r in value])
+        header['collections'][key] = {'rows': len(value), 'columns': columns}
+    table = '\x00'.join(writer.strings).encode('utf-8')
+    header['strings'] = {'count': len(writer.strings), 'data': writer.section(table)}
+    head = json.dumps(header, ensure_ascii=False, separators=(',', ':'), default=to_json).encode('utf-8')
+    padding = b'\x00' * (-(len(MAGIC) + 4 + len(head)) % 8)
+    body = b''.join([MAGIC, struct.pack('<I', len(head)), head, padding] + writer.chunks)
+    return body + hashlib.sha256(body).digest()
+
+
+def is_snapshot(prefix):
+    return prefix.startswith(MAGIC)
+
+
+class Reader:
+    def __init__(self, view, base):
+        self.view = view
+        self.base = base
+
+    def bytes(self, where):
+        offset, size = where
+        return self.view[self.base + offset:self.base + offset + size]
+
+    def ints(self, where, typecode):
+        part = self.bytes(where)
+        try:
+            if sys.byteorder == 'big':
+                values = array(typecode, part.tobytes())
+                values.byteswap()
+                return values.tolist()
+            return part.cast(typecode).tolist()
+        finally:
+            part.release()
+
+
+def column_values(reader, meta, strings, rows):
+    kind = meta['kind']
+    if kind == 'b':
+        part = reader.bytes(meta['data'])
+        values = [v == 1 for v in part.tobytes()]
+        part.release()
+    elif kind in ('q', 'd'):
+        values = reader.ints(meta['data'], kind)
+    else:
+        codes = reader.ints(meta['data'], INDEX)
+        if kind == 's':
+            values = [strings[c] if c >= 0 else None for c in codes]
+        else:
+            values = [json.loads(strings[c]) if c >= 0 else None for c in codes]
+    if len(values) != rows:
+        raise ValueError("طول ستون با تعداد ردیف‌ها یکی نیست")
+    if meta['mask'] is not None:
+        part = reader.bytes(meta['mask'])
+        mask = part.tobytes()
+        part.release()
+        values = [v if present else ABSENT for v, present in zip(values, mask)]
+    return values
+
+
+def build_records(collection, rows, columns):
+    """ساخت رکوردها از ستون‌ها؛ برای نوع‌های records مستقیم با سازنده‌ی dataclass"""
+    cls = TYPES.get(collection)
+    if cls is None:
+        names = list(columns)
+        return [{k: v for k, v in zip(names, row) if v is not ABSENT} for row in zip(*columns.values())] \
+            if names else [{} for _ in range(rows)]
+    absent = [ABSENT] * rows
+    records = list(map(cls, *[columns.get(name, absent) for name in cls.FIELDS]))
+    for name, values in columns.items():
+        if name in cls.FIELD_SET:
+            continue
+        for record, value in zip(records, values):
+            if value is not ABSENT:
+                record[name] = value
+    return records
+
+
+def loads(buffer):
+    """خواندن snapshot از bytes / mmap؛ خطای قالب یا checksum: ValueError"""
+    view = memoryview(buffer)
+    # مثل records.convert: ساختن صدها هزار رکورد پشت سر هم GC را بی‌فایده بارها اجرا می‌کند
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if len(view) < len(MAGIC) + 4 + DIGEST_SIZE or bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("فایل snapshot دودویی نیست")
+        if hashlib.sha256(view[:-DIGEST_SIZE]).digest() != bytes(view[-DIGEST_SIZE:]):
+            raise ValueError("checksum نادرست است")
+        (head_size,) = struct.unpack_from('<I', view, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(view[start:start + head_size]).decode('utf-8'))
+        reader = Reader(view, start + head_size + (-(start + head_size) % 8))
+        part = reader.bytes(header['strings']['data'])
+        strings = str(part, 'utf-8').split('\x00') if header['strings']['count'] else []
+        part.release()
+        data = {}
+        for key in header['order']:
+            if key in header['scalars']:
+                data[key] = header['scalars'][key]
+                continue
+            spec = header['collections'][key]
+            columns = {name: column_values(reader, meta, strings, spec['rows'])
+                       for name, meta in spec['columns'].items()}
+            data[key] = build_records(key, spec['rows'], columns)
+        return data
+    except (KeyError, TypeError, IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError(f"snapshot دودویی نامعتبر است: {e!r}")
+    finally:
+        view.release()
+        if enabled:
+            gc.enable()
+
+
+def load_file(path):
+    """خواندن snapshot با mmap (بدون کپی کل فایل در حافظه)"""
+    with open(path, 'rb') as f:
+        size = f.seek(0, 2)
+        if size == 0:
+            raise ValueError("فایل خالی است")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return loads(mapped)
@@ -0,0 +1,484 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import snapshot
+from records import to_json
+
+logger = logging.getLogger(__name__)
+
+# تنظیمات ژورنال
+JOURNAL_FSYNC_EVERY = 20  # بعد از چند رکورد fsync شود
+JOURNAL_FSYNC_INTERVAL = 2.0  # حداکثر فاصله بین دو fsync (ثانیه)
+JOURNAL_COMPACT_EVERY = 5000  # بعد از چند رکورد ژورنال در snapshot ادغام شود
+SNAPSHOT_GENERATIONS = int(os.environ.get('SNAPSHOT_GENERATIONS', '3'))  # تعداد نسل‌های قبلی snapshot
+CHECKSUM_PREFIX = b'#sha256='
+# قالب snapshot فایل JSON: json (متنی، قابل خواندن) یا binary (ستونی، snapshot.py)؛
+# خواندن بر اساس بایت‌های ابتدای فایل است، پس عوض کردن این مقدار روی داده‌ی موجود امن است
+SNAPSHOT_FORMAT = os.environ.get('SNAPSHOT_FORMAT', 'json')
+
+COLLECTIONS = ['purchases', 'sales', 'costs', 'transactions', 'debt_payments',
+               'purchase_debt_payments', 'partner_transactions']
+
+
+class StorageBase:
+    """بخش مشترک backendها برای کار با writer پس‌زمینه (writer.py).
+
+    append و take در thread اصلی صدا زده می‌شوند، write در thread نویسنده.
+    lock از داده‌ها در برابر تغییر همزمان محافظت می‌کند (AccountingBot هر تغییر را زیر آن انجام می‌دهد)
+    و io_lock نوشتن روی دیسک را سریال می‌کند. replace شماره‌ی generation را بالا می‌برد تا دسته‌های
+    قدیمی‌ای که هنوز در صف هستند روی داده‌ی جدید نوشته نشوند.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.generation = 0
+        self.lock = threading.RLock()
+        self.io_lock = threading.RLock()
+
+    def take(self):
+        """برداشتن تغییرات ثبت‌شده برای نوشتن: (generation، دسته)"""
+        with self.lock:
+            batch, self.pending = self.pending, []
+            return self.generation, batch
+
+    def stale(self, generation):
+        return generation is not None and generation != self.generation
+
+    def commit(self, sync=False):
+        """نوشتن همزمان تغییرات ثبت‌شده (بدون writer پس‌زمینه)"""
+        generation, batch = self.take()
+        if batch or sync:
+            self.write(batch, sync, generation)
+
+
+def apply_op(data, op):
+    """اعمال یک عملیات (add / set / del / put) روی دیکشنری داده‌ها"""
+    kind = op['op']
+    if kind == 'add':
+        if op.get('front'):
+            data[op['c']].insert(0, op['r'])
+        else:
+            data[op['c']].append(op['r'])
+        return op['r']
+    if kind == 'set':
+        for r in data[op['c']]:
+            if r['id'] == op['id']:
+                r.update(op['f'])
+                return r
+        return None
+    if kind == 'del':
+        match = op['m']
+        keep, removed = [], []
+        for r in data[op['c']]:
+            if all(r.get(k) == v for k, v in match.items()):
+                removed.append(r)
+            else:
+                keep.append(r)
+        if removed:
+            data[op['c']] = keep
+        return removed
+    if kind == 'put':
+        data[op['k']] = op['v']
+        return op['v']
+    raise ValueError(f"عملیات ناشناخته: {kind}")
+
+
+# ==================== ذخیره‌سازی JSON + ژورنال ====================
+
+def fsync_dir(path):
+    """fsync پوشه‌ی فایل تا rename ها بعد از قطع برق هم باقی بمانند"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def encode_snapshot(data, fmt='json'):
+    """متن JSON به همراه خط آخر checksum: #sha256=<hex>؛ یا با fmt='binary' قالب دودویی snapshot.py"""
+    if fmt == 'binary':
+        return snapshot.dumps(data)
+    body = json.dumps(data, ensure_ascii=False, indent=2, default=to_json).encode('utf-8')
+    return body + b'\n' + CHECKSUM_PREFIX + hashlib.sha256(body).hexdigest().encode('ascii') + b'\n'
+
+
+def decode_snapshot(raw):
+    """خواندن snapshot و بررسی checksum؛ فایل‌های قدیمی بدون footer هم پذیرفته می‌شوند (خطا: ValueError)"""
+    body = raw
+    end = raw.rstrip(b'\n')
+    cut = end.rfind(b'\n')
+    footer = end[cut + 1:]
+    if footer.startswith(CHECKSUM_PREFIX):
+        body = end[:max(cut, 0)]
+        if hashlib.sha256(body).hexdigest().encode('ascii') != footer[len(CHECKSUM_PREFIX):]:
+            raise ValueError("checksum نادرست است")
+    data = json.loads(body.decode('utf-8'))
+    if not isinstance(data, dict):
+        raise ValueError("snapshot باید شیء JSON باشد")
+    return data
+
+
+def read_snapshot(path):
+    """خواندن یک فایل snapshot با تشخیص قالب از روی ابتدای فایل (دودویی با mmap)"""
+    with open(path, 'rb') as f:
+        prefix = f.read(len(snapshot.MAGIC))
+        if not snapshot.is_snapshot(prefix):
+            return decode_snapshot(prefix + f.read())
+    return snapshot.load_file(path)
+
+
+class JsonStorage(StorageBase):
+    def __init__(self, data_file='accounting_data.json', fmt='json'):
+        super().__init__()
+        self.data_file = data_file
+        self.format = fmt
+        self.journal_file = os.path.splitext(data_file)[0] + '.journal'
+        self.journal = None
+        self.journal_size = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.data = None
+
+    # نسل 0 فایل اصلی است و نسل n فایل «.n»؛ ژورنال هر نسل تغییرات بعد از همان snapshot است.
+    # با خراب شدن فایل اصلی، آخرین نسل سالم به همراه ژورنال‌های بعد از آن بازیابی می‌شود.
+
+    def generation_file(self, n):
+        return self.data_file if n == 0 else f'{self.data_file}.{n}'
+
+    def journal_segment(self, n):
+        return self.journal_file if n == 0 else f'{self.journal_file}.{n}'
+
+    def load(self, default):
+        generations = [n for n in range(SNAPSHOT_GENERATIONS + 1) if os.path.exists(self.generation_file(n))]
+        if not generations:
+            self.data = default
+            self.replay_journal(0)
+            return self.data
+        for n in generations:
+            path = self.generation_file(n)
+            try:
+                self.data = read_snapshot(path)
+            except (OSError, ValueError) as e:
+                logger.error("snapshot %s خراب است: %s", path, e)
+                if n == 0:
+                    self.quarantine(path)
+                continue
+            for k in range(n, -1, -1):
+                if not self.replay_journal(k, chained=k < n):
+                    break
+            if n:
+                logger.warning("داده‌ها از نسل %d (%s) بازیابی شد", n, path)
+                self.compact()
+            return self.data
+        raise RuntimeError(f"هیچ snapshot سالمی برای {self.data_file} پیدا نشد؛ برای جلوگیری از پاک شدن "
+                           f"داده‌ها برنامه متوقف شد")
+
+    def quarantine(self, path):
+        """فایل خراب کنار گذاشته می‌شود (نه حذف) تا بعداً قابل بررسی باشد"""
+        target = f"{path}.corrupt-{time.strftime('%Y%m%d_%H%M%S')}"
+        os.replace(path, target)
+        logger.error("فایل خراب به %s منتقل شد", target)
+
+    def replay_journal(self, n=0, chained=False):
+        """اعمال دوباره‌ی رکوردهای ژورنال روی snapshot؛ False اگر زنجیره‌ی نسل‌ها از اینجا قطع باشد"""
+        path = self.journal_segment(n)
+        if n == 0:
+            self.journal_size = 0
+        if not os.path.exists(path):
+            return True
+        # شناسه‌های موجود برای اینکه رکوردهای ادغام‌شده دوباره اضافه نشوند
+        seen = {}
+        count = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # آخرین خط ممکن است هنگام کرش نیمه‌کاره نوشته شده باشد
+                    logger.warning("ژورنال %s از خط %d به بعد خراب است", path, count + 1)
+                    break
+                count += 1
+                if op['op'] == 'base':
+                    # snapshot این ژورنال با replace (بازیابی / پاک کردن) ساخته شده، نه از نسل قبلی
+                    if chained:
+                        logger.warning("ژورنال %s روی داده‌ی جایگزین‌شده است؛ بازیابی تا همین نسل", path)
+                        return False
+                    continue
+                if op['op'] == 'add':
+                    c = op['c']
+                    if c not in seen:
+                        seen[c] = {r.get('id') for r in self.data[c]}
+                    if op['r'].get('id') in seen[c]:
+                        continue
+                    seen[c].add(op['r'].get('id'))
+                apply_op(self.data, op)
+        if n == 0:
+            self.journal_size = count
+        return True
+
+    def append(self, op):
+        self.pending.append(json.dumps(op, ensure_ascii=False, separators=(',', ':'), default=to_json) + '\n')
+
+    def write(self, batch, sync=False, generation=None):
+        """نوشتن یک دسته تغییر در انتهای ژورنال؛ با sync=True حتماً fsync می‌شود"""
+        with self.io_lock:
+            if self.stale(generation):
+                # این تغییرات در snapshot بعدی آمده‌اند
+                batch = []
+            if not batch and not (sync and self.journal):
+                return
+            if self.journal is None:
+                self.journal = open(self.journal_file, 'a', encoding='utf-8')
+            self.journal.write(''.join(batch))
+            self.journal.flush()
+            self.journal_size += len(batch)
+            self.unsynced += len(batch)
+            # fsync دسته‌ای: تا fsync بعدی داده فقط در برابر قطع برق آسیب‌پذیر است
+            now = time.monotonic()
+            if sync or self.unsynced >= JOURNAL_FSYNC_EVERY or now - self.last_sync >= JOURNAL_FSYNC_INTERVAL:
+                os.fsync(self.journal.fileno())
+                self.unsynced = 0
+                self.last_sync = now
+            if self.journal_size >= JOURNAL_COMPACT_EVERY:
+                self.compact()
+
+    def snapshot(self):
+        """کپی سطحی داده‌ها زیر lock تا نوشتن snapshot با تغییرات thread اصلی تداخل نکند"""
+        with self.lock:
+            return {k: [dict(r) for r in v] if k in COLLECTIONS else v for k, v in self.data.items()}
+
+    def compact(self):
+        """نوشتن snapshot جدید (فایل موقت + fsync + rename) و بردن snapshot و ژورنال قبلی به نسل بعد.
+
+        تغییراتی که هنوز در pending یا صف writer هستند بعداً در ژورنال جدید نوشته می‌شوند؛
+        اجرای دوباره‌ی آن‌ها روی snapshot همان نتیجه را می‌دهد.
+        """
+        with self.io_lock:
+            raw = encode_snapshot(self.snapshot(), self.format)
+            tmp = self.data_file + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            self.rotate()
+            os.replace(tmp, self.data_file)
+            fsync_dir(self.data_file)
+            self.journal_size = 0
+            self.unsynced = 0
+
+    def rotate(self):
+        """هر نسل (snapshot + ژورنالش) یک شماره عقب می‌رود و قدیمی‌ترین نسل حذف می‌شود"""
+        for n in range(SNAPSHOT_GENERATIONS, 0, -1):
+            for name in (self.generation_file, self.journal_segment):
+                source, target = name(n - 1), name(n)
+                if os.path.exists(source):
+                    os.replace(source, target)
+                elif os.path.exists(target):
+                    os.remove(target)
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def replace(self, data):
+        with self.io_lock:
+            with self.lock:
+                # تغییرات داده‌ی قبلی که هنوز نوشته نشده‌اند دیگر معتبر نیستند
+                self.generation += 1
+                self.pending = []
+                self.data = data
+            self.compact()
+            self.write([json.dumps({'op': 'base'}) + '\n'], sync=True)
+
+    def close(self):
+        self.commit(sync=True)
+        with self.io_lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+
+
+# ==================== ذخیره‌سازی SQLite ====================
+
+# ستون‌هایی که جدا از بدنه‌ی JSON نگه داشته می‌شوند و ایندکس دارند
+COLUMNS = ['id', 'purchase_id', 'sale_id', 'date', 'sold']
+INDEXES = {
+    'purchases': ['id', 'date', 'sold'],
+    'sales': ['id', 'purchase_id', 'date'],
+    'costs': ['id', 'date'],
+    'transactions': ['id', 'date'],
+    'debt_payments': ['id', 'sale_id', 'date'],
+    'purchase_debt_payments': ['id', 'purchase_id', 'date'],
+    'partner_transactions': ['id', 'date'],
+}
+
+
+class SqliteStorage(StorageBase):
+    def __init__(self, db_file='accounting_data.db'):
+        super().__init__()
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # بازه‌ی ترتیب رکوردها؛ رکوردهای front قبل از همه قرار می‌گیرند
+        self.seq_low = {}
+        self.seq_high = {}
+        self.create_tables()
+
+    def create_tables(self):
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            for c in COLLECTIONS:
+                self.conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {c} (seq INTEGER NOT NULL, id INTEGER, purchase_id INTEGER, '
+                    f'sale_id INTEGER, date TEXT, sold INTEGER, body TEXT NOT NULL)')
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{c}_seq ON {c}(seq)')
+                for col in INDEXES[c]:
+                    self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{c}_{col} ON {c}({col})')
+
+    def load(self, default):
+        data = default
+        for key, value in self.conn.execute('SELECT key, value FROM meta'):
+            data[key] = json.loads(value)
+        for c in COLLECTIONS:
+            data[c] = [json.loads(body) for (body,) in self.conn.execute(f'SELECT body FROM {c} ORDER BY seq')]
+            low, high = self.conn.execute(f'SELECT MIN(seq), MAX(seq) FROM {c}').fetchone()
+            self.seq_low[c] = low if low is not None else 0
+            self.seq_high[c] = high if high is not None else 0
+        return data
+
+    @staticmethod
+    def row(record):
+        sold = record.get('sold')
+        return (record.get('id'), record.get('purchase_id'), record.get('sale_id'), record.get('date'),
+                None if sold is None else int(bool(sold)),
+                json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=to_json))
+
+    def append(self, op):
+        # رکورد همین حالا سریال می‌شود تا تغییرات بعدی در حافظه روی آن اثر نگذارد
+        if op['op'] == 'add':
+            op = dict(op, row=self.row(op['r']))
+        self.pending.append(op)
+
+    def write(self, batch, sync=False, generation=None):
+        """اجرای یک دسته تغییر در یک تراکنش؛ با sync=True چک‌پوینت WAL هم انجام می‌شود"""
+        with self.io_lock:
+            if self.stale(generation):
+                batch = []
+            with self.conn:
+                for op in batch:
+                    self.execute(op)
+            if sync:
+                self.conn.execute('PRAGMA wal_checkpoint(FULL)')
+
+    def execute(self, op):
+        kind = op['op']
+        if kind == 'add':
+            c = op['c']
+            if op.get('front'):
+                self.seq_low[c] -= 1
+                seq = self.seq_low[c]
+            else:
+                self.seq_high[c] += 1
+                seq = self.seq_high[c]
+            self.conn.execute(f'INSERT INTO {c} (seq, id, purchase_id, sale_id, date, sold, body) '
+                              f'VALUES (?, ?, ?, ?, ?, ?, ?)', (seq,) + op['row'])
+        elif kind == 'set':
+            c = op['c']
+            found = self.conn.execute(f'SELECT rowid, body FROM {c} WHERE id = ? ORDER BY seq LIMIT 1',
+                                      (op['id'],)).fetchone()
+            if found:
+                record = json.loads(found[1])
+                record.update(op['f'])
+                self.conn.execute(f'UPDATE {c} SET id = ?, purchase_id = ?, sale_id = ?, date = ?, sold = ?, '
+                                  f'body = ? WHERE rowid = ?', self.row(record) + (found[0],))
+        elif kind == 'del':
+            where, params = [], []
+            for k, v in op['m'].items():
+                where.append(f'{k} = ?' if k in COLUMNS else f"json_extract(body, '$.{k}') = ?")
+                params.append(v)
+            self.conn.execute(f"DELETE FROM {op['c']} WHERE {' AND '.join(where)}", params)
+        elif kind == 'put':
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                              (op['k'], json.dumps(op['v'], ensure_ascii=False)))
+        else:
+            raise ValueError(f"عملیات ناشناخته: {kind}")
+
+    def replace(self, data):
+        with self.io_lock:
+            with self.lock:
+                self.generation += 1
+                self.pending = []
+            self.write_all(data)
+
+    def write_all(self, data):
+        with self.conn:
+            self.conn.execute('DELETE FROM meta')
+            for key, value in data.items():
+                if key not in COLLECTIONS:
+                    self.conn.execute('INSERT INTO meta (key, value) VALUES (?, ?)',
+                                      (key, json.dumps(value, ensure_ascii=False)))
+            for c in COLLECTIONS:
+                self.conn.execute(f'DELETE FROM {c}')
+                records = data.get(c, [])
+                self.conn.executemany(
+                    f'INSERT INTO {c} (seq, id, purchase_id, sale_id, date, sold, body) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    ((i,) + self.row(r) for i, r in enumerate(records, 1)))
+                self.seq_low[c] = 1 if records else 0
+                self.seq_high[c] = len(records)
+
+    def close(self):
+        self.commit()
+        with self.io_lock:
+            self.conn.close()
+
+
+def open_storage():
+    """انتخاب backend بر اساس متغیر محیطی STORAGE_BACKEND (json یا sqlite)"""
+    backend = os.environ.get('STORAGE_BACKEND', 'json')
+    if backend == 'sqlite':
+        return SqliteStorage(os.environ.get('DATABASE_FILE', 'accounting_data.db'))
+    return JsonStorage(os.environ.get('DATA_FILE', 'accounting_data.json'), SNAPSHOT_FORMAT)
+
+
+def migrate_json_to_sqlite(json_file='accounting_data.json', db_file='accounting_data.db'):
+    """انتقال یک‌باره‌ی داده‌های فایل JSON (به همراه ژورنال) به SQLite"""
+    source = JsonStorage(json_file)
+    data = source.load({'initial_capital': 0, **{c: [] for c in COLLECTIONS}})
+    for c in COLLECTIONS:
+        data.setdefault(c, [])
+    target = SqliteStorage(db_file)
+    target.replace(data)
+    target.close()
+    return {c: len(data[c]) for c in COLLECTIONS}
+
+
+def export_json(data_file='accounting_data.json', json_file='accounting_export.json'):
+    """خروجی JSON خوانا از داده‌ها (snapshot با هر قالب + ژورنال)"""
+    data = JsonStorage(data_file).load({'initial_capital': 0, **{c: [] for c in COLLECTIONS}})
+    with open(json_file, 'wb') as f:
+        f.write(json.dumps(data, ensure_ascii=False, indent=2, default=to_json).encode('utf-8'))
+    return {c: len(data.get(c, [])) for c in COLLECTIONS}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] in ('migrate', 'export'):
+        run = migrate_json_to_sqlite if sys.argv[1] == 'migrate' else export_json
+        counts = run(*sys.argv[2:4])
+        for c, n in counts.items():
+            print(f"✅ {c}: {n}")
+    else:
+        print("استفاده: python storage.py migrate [accounting_data.json] [accounting_data.db]\n"
+              "       python storage.py export [accounting_data.json] [accounting_export.json]")
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# نظارت بر ربات داخل پروسه‌ی Flask (app.py):
+#   Heartbeat: کانالی که event loop ربات هر HEARTBEAT_INTERVAL ثانیه در آن می‌نویسد (تأخیر loop، صف، آخرین update)
+#   Supervisor: اگر thread ربات از کار بیفتد (مثلاً setWebhook در شروع خطا بدهد) آن را با backoff دوباره راه می‌اندازد.
+# اگر loop گیر کند heartbeat کهنه می‌شود و /health کد 503 برمی‌گرداند تا health check سرویس (Render) پروسه را
+# دوباره راه بیندازد؛ یک loop گیرکرده را نمی‌شود از داخل همان پروسه با خیال راحت کنار گذاشت.
+
+HEARTBEAT_INTERVAL = float(os.environ.get('HEARTBEAT_INTERVAL', '1'))
+HEARTBEAT_TIMEOUT = float(os.environ.get('HEARTBEAT_TIMEOUT', '30'))  # بدون heartbeat بیشتر از این یعنی ناسالم
+RESTART_BACKOFF = (1, 60)  # اولین و بیشترین فاصله‌ی راه‌اندازی دوباره (ثانیه)
+STABLE_AFTER = 60  # ربات اگر این مدت سالم بماند شمارش شکست‌های پشت سر هم صفر می‌شود
+
+
+class Heartbeat:
+    """وضعیتی که worker (event loop ربات) می‌نویسد و supervisor و /health و /metrics می‌خوانند"""
+
+    def __init__(self):
+        self.beat = None
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.queue_depth = 0
+        self.tasks = 0
+        self.last_update = None
+        self.updates = 0
+        self.errors = 0
+
+    async def run(self, application, interval=HEARTBEAT_INTERVAL):
+        """حلقه‌ی heartbeat در event loop ربات؛ دیر بیدار شدن sleep همان تأخیر loop است"""
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self.lag = max(0.0, now - start - interval)
+            self.max_lag = max(self.max_lag, self.lag)
+            instrumentation.metrics.observe('loop_lag', 'bot', self.lag)
+            self.queue_depth = application.update_queue.qsize()
+            self.tasks = len(asyncio.all_tasks())
+            self.beat = now
+
+    async def seen(self, update, context):
+        """هندلر گروه -1: قبل از هندلرهای اصلی برای هر update اجرا می‌شود"""
+        self.last_update = time.monotonic()
+        self.updates += 1
+
+    async def error(self, update, context):
+        """خطاهای هندلرها شمرده و با traceback لاگ می‌شوند"""
+        self.errors += 1
+        logger.error("خطا در پردازش update", exc_info=context.error)
+
+    def age(self, moment):
+        return None if moment is None else time.monotonic() - moment
+
+
+class Supervisor:
+    """راه‌اندازی و نگه داشتن worker ربات؛ factory(heartbeat) یک runner تازه با start/stop/thread/ready می‌سازد"""
+
+    def __init__(self, factory, timeout=HEARTBEAT_TIMEOUT, backoff=RESTART_BACKOFF):
+        self.factory = factory
+        self.timeout = timeout
+        self.backoff = backoff
+        self.heartbeat = Heartbeat()
+        self.runner = None
+        self.restarts = 0
+        self.started = time.monotonic()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='supervisor', daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        failures = 0
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            self.runner = self.factory(self.heartbeat).start()
+            while self.runner.thread.is_alive() and not self.stopping.wait(1):
+                pass
+            if self.stopping.is_set():
+                return
+            failures = 1 if time.monotonic() - started > STABLE_AFTER else failures + 1
+            delay = min(self.backoff[1], self.backoff[0] * 2 ** (failures - 1))
+            self.restarts += 1
+            logger.error("ربات متوقف شد؛ راه‌اندازی دوباره بعد از %s ثانیه (بار %s)", delay, self.restarts)
+            print(f"⚠️ ربات متوقف شد؛ راه‌اندازی دوباره بعد از {delay} ثانیه")
+            self.stopping.wait(delay)
+
+    @property
+    def ready(self):
+        return self.runner is not None and self.runner.ready.is_set()
+
+    def stop(self):
+        self.stopping.set()
+        if self.runner is not None:
+            self.runner.stop()
+
+    def status(self, writer=None):
+        """وضعیت worker برای /health و /metrics؛ writer همان StorageWriter ربات (یا None)"""
+        hb = self.heartbeat
+        beat_age = hb.age(hb.beat) if self.ready else None
+        status = {
+            'worker_up': self.ready,
+            'heartbeat_age': beat_age,
+            'last_update_age': hb.age(hb.last_update),
+            'loop_lag': hb.lag,
+            'loop_lag_max': hb.max_lag,
+            'queue_depth': hb.queue_depth,
+            'tasks': hb.tasks,
+            'updates': hb.updates,
+            'handler_errors': hb.errors,
+            'restarts': self.restarts,
+            'uptime': time.monotonic() - self.started,
+            'writer_up': writer is not None and writer.thread is not None and writer.thread.is_alive(),
+            'writer_queue_depth': writer.depth() if writer is not None else 0,
+            'write_errors': writer.stats['errors'] if writer is not None else 0,
+            'writes': writer.stats['writes'] if writer is not None else 0,
+        }
+        problems = []
+        if not status['worker_up']:
+            problems.append('worker down')
+        elif beat_age is None or beat_age > self.timeout:
+            problems.append('heartbeat stale')
+        if status['worker_up'] and not status['writer_up']:
+            problems.append('storage writer down')
+        status['problems'] = problems
+        status['healthy'] = not problems
+        return status
+
+
+# نام، نوع و توضیح هر metric (قالب متنی Prometheus)
+METRICS = [
+    ('hesabdari_worker_up', 'gauge', 'worker_up', 'ربات آماده‌ی پردازش update است'),
+    ('hesabdari_worker_healthy', 'gauge', 'healthy', 'نتیجه‌ی /health'),
+    ('hesabdari_worker_restarts_total', 'counter', 'restarts', 'تعداد راه‌اندازی دوباره‌ی ربات'),
+    ('hesabdari_heartbeat_age_seconds', 'gauge', 'heartbeat_age', 'فاصله از آخرین heartbeat event loop'),
+    ('hesabdari_last_update_age_seconds', 'gauge', 'last_update_age', 'فاصله از آخرین update پردازش‌شده'),
+    ('hesabdari_event_loop_lag_seconds', 'gauge', 'loop_lag', 'تأخیر event loop در آخرین heartbeat'),
+    ('hesabdari_event_loop_lag_max_seconds', 'gauge', 'loop_lag_max', 'بیشترین تأخیر event loop'),
+    ('hesabdari_update_queue_depth', 'gauge', 'queue_depth', 'updateهای منتظر در صف Application'),
+    ('hesabdari_event_loop_tasks', 'gauge', 'tasks', 'taskهای زنده‌ی event loop'),
+    ('hesabdari_updates_total', 'counter', 'updates', 'updateهای پردازش‌شده'),
+    ('hesabdari_handler_errors_total', 'counter', 'handler_errors', 'خطاهای هندلرها'),
+    ('hesabdari_uptime_seconds', 'gauge', 'uptime', 'عمر پروسه'),
+    ('hesabdari_storage_writer_up', 'gauge', 'writer_up', 'thread نویسنده‌ی storage زنده است'),
+    ('hesabdari_storage_writer_queue_depth', 'gauge', 'writer_queue_depth', 'دسته‌های منتظر نوشتن روی دیسک'),
+    ('hesabdari_storage_writes_total', 'counter', 'writes', 'نوشتن‌های storage'),
+    ('hesabdari_storage_write_errors_total', 'counter', 'write_errors', 'خطاهای نوشتن storage'),
+]
+
+
+def render_metrics(status):
+    """status به قالب متنی Prometheus؛ مقدارهای نامعلوم (None) نوشته نمی‌شوند"""
+    lines = []
+    for name, kind, key, help_text in METRICS:
+        value = status.get(key)
+        if value is None:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {int(value) if isinstance(value, (bool, int)) else round(value, 6)}")
+    return '\n'.join(lines) + '\n'
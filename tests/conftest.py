@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# ماژول‌های ربات در ریشه‌ی مخزن هستند
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# اگر آزمونی main را import کند، داده‌ها در پوشه‌ی موقت نوشته می‌شوند نه کنار کد
+WORKDIR = tempfile.mkdtemp(prefix='hesabdari_tests_')
+os.environ.setdefault('DATA_FILE', os.path.join(WORKDIR, 'accounting_data.json'))
+os.environ.setdefault('DATABASE_FILE', os.path.join(WORKDIR, 'accounting_data.db'))
+os.environ.setdefault('BACKUP_MANIFEST', os.path.join(WORKDIR, 'backup_manifest.json'))
+os.environ.setdefault('COLD_FILE', os.path.join(WORKDIR, 'accounting_data.cold'))
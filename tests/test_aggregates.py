@@ -0,0 +1,108 @@
+import pytest
+
+import main
+from benchmarks.synthetic import make_ledger
+from storage import JsonStorage
+
+
+@pytest.fixture
+def bot(tmp_path):
+    bot = main.AccountingBot(JsonStorage(str(tmp_path / 'data.json')))
+    bot.reset(make_ledger(120, seed=3))
+    return bot
+
+
+def recompute(bot):
+    return {
+        'balance': bot.calculate_balance(),
+        'inventory': bot.calculate_inventory(),
+        'total_profit': bot.calculate_total_profit(),
+        'total_costs': bot.calculate_total_costs(),
+        'remaining_debts': bot.calculate_remaining_debts(),
+        'partner_balances': bot.calculate_partner_balances(),
+    }
+
+
+def live(bot):
+    agg = bot.aggregates
+    return {
+        'balance': agg.balance(),
+        'inventory': agg.inventory(),
+        'total_profit': agg.total_profit(),
+        'total_costs': agg.total_costs(),
+        'remaining_debts': agg.remaining_debts(),
+        'partner_balances': agg.partner_balances(),
+    }
+
+
+def check(bot):
+    assert bot.verify_payment_totals() == []
+    assert bot.verify_aggregates() == {}
+    assert live(bot) == recompute(bot)
+    assert bot.aggregates.consistency() == bot.calculate_consistency()
+
+
+def test_after_rebuild(bot):
+    check(bot)
+
+
+def test_add_update_remove(bot):
+    # خرید نسیه، فروش نسیه و پرداخت‌های هر دو
+    purchase = bot.add('purchases', {'id': 1, 'date': '2026/01/01', 'model': 'A', 'buy_price': 900,
+                                     'total_cost': 1000, 'purchase_debt': 400, 'remaining_debt': 400,
+                                     'cash_paid': 600, 'sold': False})
+    check(bot)
+    bot.add('purchase_debt_payments', {'id': 2, 'purchase_id': 1, 'date': '2026/01/02', 'amount': 150})
+    bot.update('purchases', 1, {'sold': True})
+    sale = bot.add('sales', {'id': 3, 'date': '2026/01/03', 'purchase_id': 1, 'model': 'A',
+                             'purchase_price': 1000, 'sell_price': 1500, 'debt': 500, 'remaining_debt': 500,
+                             'profit': 500, 'cash_received': 1000})
+    bot.add('debt_payments', {'id': 4, 'sale_id': 3, 'date': '2026/01/04', 'amount': 200})
+    bot.add('debt_payments', {'id': 5, 'sale_id': 3, 'date': '2026/01/05', 'amount': 100})
+    check(bot)
+    assert bot.get_total_sale_payments(sale['id']) == 300
+    assert bot.get_total_purchase_payments(purchase['id']) == 150
+
+    bot.add('costs', {'id': 6, 'date': '2026/01/06', 'title': 'پیک', 'amount': 70})
+    bot.add('partner_transactions', {'id': 7, 'partner': 'reza', 'type': 'cash_withdraw', 'amount': 40,
+                                     'date': '2026/01/07', 'description': 'برداشت'})
+    bot.add('partner_transactions', {'id': 8, 'partner': 'milad', 'type': 'personal_expense', 'amount': 30,
+                                     'date': '2026/01/07', 'description': 'هزینه'})
+    bot.set_value('initial_capital', bot.data['initial_capital'] + 5000)
+    check(bot)
+
+    # ویرایش مبلغ‌ها و برگشت فروش
+    bot.update('costs', 6, {'amount': 90})
+    bot.update('sales', 3, {'remaining_debt': 250})
+    bot.remove('debt_payments', id=5)
+    bot.remove('partner_transactions', id=7)
+    check(bot)
+    assert bot.get_total_sale_payments(3) == 200
+
+    bot.remove('debt_payments', sale_id=3)
+    bot.remove('sales', id=3)
+    bot.update('purchases', 1, {'sold': False})
+    bot.remove('purchase_debt_payments', purchase_id=1)
+    check(bot)
+    assert bot.payments.sales.get(3) is None
+    assert bot.payments.purchases.get(1) is None
+
+    # تغییر روی داده‌های موجود
+    old = bot.data['sales'][0]
+    bot.update('sales', old['id'], {'profit': old['profit'] + 1000, 'cash_received': old['cash_received'] + 1000})
+    bot.remove('costs', id=bot.data['costs'][0]['id'])
+    check(bot)
+
+
+def test_verify_detects_drift(bot):
+    payment = bot.data['debt_payments'][0]
+    bot.payments.sales[payment['sale_id']] += 1
+    assert bot.verify_payment_totals() == [
+        ('sales', payment['sale_id'], bot.payments.sales[payment['sale_id']], bot.payments.sales[payment['sale_id']] - 1)]
+
+    # تغییر مستقیم داده بدون خبر دادن به observerها
+    bot.data['costs'][0]['amount'] += 10
+    mismatches = bot.verify_aggregates()
+    assert 'total_costs' in mismatches and 'balance' in mismatches
+    live_costs, expected_costs = mismatches['total_costs']
+    assert expected_costs == live_costs + 10
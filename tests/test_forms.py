@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+import main
+from benchmarks.harness import Harness
+from forms import Form, FormEngine, Step, parse_amount
+from storage import JsonStorage
+
+
+@pytest.mark.parametrize('text, amount', [
+    ('1500000', 1500000),
+    ('۱۵۰۰۰۰۰', 1500000),
+    ('١٥٠٠٠٠٠', 1500000),
+    ('۱,۵۰۰,۰۰۰', 1500000),
+    ('۱٬۵۰۰٬۰۰۰', 1500000),
+    ('۱،۵۰۰،۰۰۰', 1500000),
+    (' 1 500 000 ', 1500000),
+    ('-۲۰۰', -200),
+    ('۰', 0),
+])
+def test_parse_amount(text, amount):
+    assert parse_amount(text) == amount
+
+
+@pytest.mark.parametrize('text', ['', 'abc', '۱۲الف', '1.5', '-'])
+def test_parse_amount_rejects(text):
+    with pytest.raises(ValueError):
+        parse_amount(text)
+
+
+class Message:
+    def __init__(self, text, replies):
+        self.text = text
+        self.replies = replies
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class Update:
+    def __init__(self, text, replies):
+        self.message = Message(text, replies)
+
+
+class Context:
+    def __init__(self):
+        self.user_data = {}
+
+
+def engine(done):
+    async def complete(update, context):
+        done.append(dict(context.user_data))
+
+    def positive(value, user_data):
+        return "❌ مبلغ باید مثبت باشد." if value <= 0 else None
+
+    forms = FormEngine()
+    forms.register(Form('cost', [
+        Step('title', 'title', "عنوان:"),
+        Step('amount', 'amount', "مبلغ:", parse_amount, positive),
+        Step('note', 'note', "توضیحات:", keep=True),
+    ], complete, cancel_on_dash=True))
+    return forms
+
+
+def run(forms, context, *texts):
+    replies = []
+    for text in texts:
+        asyncio.run(forms.handle(Update(text, replies), context))
+    return replies
+
+
+def test_form_steps_and_errors():
+    done = []
+    forms, context = engine(done), Context()
+    forms.begin(context.user_data, 'cost', extra=1)
+    replies = run(forms, context, 'اجاره', 'ده', '۰', '۱۲۰٬۰۰۰', '-')
+    assert replies == ["مبلغ:", "❌ عدد معتبر وارد کن.", "❌ مبلغ باید مثبت باشد.", "توضیحات:"]
+    assert done == [{'action': 'cost', 'step': 'note', 'extra': 1, 'title': 'اجاره', 'amount': 120000}]
+
+
+@pytest.mark.parametrize('word', ['لغو', 'انصراف', 'cancel', ' CANCEL '])
+def test_cancel_words_in_any_step(word):
+    done = []
+    forms, context = engine(done), Context()
+    forms.begin(context.user_data, 'cost')
+    replies = run(forms, context, 'اجاره', word)
+    assert replies[-1] == "❌ لغو شد."
+    assert context.user_data == {} and done == []
+
+
+def test_dash_cancels_only_first_step():
+    done = []
+    forms, context = engine(done), Context()
+    forms.begin(context.user_data, 'cost')
+    assert run(forms, context, '-') == ["❌ لغو شد."]
+    forms.begin(context.user_data, 'cost')
+    assert run(forms, context, 'اجاره', '-') == ["مبلغ:", "❌ عدد معتبر وارد کن."]
+
+
+def test_messages_outside_forms_are_not_handled():
+    forms, context = engine([]), Context()
+    assert asyncio.run(forms.handle(Update('سلام', []), context)) is False
+    context.user_data['action'] = 'unknown'
+    assert asyncio.run(forms.handle(Update('سلام', []), context)) is False
+
+
+def test_new_cost_form_with_persian_digits(tmp_path, monkeypatch):
+    bot = main.AccountingBot(JsonStorage(str(tmp_path / 'data.json')))
+    monkeypatch.setattr(main, 'bot_accounting', bot)
+    harness = Harness(main)
+
+    async def scenario():
+        await harness.click('new_cost')
+        await harness.send('پیک')
+        await harness.send('۲۵۰٬۰۰۰')
+        await harness.send('-')
+
+    asyncio.run(scenario())
+    assert [(c['title'], c['amount']) for c in bot.data['costs']] == [('پیک', 250000)]
+    assert harness.context.user_data.get('action') is None
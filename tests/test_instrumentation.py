@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from telegram.ext import CommandHandler, MessageHandler, filters
+
+import instrumentation
+from instrumentation import WINDOW, Metrics, Series, route_label, timed
+
+
+class Context:
+    def __init__(self, **user_data):
+        self.user_data = user_data
+
+
+def test_quantiles():
+    series = Series()
+    assert series.quantiles() == [0.0, 0.0, 0.0]
+    for value in range(100, 0, -1):
+        series.add(value)
+    assert series.quantiles() == [51, 96, 100]
+    single = Series()
+    single.add(7)
+    assert single.quantiles() == [7, 7, 7]
+
+
+def test_window_keeps_totals():
+    series = Series()
+    for value in range(WINDOW * 2):
+        series.add(value)
+    assert series.count == WINDOW * 2
+    assert series.total == sum(range(WINDOW * 2))
+    assert series.worst == WINDOW * 2 - 1
+    # صدک‌ها فقط از WINDOW نمونه‌ی آخر
+    assert series.quantiles()[0] == WINDOW + WINDOW // 2
+
+
+def test_summary_and_render():
+    metrics = Metrics()
+    for _ in range(10):
+        metrics.observe('handler', 'fast', 0.001)
+        metrics.observe('handler', 'slow "x"', 0.5)
+    metrics.observe('storage', 'write', 0.25)
+    assert [row[0] for row in metrics.summary('handler')] == ['slow "x"', 'fast']
+    assert metrics.summary('handler')[1] == ('fast', 10, 0.001, 0.001, 0.001, 0.001)
+
+    text = metrics.render()
+    assert '# TYPE hesabdari_handler_seconds summary\n' in text
+    assert 'hesabdari_handler_seconds{route="slow \\"x\\"",quantile="0.95"} 0.5\n' in text
+    assert 'hesabdari_handler_seconds_sum{route="fast"} 0.01\n' in text
+    assert 'hesabdari_handler_seconds_count{route="fast"} 10\n' in text
+    assert 'hesabdari_storage_seconds_count{operation="write"} 1\n' in text
+    # خانواده‌ی بدون نمونه نوشته نمی‌شود
+    assert 'telegram_api' not in text
+
+    metrics.reset()
+    assert metrics.render() == ''
+
+
+def test_stats_text(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(instrumentation, 'metrics', metrics)
+    metrics.observe('handler', '/start', 0.0125)
+    metrics.observe('loop_lag', 'bot', 0.002)
+    text = instrumentation.stats_text()
+    assert "`/start` ×1: 12.5 / 12.5 / 12.5 / 12.5\n" in text
+    assert "🔁 **تأخیر event loop**" in text
+    assert "📡" not in text
+
+
+def test_route_labels():
+    async def callback(update, context):
+        pass
+
+    command = route_label(CommandHandler(['start', 'begin'], callback))
+    assert command(None, Context()) == '/begin'
+    message = route_label(MessageHandler(filters.TEXT, callback))
+    assert message(None, Context()) == 'message:None'
+    assert message(None, Context(action='new_cost', step='waiting_cost_amount')) == \
+           'message:new_cost.waiting_cost_amount'
+
+
+def test_timed_records_failures(monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(instrumentation, 'metrics', metrics)
+
+    async def failing(update, context):
+        context.user_data['action'] = 'changed'
+        raise ValueError
+
+    wrapper = timed(failing, lambda update, context: context.user_data.get('action'))
+    assert wrapper.__wrapped__ is failing
+    with pytest.raises(ValueError):
+        asyncio.run(wrapper(None, Context(action='before')))
+    # برچسب قبل از اجرای هندلر ساخته می‌شود
+    assert [row[:2] for row in metrics.summary('handler')] == [('before', 1)]
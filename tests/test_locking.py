@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+import main
+from locking import ConflictError, EntityLocks, VersionTracker
+from storage import JsonStorage
+
+
+@pytest.fixture
+def bot(tmp_path):
+    bot = main.AccountingBot(JsonStorage(str(tmp_path / 'data.json')))
+    bot.add('costs', {'id': 1, 'date': '2026/01/01', 'title': 'اجاره', 'amount': 100})
+    return bot
+
+
+def test_versions():
+    tracker = VersionTracker()
+    tracker.rebuild({})
+    floor = tracker.version('costs', 1)
+    tracker.added('costs', {'id': 1})
+    first = tracker.version('costs', 1)
+    assert first > floor
+    tracker.removed('costs', {'id': 1})
+    assert tracker.version('costs', 1) > first
+    assert tracker.version('costs', 2) == floor
+    # بعد از بازیابی نسخه‌های قبلی دیگر معتبر نیستند
+    tracker.rebuild({})
+    assert tracker.version('costs', 2) > floor
+
+
+def test_require_stale_version(bot):
+    async def run():
+        version = bot.version('costs', 1)
+        async with bot.transaction(('costs', 1)) as tx:
+            assert tx.require('costs', 1, version)['amount'] == 100
+        bot.update('costs', 1, {'amount': 200})
+        async with bot.transaction(('costs', 1)) as tx:
+            with pytest.raises(ConflictError):
+                tx.require('costs', 1, version)
+            assert tx.require('costs', 1, bot.version('costs', 1))['amount'] == 200
+            assert tx.require('costs', 1)['amount'] == 200
+        bot.remove('costs', id=1)
+        async with bot.transaction(('costs', 1)) as tx:
+            with pytest.raises(ConflictError):
+                tx.require('costs', 1)
+
+    asyncio.run(run())
+    assert bot.locks.locks == {}
+
+
+def test_reset_invalidates_versions(bot):
+    version = bot.version('costs', 1)
+    bot.reset(bot.data)
+
+    async def run():
+        async with bot.transaction(('costs', 1)) as tx:
+            tx.require('costs', 1, version)
+
+    with pytest.raises(ConflictError):
+        asyncio.run(run())
+
+
+def test_locks_serialize_and_clean_up():
+    locks = EntityLocks()
+    order = []
+
+    async def worker(name, keys):
+        held = await locks.acquire(keys)
+        try:
+            order.append((name, 'in'))
+            await asyncio.sleep(0.01)
+            order.append((name, 'out'))
+        finally:
+            locks.release(held)
+
+    async def run():
+        # ترتیب متفاوت کلیدها نباید به بن‌بست برسد
+        await asyncio.gather(worker('a', [('sales', 1), ('purchases', 1)]),
+                             worker('b', [('purchases', 1), ('sales', 1)]),
+                             worker('c', [('costs', 9)]))
+
+    asyncio.run(asyncio.wait_for(run(), 1))
+    a, b = order.index(('a', 'in')), order.index(('b', 'in'))
+    first, second = ('a', 'b') if a < b else ('b', 'a')
+    assert order.index((first, 'out')) < order.index((second, 'in'))
+    assert locks.locks == {}
+
+
+def test_cancelled_waiter_drops_refcount():
+    locks = EntityLocks()
+    key = ('sales', 1)
+
+    async def run():
+        held = await locks.acquire([key])
+        waiter = asyncio.create_task(locks.acquire([key, ('sales', 2)]))
+        await asyncio.sleep(0)
+        assert locks.locks[key][1] == 2
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert locks.locks[key][1] == 1
+        assert ('sales', 2) not in locks.locks
+        locks.release(held)
+
+    asyncio.run(run())
+    assert locks.locks == {}
+
+
+def test_failed_block_releases_without_saving(bot):
+    saved = []
+    bot.save_data = lambda: saved.append(True)
+
+    async def run():
+        async with bot.transaction(('costs', 1)):
+            raise ValueError
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+    assert saved == []
+    assert bot.locks.locks == {}
@@ -0,0 +1,88 @@
+import pytest
+
+import main
+from indexes import OrderedIndex
+from storage import COLLECTIONS, JsonStorage
+
+
+def purchase(pid, sold=False):
+    return {'id': pid, 'date': '2026/01/01', 'model': f"M{pid}", 'buy_price': pid, 'total_cost': pid, 'sold': sold}
+
+
+def ids(page):
+    return [r['id'] for r in page.records]
+
+
+@pytest.fixture
+def index():
+    index = OrderedIndex()
+    index.rebuild({'purchases': [purchase(i) for i in range(1, 26)]})
+    return index
+
+
+def test_walk_pages(index):
+    first = index.page('purchases')
+    assert ids(first) == list(range(25, 15, -1))
+    assert (first.number, first.total, first.older, first.newer, first.has_newer) == (1, 25, 16, None, False)
+
+    second = index.page('purchases', first.older)
+    assert ids(second) == list(range(15, 5, -1))
+    # صفحه‌ی جدیدتر همان صفحه‌ی اول است
+    assert (second.number, second.older, second.newer, second.has_newer) == (11, 6, None, True)
+
+    last = index.page('purchases', second.older)
+    assert ids(last) == [5, 4, 3, 2, 1]
+    assert (last.number, last.older, last.has_newer) == (21, None, True)
+    assert ids(index.page('purchases', last.newer)) == ids(second)
+
+
+def test_exact_multiple_and_past_the_end(index):
+    for pid in range(21, 26):
+        index.removed('purchases', index.records['purchases'][pid])
+    second = index.page('purchases', index.page('purchases').older)
+    assert ids(second) == list(range(10, 0, -1))
+    assert second.older is None
+    # cursor قدیمی‌تر از همه: صفحه‌ی خالی
+    empty = index.page('purchases', 1)
+    assert (ids(empty), empty.older, empty.has_newer) == ([], None, True)
+    assert ids(index.page('purchases', size=100)) == list(range(20, 0, -1))
+
+
+def test_empty_list():
+    index = OrderedIndex()
+    index.rebuild({})
+    page = index.page('sales')
+    assert (page.records, page.number, page.total, page.older, page.newer, page.has_newer) == \
+           ([], 1, 0, None, None, False)
+
+
+def test_deleted_cursor(index):
+    cursor = index.page('purchases').older
+    index.removed('purchases', index.records['purchases'][cursor])
+    page = index.page('purchases', cursor)
+    assert ids(page) == list(range(15, 5, -1))
+    assert page.total == 24
+
+
+def test_unsold_changes_between_pages(tmp_path):
+    bot = main.AccountingBot(JsonStorage(str(tmp_path / 'data.json')))
+    data = {'initial_capital': 0, **{c: [] for c in COLLECTIONS}}
+    data['purchases'] = [purchase(i, sold=i % 5 == 0) for i in range(1, 31)]
+    bot.reset(data)
+
+    first = bot.pages.page('unsold', size=5)
+    assert ids(first) == [29, 28, 27, 26, 24]
+    assert first.total == 24
+
+    # بین دو صفحه: یک فروش، یک خرید جدید، حذف و برگشت فروش
+    bot.update('purchases', 23, {'sold': True})
+    bot.add('purchases', purchase(40))
+    bot.remove('purchases', id=21)
+    bot.update('purchases', 20, {'sold': False})
+
+    second = bot.pages.page('unsold', first.older, size=5)
+    assert ids(second) == [22, 20, 19, 18, 17]
+    assert second.total == 24
+    assert second.has_newer
+    assert ids(bot.pages.page('unsold', size=5)) == [40, 29, 28, 27, 26]
+    assert all(not r['sold'] for r in second.records)
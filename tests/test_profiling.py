@@ -0,0 +1,91 @@
+import asyncio
+import os
+import tracemalloc
+
+import profiling
+
+
+class Handler:
+    def __init__(self, callback):
+        self.callback = callback
+
+
+class Application:
+    def __init__(self, *callbacks):
+        self.handlers = {0: [Handler(cb) for cb in callbacks]}
+
+
+class Ledger:
+    def __init__(self):
+        self.calls = 0
+
+    def work(self):
+        self.calls += 1
+        return sum(range(1000))
+
+
+class Bot:
+    def __init__(self):
+        self.documents = []
+
+    async def send_document(self, chat_id, document, filename=None, **kwargs):
+        self.documents.append((chat_id, filename, len(document.read())))
+
+
+class Context:
+    def __init__(self, bot):
+        self.bot = bot
+
+
+def test_session_profiles_updates_and_restores(tmp_path):
+    ledger = Ledger()
+
+    async def inner(update, context):
+        return ledger.work()
+
+    async def outer(update, context):
+        # فراخوانی تو در تو یک update جدا شمرده نمی‌شود
+        return await namespace['inner'](update, context)
+
+    namespace = {'outer': outer, 'inner': inner}
+    application = Application(outer)
+    session = profiling.start(application, namespace, ['outer', 'inner'], [(ledger, ['work'])], 2, [7])
+    assert session is not None
+    assert profiling.start(application, namespace, ['outer'], [], 1, []) is None
+    session.directory = str(tmp_path)
+    assert namespace['outer'] is not outer and profiling.unwrap(namespace['outer']) is outer
+    assert profiling.unwrap(application.handlers[0][0].callback) is outer
+    assert 'work' in vars(ledger)
+
+    bot = Bot()
+    context = Context(bot)
+    handler = application.handlers[0][0].callback
+    assert asyncio.run(handler(None, context)) == sum(range(1000))
+    assert session.done == 1 and not session.finished
+    asyncio.run(handler(None, context))
+
+    assert session.finished and session.done == 2
+    assert profiling.current is None
+    assert namespace == {'outer': outer, 'inner': inner}
+    assert application.handlers[0][0].callback is outer
+    assert 'work' not in vars(ledger) and ledger.calls == 2
+    assert not tracemalloc.is_tracing()
+    names = sorted(os.listdir(tmp_path))
+    assert [os.path.splitext(n)[1] for n in names] == ['.pstats', '.txt']
+    assert [(chat, name) for chat, name, _ in bot.documents] == [(7, n) for n in names]
+    report = (tmp_path / names[1]).read_text(encoding='utf-8')
+    assert 'profile: 2 updates' in report and 'work' in report
+
+
+def test_stop_early(tmp_path):
+    async def handler(update, context):
+        pass
+
+    namespace = {'handler': handler}
+    session = profiling.start(Application(handler), namespace, ['handler'], [], 100, [])
+    session.directory = str(tmp_path)
+    bot = Bot()
+    assert asyncio.run(profiling.stop(bot)) is session
+    assert namespace['handler'] is handler
+    assert asyncio.run(profiling.stop(bot)) is None
+    assert "(هیچ تابعی اجرا نشد)" in next(tmp_path.glob('*.txt')).read_text(encoding='utf-8')
@@ -0,0 +1,69 @@
+import copy
+import json
+
+import pytest
+
+from benchmarks.synthetic import make_ledger
+from records import ABSENT, TYPES, Cost, Purchase, Sale, convert, make, to_json
+
+
+def dumps(data):
+    return json.dumps(data, default=to_json, ensure_ascii=False, sort_keys=True)
+
+
+def test_convert_round_trip():
+    ledger = make_ledger(200)
+    source = copy.deepcopy(ledger)
+    data = convert(ledger)
+    for c, cls in TYPES.items():
+        assert all(type(r) is cls for r in data[c])
+        assert [r.to_json() for r in data[c]] == source[c]
+    assert json.loads(dumps(data)) == source
+
+
+def test_absent_fields_behave_like_missing_keys():
+    sale = make('sales', {'id': 1, 'sell_price': 100})
+    assert sale.debt is ABSENT
+    assert 'debt' not in sale
+    assert sale.get('debt') is None
+    assert sale.get('debt', 0) == 0
+    with pytest.raises(KeyError):
+        sale['debt']
+    assert sale.to_json() == {'id': 1, 'sell_price': 100}
+    assert list(sale) == ['id', 'sell_price']
+    assert len(sale) == 2
+    # مقدار falsy با ABSENT یکی نیست
+    sale['debt'] = 0
+    assert 'debt' in sale and sale['debt'] == 0
+    del sale['debt']
+    assert 'debt' not in sale
+    with pytest.raises(KeyError):
+        del sale['debt']
+
+
+def test_extra_keys_are_kept():
+    source = {'id': 1, 'amount': 5, 'legacy': 'x', 7: 'int key'}
+    cost = make('costs', dict(source))
+    assert type(cost) is Cost
+    assert cost['legacy'] == 'x' and cost.get(7) == 'int key'
+    assert cost.to_json() == source
+    cost.update({'amount': 6, 'other': True})
+    assert cost.to_json() == {**source, 'amount': 6, 'other': True}
+
+
+def test_make_leaves_other_values_alone():
+    purchase = Purchase.from_json({'id': 1})
+    assert make('purchases', purchase) is purchase
+    assert make('unknown', {'id': 1}) == {'id': 1}
+    assert make('sales', 'text') == 'text'
+    data = convert({'initial_capital': 5, 'sales': [{'id': 1}], 'notes': [{'id': 2}]})
+    assert type(data['sales'][0]) is Sale
+    assert data['notes'] == [{'id': 2}] and data['initial_capital'] == 5
+
+
+def test_copy_is_independent():
+    purchase = make('purchases', {'id': 1, 'model': 'A', 'sold': False})
+    other = purchase.copy()
+    other['sold'] = True
+    assert purchase['sold'] is False
+    assert other.to_json() == {'id': 1, 'model': 'A', 'sold': True}
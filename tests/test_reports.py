@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+import pytest
+
+from reports import (ReportBuckets, gregorian_to_jalali, jalali_to_gregorian, parse_day, period_key,
+                     period_label)
+
+
+@pytest.mark.parametrize('gregorian, jalali', [
+    ((2024, 3, 20), (1403, 1, 1)),
+    ((2025, 3, 20), (1403, 12, 30)),  # ۱۴۰۳ کبیسه است
+    ((2025, 3, 21), (1404, 1, 1)),
+    ((2021, 3, 20), (1399, 12, 30)),
+    ((2026, 2, 23), (1404, 12, 4)),
+    ((2000, 1, 1), (1378, 10, 11)),
+])
+def test_known_dates(gregorian, jalali):
+    assert gregorian_to_jalali(*gregorian) == jalali
+    assert jalali_to_gregorian(*jalali) == gregorian
+
+
+def test_round_trip_every_day():
+    day, end = date(1990, 1, 1), date(2060, 1, 1)
+    previous = None
+    while day < end:
+        jalali = gregorian_to_jalali(day.year, day.month, day.day)
+        assert jalali_to_gregorian(*jalali) == (day.year, day.month, day.day)
+        # روزهای شمسی پشت سر هم و بدون فاصله
+        assert previous is None or jalali > previous
+        previous = jalali
+        day += timedelta(days=1)
+
+
+def test_parse_day():
+    assert parse_day('1404/12/04') == date(2026, 2, 23)
+    assert parse_day('2026/02/23') == date(2026, 2, 23)
+    assert parse_day('2026-2-23') == date(2026, 2, 23)
+    for text in ('1404/13/01', '2026/02/30', 'دیروز', '', None):
+        assert parse_day(text) is None
+
+
+def test_period_keys_and_labels():
+    wednesday = date(2024, 3, 20)
+    assert period_key('day', wednesday) == '1403/01/01'
+    # هفته از شنبه شروع می‌شود
+    assert period_key('week', wednesday) == '1402/12/26'
+    assert period_key('week', date(2024, 3, 23)) == '1403/01/04'
+    assert period_key('month', wednesday) == '1403/01'
+    assert period_label('month', '1403/01') == 'فروردین 1403'
+
+
+def test_buckets_accept_both_calendars():
+    buckets = ReportBuckets()
+    buckets.rebuild({'costs': [{'id': 1, 'amount': 5, 'date': '2026/02/23'},
+                               {'id': 2, 'amount': 7, 'date': '1404/12/04'},
+                               {'id': 3, 'amount': 9, 'date': 'نامعتبر'}]})
+    assert buckets.buckets['day']['1404/12/04']['costs'] == 12
+    assert buckets.buckets['month']['1404/12']['cash_out'] == 12
+    buckets.removed('costs', {'id': 1, 'amount': 5, 'date': '2026/02/23'})
+    buckets.removed('costs', {'id': 2, 'amount': 7, 'date': '1404/12/04'})
+    assert buckets.buckets['day'] == {}
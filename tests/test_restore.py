@@ -0,0 +1,186 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from backup import BackupManifest, build_backup
+from benchmarks.synthetic import make_ledger
+from records import Purchase, convert, to_json
+from restore import (RestoreError, StreamParser, load_backup, load_chain, load_delta, load_inventory,
+                     read_header)
+
+EMPTY = {'initial_capital': 0, 'purchases': [], 'sales': [], 'costs': [], 'transactions': [],
+         'debt_payments': [], 'purchase_debt_payments': [], 'partner_transactions': []}
+
+
+class Recorder:
+    def rebuild(self, data):
+        self.records = []
+        for key, value in data.items():
+            if isinstance(value, list):
+                for record in value:
+                    self.added(key, record)
+
+    def added(self, collection, record):
+        self.records.append((collection, record['id'] if 'id' in record else None))
+
+
+# یک خرید کامل به صورت متن JSON (برای ساختن ورودی‌های نامعتبر با تغییر یک فیلد)
+PURCHASE = '"date": "1403/01/05", "model": "A", "buy_price": 5, "total_cost": 5'
+
+
+def backup_file(data, compress=False):
+    return asyncio.run(build_backup(data, compress=compress))
+
+
+def raw(text):
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def fresh():
+    return {k: list(v) if isinstance(v, list) else v for k, v in EMPTY.items()}
+
+
+def plain(data):
+    return json.loads(json.dumps(data, default=to_json))
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_load_backup_round_trip(compress):
+    ledger = make_ledger(100)
+    observer, data = Recorder(), fresh()
+    meta = load_backup(backup_file({**ledger, '_backup': {'id': 'b1'}}, compress), [observer], data)
+    assert meta == {'id': 'b1'}
+    assert plain(data) == plain(ledger)
+    assert all(isinstance(p, Purchase) for p in data['purchases'])
+    assert len(observer.records) == sum(len(v) for v in ledger.values() if isinstance(v, list))
+
+
+def test_parser_across_small_chunks():
+    text = json.dumps({'initial_capital': 12345678, 'purchases': [{'id': 1, 'model': 'آ' * 30}, {'id': 22}]},
+                      ensure_ascii=False, indent=2)
+    events = list(StreamParser(io.StringIO(text), chunk_size=3).events())
+    assert [(kind, key, value) for kind, key, value, line in events] == [
+        ('scalar', 'initial_capital', 12345678), ('list', 'purchases', None),
+        ('record', 'purchases', {'id': 1, 'model': 'آ' * 30}), ('record', 'purchases', {'id': 22})]
+
+
+@pytest.mark.parametrize('text, message', [
+    ('{"purchases": [{"id": "1", %s}]}' % PURCHASE, 'id'),
+    ('{"purchases": [{"id": 1, %s, "sold": 1}]}' % PURCHASE, 'sold'),
+    ('{"purchases": [{"id": 1, "total_cost": true}]}', 'date'),
+    ('{"purchases": [{"id": 1, "date": "1403/01/05", "model": "A", "buy_price": 5, "total_cost": true}]}',
+     'total_cost'),
+    ('{"purchases": [{"id": 1, "total_cost": 5}]}', 'date'),
+    ('{"purchases": [{"id": 1, "date": "1403/01/05", "buy_price": 5, "total_cost": 5}]}', 'model'),
+    ('{"costs": [{"id": 1, "date": "1403/01/05", "amount": 5}]}', 'title'),
+    ('{"transactions": [{"id": 1, "date": "1403/01/05", "model": "-", "amount": 5}]}', 'type'),
+    ('{"partner_transactions": [{"partner": "reza", "type": "cash_deposit", "amount": 5, "date": "1403/01/05"}]}',
+     'description'),
+    ('{"purchases": [], "purchases": []}', 'تکراری'),
+    ('{"purchases": [], "sales": []}', 'costs'),
+    ('{"initial_capital": "x", "purchases": []}', 'initial_capital'),
+    ('{"initial_capital": [], "purchases": []}', 'initial_capital'),
+    ('{"purchases": [{"id": 1, %s},]}' % PURCHASE, 'JSON'),
+    ('{"purchases": []} []', 'اضافه'),
+])
+def test_load_backup_rejects(text, message):
+    with pytest.raises(RestoreError, match=message):
+        load_backup(raw(text), [], fresh())
+
+
+def test_records_missing_displayed_fields_are_rejected():
+    # رکوردی که فقط id و total_cost دارد صفحه‌های لیست و جزئیات را خراب می‌کند
+    text = ('{"purchases": [{"id": 1, "total_cost": 5}], "sales": [], "costs": [], "transactions": [], '
+            '"partner_transactions": []}')
+    data = fresh()
+    with pytest.raises(RestoreError, match='date'):
+        load_backup(raw(text), [], data)
+    assert data['purchases'] == []
+
+
+def test_list_valued_scalar_is_rejected():
+    text = ('{"initial_capital": [], "purchases": [], "sales": [], "costs": [], "transactions": [], '
+            '"partner_transactions": []}')
+    with pytest.raises(RestoreError, match='initial_capital'):
+        load_backup(raw(text), [], fresh())
+
+
+def test_error_reports_line():
+    text = '{\n  "purchases": [\n    {"id": 1, %s},\n    {"id": 2}\n  ]\n}' % PURCHASE
+    with pytest.raises(RestoreError) as error:
+        load_backup(raw(text), [], fresh())
+    assert error.value.line == 4
+
+
+def chain(tmp_path):
+    """پشتیبان کامل و دو پشتیبان افزایشی پشت سر هم؛ خروجی (فایل‌ها، داده‌ی نهایی)"""
+    data = convert(make_ledger(50))
+    manifest = BackupManifest(str(tmp_path / 'manifest.json'))
+    files = [backup_file({**data, '_backup': manifest.record_full(data)})]
+    data['costs'][0]['amount'] = 999
+    data['purchases'].append(Purchase(id=10 ** 12, date='1404/01/01', model='X', buy_price=1, total_cost=1, sold=False))
+    # تغییرات از AccountingBot نمی‌گذرند؛ delta با مقایسه‌ی اثر انگشت‌ها ساخته می‌شود
+    files.append(backup_file(manifest.make_delta(data), compress=True))
+    del data['sales'][0]
+    data['initial_capital'] = 42
+    files.append(backup_file(manifest.make_delta(data)))
+    return files, data
+
+
+def test_chain_headers_and_load(tmp_path):
+    files, expected = chain(tmp_path)
+    headers = [read_header(f) for f in files]
+    assert [h['type'] for h in headers] == ['full', 'incremental', 'incremental']
+    assert headers[1]['base'] == headers[0]['id'] and headers[2]['base'] == headers[1]['id']
+    # read_header فایل را باز و در ابتدا نگه می‌دارد
+    assert all(not f.closed and f.tell() == 0 for f in files)
+
+    observer, data = Recorder(), fresh()
+    last = load_chain(files, [observer], data)
+    assert last == headers[2]['id']
+    assert plain(data) == plain(expected)
+    assert len(observer.records) == sum(len(v) for v in expected.values() if isinstance(v, list))
+
+
+def test_chain_out_of_order(tmp_path):
+    files, _ = chain(tmp_path)
+    with pytest.raises(RestoreError, match='ترتیب'):
+        load_chain([files[0], files[2]], [], fresh())
+
+
+def test_delta_records_are_validated():
+    delta = {'type': 'incremental', 'backup_id': 'b2', 'base': 'b1', 'scalars': {},
+             'changes': {'costs': {'upsert': [{'id': 1, 'date': '', 'title': '', 'amount': 'x'}], 'delete': []}}}
+    with pytest.raises(RestoreError, match='amount'):
+        load_delta(raw(json.dumps(delta)))
+    with pytest.raises(RestoreError):
+        read_header(raw('{"purchases": []}'))
+
+
+def test_load_inventory():
+    items = [{'id': 1, 'date': '1403/01/05', 'model': 'A', 'buy_price': 10, 'total_cost': 10, 'sold': False}]
+    loaded = load_inventory(backup_file({'date': '', 'type': 'inventory', 'items': items}, compress=True))
+    assert loaded == items and isinstance(loaded[0], Purchase)
+    with pytest.raises(RestoreError):
+        load_inventory(raw('{"type": "inventory", "items": [{"id": 1}]}'))
+    with pytest.raises(RestoreError):
+        load_inventory(raw('{"type": "full"}'))
+
+
+def test_take_keeps_changes_after_copy(tmp_path):
+    manifest = BackupManifest(str(tmp_path / 'manifest.json'))
+    data = convert(make_ledger(20))
+    copy, changed = manifest.take(data)
+    assert changed is None  # بعد از شروع برنامه tracker کامل نیست
+    manifest.record_full(copy)
+    cost = data['costs'][0]
+    cost['amount'] = 1
+    manifest.tracker.added('costs', cost)
+    copy, changed = manifest.take(data)
+    # تغییری که وسط ساختن این پشتیبان (بعد از کپی) بیاید برای پشتیبان بعدی می‌ماند
+    manifest.tracker.removed('costs', cost)
+    delta = manifest.make_delta(copy, changed)
+    assert delta['changes'] == {'costs': {'upsert': [cost], 'delete': []}}
+    assert manifest.tracker.dirty == {('costs', cost['id']): None}
@@ -0,0 +1,65 @@
+import asyncio
+
+from router import CallbackRouter
+
+
+def make_router():
+    router = CallbackRouter()
+    for pattern in ['list_costs', 'list_costs_<int:cursor>', 'list_costs_page_<int:cursor>', 'report_<str:period>',
+                    'view_sale_<int:sid>', 'pay_<str:kind>_<int:record_id>', 'confirm_delete_sale']:
+        router.add(pattern, pattern)
+    return router
+
+
+def resolve(router, data):
+    route, kwargs = router.resolve(data)
+    return (route.handler, kwargs) if route is not None else None
+
+
+def test_exact_routes():
+    router = make_router()
+    assert resolve(router, 'list_costs') == ('list_costs', {})
+    assert resolve(router, 'confirm_delete_sale') == ('confirm_delete_sale', {})
+
+
+def test_parameters_are_converted():
+    router = make_router()
+    assert resolve(router, 'view_sale_42') == ('view_sale_<int:sid>', {'sid': 42})
+    assert resolve(router, 'list_costs_-1') == ('list_costs_<int:cursor>', {'cursor': -1})
+    assert resolve(router, 'report_month') == ('report_<str:period>', {'period': 'month'})
+    assert resolve(router, 'pay_sale_7') == ('pay_<str:kind>_<int:record_id>', {'kind': 'sale', 'record_id': 7})
+
+
+def test_longest_prefix_wins():
+    router = make_router()
+    assert resolve(router, 'list_costs_page_3') == ('list_costs_page_<int:cursor>', {'cursor': 3})
+    assert resolve(router, 'list_costs_3') == ('list_costs_<int:cursor>', {'cursor': 3})
+
+
+def test_unknown_data():
+    router = make_router()
+    assert resolve(router, 'view_sale_abc') is None
+    assert resolve(router, 'view_sale_') is None
+    assert resolve(router, 'report_a:b') is None
+    assert resolve(router, 'list_cost') is None
+    assert resolve(router, '') is None
+
+
+def test_dispatch_passes_parameters():
+    router = CallbackRouter()
+    calls = []
+
+    @router.route('view_sale_<int:sid>')
+    async def view_sale(update, context, sid):
+        calls.append(sid)
+
+    class Query:
+        data = 'view_sale_5'
+
+    class Update:
+        callback_query = Query()
+
+    assert asyncio.run(router.dispatch(Update(), None)) is True
+    assert calls == [5]
+    Query.data = 'missing'
+    assert asyncio.run(router.dispatch(Update(), None)) is False
@@ -0,0 +1,38 @@
+import pytest
+
+from search import SearchIndex, normalize_date, parse_query
+
+
+def make_index(data):
+    index = SearchIndex()
+    index.rebuild(data)
+    return index
+
+
+def test_normalize_date_converts_jalali_to_gregorian():
+    assert normalize_date('1404/12/01') == '2026/02/20'
+    assert normalize_date('۱۴۰۴-۱۲-۱۰') == '2026/03/01'
+    assert normalize_date('2026/2/23') == '2026/02/23'
+
+
+def test_normalize_date_rejects_invalid():
+    with pytest.raises(ValueError):
+        normalize_date('1404/13/01')
+    with pytest.raises(ValueError):
+        normalize_date('دیروز')
+
+
+def test_jalali_filter_matches_gregorian_records():
+    index = make_index({'purchases': [{'id': 1, 'date': '2026/02/23', 'model': 'a', 'sold': False},
+                                      {'id': 2, 'date': '2026/03/10', 'model': 'b', 'sold': False}]})
+    total, hits = index.search(**parse_query('از:1404/12/01 تا:1404/12/10'))
+    assert total == 1
+    assert hits[0][1]['id'] == 1
+
+
+def test_gregorian_filter_matches_jalali_records():
+    # رکوردهای قدیمی با تاریخ شمسی
+    index = make_index({'sales': [{'id': 1, 'date': '1404/12/04', 'model': 'a'}]})
+    assert index.search(**parse_query('از:2026/02/23 تا:2026/02/23'))[0] == 1
+    assert index.search(**parse_query('a از:1404/12/04'))[0] == 1
+    assert index.search(**parse_query('a تا:1404/12/03'))[0] == 0
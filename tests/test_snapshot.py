@@ -0,0 +1,58 @@
+import pytest
+
+import snapshot
+from benchmarks.synthetic import make_ledger
+from records import TYPES, convert
+
+
+def sample():
+    return {
+        'initial_capital': 1500000,
+        'purchases': [
+            {'id': 1, 'model': 'آیفون ۱۳', 'total_cost': 25000000, 'sold': False, 'date': '1403/01/05'},
+            {'id': 2, 'model': 'A54', 'total_cost': 12.5, 'sold': True, 'note': 'رنگ مشکی'},
+            {'id': 3, 'model': None, 'total_cost': 2 ** 70, 'sold': False},
+        ],
+        'sales': [],
+        'costs': [{'id': 4, 'amount': 7, 'title': 'پیک'}, {'id': 5, 'amount': '7', 'title': ''}],
+        'transactions': [{'id': 6, 'amount': -3, 'tags': ['a', {'b': 1}]}],
+        'partner_transactions': [{'partner': 'علی', 'type': 'withdraw', 'amount': 1}],
+        'unknown': [{'x': 1}, {'y': 'z'}],
+        'settings': {'hot_window': 0},
+    }
+
+
+def test_round_trip():
+    data = sample()
+    loaded = snapshot.loads(snapshot.dumps(data))
+    assert loaded == data
+    assert list(loaded) == list(data)
+    for key, cls in TYPES.items():
+        assert all(isinstance(r, cls) for r in loaded.get(key, []))
+    # فیلدی که در رکورد نبود بعد از خواندن هم نیست
+    assert 'note' not in loaded['purchases'][0]
+    assert 'date' not in loaded['purchases'][1]
+
+
+def test_round_trip_synthetic_ledger(tmp_path):
+    data = make_ledger(200)
+    convert(data)
+    path = tmp_path / 'data.snap'
+    path.write_bytes(snapshot.dumps(data))
+    assert snapshot.load_file(str(path)) == data
+
+
+def test_checksum_mismatch():
+    raw = bytearray(snapshot.dumps(sample()))
+    raw[len(snapshot.MAGIC) + 10] ^= 0xff
+    with pytest.raises(ValueError):
+        snapshot.loads(bytes(raw))
+
+
+def test_not_a_snapshot(tmp_path):
+    with pytest.raises(ValueError):
+        snapshot.loads(b'{"purchases": []}' + b'\x00' * 40)
+    path = tmp_path / 'empty.snap'
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        snapshot.load_file(str(path))
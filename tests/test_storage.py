@@ -0,0 +1,132 @@
+import glob
+
+import pytest
+
+from storage import COLLECTIONS, JsonStorage, SqliteStorage, apply_op
+
+
+def default():
+    return {'initial_capital': 0, **{c: [] for c in COLLECTIONS}}
+
+
+def base_data():
+    data = default()
+    data['purchases'] = [{'id': 1, 'model': 'A', 'total_cost': 100, 'sold': False},
+                         {'id': 2, 'model': 'B', 'total_cost': 200, 'sold': False}]
+    data['costs'] = [{'id': 10, 'amount': 5, 'date': '2026/01/01'}]
+    return data
+
+
+def log(storage, data, op):
+    # مثل AccountingBot: تغییر اول در حافظه و بعد در storage
+    apply_op(data, op)
+    storage.append(op)
+
+
+def changes(storage, data):
+    log(storage, data, {'op': 'add', 'c': 'purchases', 'r': {'id': 3, 'model': 'C', 'total_cost': 300, 'sold': False}})
+    log(storage, data, {'op': 'set', 'c': 'purchases', 'id': 1, 'f': {'sold': True}})
+    log(storage, data, {'op': 'del', 'c': 'costs', 'm': {'id': 10}})
+    log(storage, data, {'op': 'put', 'k': 'initial_capital', 'v': 1000})
+    storage.commit(sync=True)
+
+
+def expected():
+    data = base_data()
+    data['purchases'][0]['sold'] = True
+    data['purchases'].append({'id': 3, 'model': 'C', 'total_cost': 300, 'sold': False})
+    data['costs'] = []
+    data['initial_capital'] = 1000
+    return data
+
+
+@pytest.fixture(params=['json', 'binary'])
+def json_storage(request, tmp_path):
+    return lambda: JsonStorage(str(tmp_path / 'data.json'), request.param)
+
+
+def test_journal_replay(json_storage):
+    storage = json_storage()
+    storage.load(default())
+    data = base_data()
+    storage.replace(data)
+    changes(storage, data)
+    storage.close()
+
+    assert json_storage().load(default()) == expected()
+
+
+def test_journal_torn_last_line(json_storage):
+    storage = json_storage()
+    storage.load(default())
+    data = base_data()
+    storage.replace(data)
+    changes(storage, data)
+    storage.close()
+    with open(storage.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"op":"add","c":"purchases","r":{"id":4')
+
+    assert json_storage().load(default()) == expected()
+
+
+def test_replayed_add_is_not_duplicated(json_storage):
+    storage = json_storage()
+    storage.load(default())
+    data = base_data()
+    storage.replace(data)
+    changes(storage, data)
+    # snapshot جدید شامل رکورد ۳ است ولی ژورنال همان add را دوباره دارد
+    storage.compact()
+    storage.append({'op': 'add', 'c': 'purchases', 'r': {'id': 3, 'model': 'C', 'total_cost': 300, 'sold': False}})
+    storage.close()
+
+    assert json_storage().load(default()) == expected()
+
+
+def test_corrupt_primary_recovers_previous_generation(json_storage, tmp_path):
+    storage = json_storage()
+    storage.load(default())
+    data = base_data()
+    storage.replace(data)
+    log(storage, data, {'op': 'set', 'c': 'purchases', 'id': 1, 'f': {'sold': True}})
+    storage.commit(sync=True)
+    storage.compact()
+    log(storage, data, {'op': 'put', 'k': 'initial_capital', 'v': 1000})
+    storage.close()
+    with open(storage.data_file, 'r+b') as f:
+        f.seek(20)
+        f.write(b'\x00garbage\x00')
+
+    data = json_storage().load(default())
+    assert data['purchases'][0]['sold'] is True
+    assert data['initial_capital'] == 1000
+    assert glob.glob(str(tmp_path / 'data.json.corrupt-*'))
+
+
+def test_all_generations_corrupt_refuses_to_start(json_storage):
+    storage = json_storage()
+    storage.load(default())
+    storage.replace(base_data())
+    storage.close()
+    with open(storage.data_file, 'wb') as f:
+        f.write(b'{"purchases": [')
+
+    with pytest.raises(RuntimeError):
+        json_storage().load(default())
+
+
+def test_sqlite_round_trip(tmp_path):
+    path = str(tmp_path / 'data.db')
+    storage = SqliteStorage(path)
+    storage.load(default())
+    data = base_data()
+    storage.replace(data)
+    changes(storage, data)
+    log(storage, data, {'op': 'add', 'c': 'transactions', 'front': True, 'r': {'id': 7, 'amount': 1}})
+    log(storage, data, {'op': 'add', 'c': 'transactions', 'front': True, 'r': {'id': 8, 'amount': 2}})
+    storage.commit(sync=True)
+    storage.close()
+
+    loaded = SqliteStorage(path).load(default())
+    assert [t['id'] for t in loaded['transactions']] == [8, 7]
+    assert loaded == data
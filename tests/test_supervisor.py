@@ -0,0 +1,98 @@
+import threading
+import time
+
+from supervisor import Supervisor, render_metrics
+
+
+class Runner:
+    """runner ساختگی؛ thread آن تا stop (یا برای crash بلافاصله) زنده می‌ماند"""
+
+    def __init__(self, heartbeat, crash=False):
+        self.heartbeat = heartbeat
+        self.crash = crash
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        if self.crash:
+            return
+        self.ready.set()
+        self.stopped.wait()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class Writer:
+    def __init__(self, alive=True):
+        self.thread = threading.current_thread() if alive else None
+        self.stats = {'errors': 2, 'writes': 7}
+
+    def depth(self):
+        return 3
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_status_problems():
+    sup = Supervisor(Runner, timeout=5)
+    status = sup.status()
+    assert status['problems'] == ['worker down'] and status['healthy'] is False
+
+    sup.start()
+    try:
+        assert wait_until(lambda: sup.ready)
+        # هنوز heartbeat نیامده
+        assert sup.status(Writer())['problems'] == ['heartbeat stale']
+        sup.heartbeat.beat = time.monotonic()
+        status = sup.status(Writer())
+        assert status['healthy'] is True and status['problems'] == []
+        assert (status['writer_queue_depth'], status['write_errors'], status['writes']) == (3, 2, 7)
+        assert sup.status(Writer(alive=False))['problems'] == ['storage writer down']
+        assert sup.status(None)['problems'] == ['storage writer down']
+        sup.heartbeat.beat = time.monotonic() - 10
+        assert sup.status(Writer())['problems'] == ['heartbeat stale']
+    finally:
+        sup.stop()
+
+
+def test_crashed_worker_is_restarted():
+    crashes = []
+
+    def factory(heartbeat):
+        crash = len(crashes) < 2
+        crashes.append(crash)
+        return Runner(heartbeat, crash=crash)
+
+    sup = Supervisor(factory, backoff=(0.01, 0.02)).start()
+    try:
+        assert wait_until(lambda: sup.ready)
+        assert sup.restarts == 2
+    finally:
+        sup.stop()
+    sup.thread.join(5)
+    assert not sup.thread.is_alive()
+
+
+def test_render_metrics():
+    text = render_metrics({'worker_up': True, 'healthy': False, 'heartbeat_age': None, 'restarts': 3,
+                           'loop_lag': 0.12345678})
+    assert 'hesabdari_worker_up 1\n' in text
+    assert 'hesabdari_worker_healthy 0\n' in text
+    assert 'hesabdari_worker_restarts_total 3\n' in text
+    assert 'hesabdari_event_loop_lag_seconds 0.123457\n' in text
+    assert '# TYPE hesabdari_worker_restarts_total counter\n' in text
+    # مقدار نامعلوم نوشته نمی‌شود
+    assert 'heartbeat_age' not in text
+    assert len([line for line in text.splitlines() if not line.startswith('#')]) == 4
@@ -0,0 +1,96 @@
+import socket
+import threading
+import time
+
+import pytest
+from werkzeug.serving import make_server
+
+from fake_telegram import USER, FakeTelegram
+
+SECRET = 'test-secret'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope='module')
+def webhook():
+    """app.py در حالت webhook با سرور جعلی تلگرام؛ خروجی (ماژول app، سرور جعلی)"""
+    fake = FakeTelegram().start()
+    port = free_port()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('BOT_MODE', 'webhook')
+        mp.setenv('WEBHOOK_URL', f'http://127.0.0.1:{port}')
+        mp.setenv('WEBHOOK_SECRET', SECRET)
+        import main
+        # build_application آدرس Bot API را هنگام ساختن Application می‌خواند
+        mp.setattr(main, 'TELEGRAM_API_URL', fake.url)
+        import app
+        server = make_server('127.0.0.1', port, app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            assert fake.wait_for('setWebhook'), "ربات webhook را ثبت نکرد"
+            yield app, fake
+        finally:
+            server.shutdown()
+            app.stop()
+            fake.stop()
+
+
+def test_webhook_registered_with_secret(webhook):
+    app, fake = webhook
+    assert fake.webhook['url'] == app.WEBHOOK_URL + app.WEBHOOK_PATH
+    assert fake.webhook['secret_token'] == SECRET
+
+
+def test_bad_secret_is_rejected(webhook):
+    app, fake = webhook
+    before = len(fake.calls)
+    assert fake.post_update(fake.text_update('/start'), secret='wrong') == 403
+    client = app.app.test_client()
+    assert client.post('/telegram', json=fake.text_update('/start')).status_code == 403
+    # هیچ update‌ای به ربات نرسید
+    assert not [m for m, _ in fake.calls[before:] if m == 'sendMessage']
+
+
+def test_malformed_update_is_rejected(webhook):
+    app, fake = webhook
+    response = app.app.test_client().post('/telegram', data='[]', content_type='application/json',
+                                          headers={'X-Telegram-Bot-Api-Secret-Token': SECRET})
+    assert response.status_code == 400
+
+
+def test_update_is_dispatched(webhook):
+    app, fake = webhook
+    sent = len(fake.wait_for('sendMessage', timeout=0))
+    assert fake.post_update(fake.text_update('/start')) == 200
+    replies = fake.wait_for('sendMessage', count=sent + 1)
+    assert len(replies) == sent + 1
+    assert int(replies[-1]['chat_id']) == USER['id']
+
+    edits = len(fake.wait_for('editMessageText', timeout=0))
+    assert fake.post_update(fake.callback_update('dashboard')) == 200
+    assert len(fake.wait_for('editMessageText', count=edits + 1)) == edits + 1
+
+
+def test_health_and_metrics(webhook, monkeypatch):
+    app, fake = webhook
+    client = app.app.test_client()
+    deadline = time.monotonic() + 10
+    # تا اولین heartbeat، /health ناسالم است
+    while (response := client.get('/health')).status_code != 200 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert (response.status_code, response.text) == (200, 'OK')
+    metrics = client.get('/metrics').text
+    assert 'hesabdari_worker_up 1\n' in metrics
+    assert 'hesabdari_worker_healthy 1\n' in metrics
+    assert 'hesabdari_storage_writer_up 1\n' in metrics
+
+    monkeypatch.setattr(app.supervisor, 'timeout', -1)
+    response = client.get('/health')
+    assert response.status_code == 503
+    assert response.text == 'UNHEALTHY: heartbeat stale'
+    assert 'hesabdari_worker_healthy 0\n' in client.get('/metrics').text
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+import pytest
+
+from writer import StorageWriter
+
+
+class Recorder:
+    """storage ساختگی که نوشتن‌ها را ثبت می‌کند؛ با بستن gate نوشتن معطل می‌ماند"""
+
+    def __init__(self, error=None):
+        self.io_lock = threading.RLock()
+        self.generation = 0
+        self.writes = []
+        self.error = error
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def stale(self, generation):
+        return generation is not None and generation != self.generation
+
+    def write(self, batch, sync=False, generation=None):
+        self.entered.set()
+        self.gate.wait(5)
+        if self.error:
+            raise self.error
+        self.writes.append((list(batch), sync))
+
+    def ops(self):
+        return [op for batch, _ in self.writes for op in batch]
+
+
+def blocked(storage, **kwargs):
+    # writer که اولین دسته را برداشته و وسط نوشتن آن مانده است
+    storage.gate.clear()
+    writer = StorageWriter(storage, **kwargs).start()
+    writer.submit(0, [0])
+    assert storage.entered.wait(5)
+    return writer
+
+
+def test_batches_coalesce_while_writing():
+    storage = Recorder()
+    writer = blocked(storage)
+    for i in range(1, 11):
+        writer.submit(0, [i])
+    storage.gate.set()
+    writer.close()
+    assert storage.writes == [([0], False), (list(range(1, 11)), False)]
+    assert writer.stats['batches'] == 11
+    assert writer.stats['writes'] == 2
+    assert writer.stats['coalesced'] == 0
+
+
+def test_full_queue_does_not_block_submit():
+    storage = Recorder()
+    writer = blocked(storage, max_batches=2)
+    done = threading.Event()
+
+    def producer():
+        for i in range(1, 8):
+            writer.submit(0, [i])
+        done.set()
+
+    threading.Thread(target=producer, daemon=True).start()
+    assert done.wait(1)
+    assert writer.stats['coalesced'] == 5
+    assert writer.depth() == 7
+    storage.gate.set()
+    writer.close()
+    # ترتیب دسته‌ها حتی با overflow حفظ می‌شود
+    assert storage.ops() == list(range(8))
+    assert writer.depth() == 0
+
+
+def test_stale_generation_is_dropped():
+    storage = Recorder()
+    writer = blocked(storage)
+    writer.submit(0, ['old'])
+    storage.generation = 1
+    writer.submit(1, ['new'])
+    storage.gate.set()
+    writer.close()
+    assert storage.ops() == [0, 'new']
+
+
+def test_flush_resolves_after_sync_write():
+    storage = Recorder()
+    writer = StorageWriter(storage).start()
+
+    async def run():
+        writer.submit(0, [1])
+        await asyncio.wait_for(writer.flush(0, [2]), 5)
+
+    asyncio.run(run())
+    assert storage.ops() == [1, 2]
+    # دسته‌ای که flush در آن است با fsync نوشته می‌شود
+    assert storage.writes[-1][1] is True
+    writer.close()
+
+
+def test_flush_raises_write_error():
+    storage = Recorder(error=OSError('disk full'))
+    writer = StorageWriter(storage).start()
+
+    async def run():
+        await asyncio.wait_for(writer.flush(0, [1]), 5)
+
+    with pytest.raises(OSError):
+        asyncio.run(run())
+    writer.close()
+    assert writer.stats['errors'] == 1
+
+
+def test_close_drains_queue_and_overflow():
+    storage = Recorder()
+    writer = blocked(storage, max_batches=3)
+    for i in range(1, 10):
+        writer.submit(0, [i])
+    threading.Timer(0.05, storage.gate.set).start()
+    writer.close()
+    assert writer.thread is None
+    assert storage.ops() == list(range(10))
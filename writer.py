@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+WRITER_QUEUE_SIZE = 256  # حداکثر دسته‌ی منتظر در صف؛ اگر دیسک عقب بماند بقیه در overflow جمع می‌شوند
+STOP = object()
+
+
+def resolve(future, error):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+class StorageWriter:
+    """نوشتن تغییرات storage در یک thread جدا.
+
+    save_data فقط دسته‌ی تغییرات را در صف می‌گذارد؛ thread نویسنده هر چه در صف جمع شده
+    را در یک write (یک نوشتن ژورنال / یک تراکنش SQLite) ادغام می‌کند.
+    وقتی صف پر است submit منتظر نمی‌ماند (event loop را نگه نمی‌دارد) و دسته را در overflow
+    می‌گذارد تا در نوشتن بعدی، بعد از همه‌ی دسته‌های صف، ادغام شود.
+    """
+
+    def __init__(self, storage, max_batches=WRITER_QUEUE_SIZE):
+        self.storage = storage
+        self.queue = queue.Queue(max_batches)
+        self.overflow = []
+        self.overflow_lock = threading.Lock()
+        self.thread = None
+        self.stats = {'batches': 0, 'writes': 0, 'ops': 0, 'errors': 0, 'seconds': 0.0, 'coalesced': 0}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='storage-writer', daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, generation, batch, waiter=None):
+        self.put((generation, batch, waiter))
+
+    def put(self, item):
+        with self.overflow_lock:
+            # وقتی overflow خالی نیست دسته‌های بعدی هم همان‌جا می‌روند تا ترتیب نوشتن حفظ شود
+            if not self.overflow:
+                try:
+                    self.queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    pass
+            self.overflow.append(item)
+            self.stats['coalesced'] += 1
+
+    def depth(self):
+        return self.queue.qsize() + len(self.overflow)
+
+    def flush(self, generation, batch):
+        """در صف گذاشتن دسته‌ی آخر و future که بعد از نوشتن (با fsync) کامل می‌شود"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.submit(generation, batch, (loop, future))
+        return future
+
+    def run(self):
+        while True:
+            # هر چه تا این لحظه در صف و overflow جمع شده با هم نوشته می‌شود؛ اگر چیزی نیست منتظر صف
+            items = self.drain([]) or self.drain([self.queue.get()])
+            stop = STOP in items
+            self.write([item for item in items if item is not STOP])
+            if stop:
+                return
+
+    def drain(self, items):
+        while len(items) < self.queue.maxsize:
+            # خالی بودن صف و برداشتن overflow با هم زیر قفل تا دسته‌ای جلوتر از دسته‌های قبلی نوشته نشود
+            with self.overflow_lock:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    items.extend(self.overflow)
+                    self.overflow = []
+                    break
+        return items
+
+    def write(self, items):
+        if not items:
+            return
+        waiters = [item[2] for item in items if item[2] is not None]
+        error = None
+        start = time.perf_counter()
+        try:
+            with self.storage.io_lock:
+                batch = []
+                for generation, ops, _ in items:
+                    if not self.storage.stale(generation):
+                        batch.extend(ops)
+                self.storage.write(batch, sync=bool(waiters))
+            self.stats['ops'] += len(batch)
+        except Exception as e:
+            logger.exception("خطا در نوشتن تغییرات روی دیسک")
+            self.stats['errors'] += 1
+            error = e
+        self.stats['batches'] += len(items)
+        self.stats['writes'] += 1
+        elapsed = time.perf_counter() - start
+        self.stats['seconds'] += elapsed
+        instrumentation.metrics.observe('storage', 'write', elapsed)
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(resolve, future, error)
+            except RuntimeError:
+                # event loop بسته شده است
+                pass
+
+    def close(self):
+        """نوشتن باقی‌مانده‌ی صف و توقف thread"""
+        if self.thread is not None:
+            self.put(STOP)
+            self.thread.join()
+            self.thread = None